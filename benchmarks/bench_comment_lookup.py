@@ -0,0 +1,100 @@
+"""Benchmark comment traversal: Post.__getitem__.
+
+Compares the old lookup (comment by id alone, then walking up to check
+its post in Python) with the scoped (post_id, id) lookup, and prints the
+query plan the database uses for the latter.
+
+Usage::
+
+    python benchmarks/bench_comment_lookup.py [sqlalchemy-url]
+
+with okarchive installed (``pip install -e .``).
+
+The default URL is an in-memory SQLite database.
+"""
+
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+
+from okarchive.models import (
+    Base,
+    Comment,
+    DBSession,
+    Journal,
+    Post,
+)
+
+POSTS = 200
+COMMENTS_PER_POST = 50
+LOOKUPS = 2000
+
+
+def populate():
+    DBSession.add(Journal(name='bench'))
+    DBSession.flush()
+    DBSession.bulk_insert_mappings(
+        Post, [dict(id=i, journal_name='bench', title='Post %d' % i)
+               for i in range(1, POSTS + 1)])
+    DBSession.bulk_insert_mappings(
+        Comment, [dict(post_id=p, user_id='bob', text='Comment')
+                  for p in range(1, POSTS + 1)
+                  for _ in range(COMMENTS_PER_POST)])
+    DBSession.flush()
+
+
+def old_lookup(post, comment_id):
+    comment = DBSession.query(Comment).filter_by(id=comment_id).first()
+    if comment is None or comment.post is not post:
+        raise KeyError(comment_id)
+    return comment
+
+
+def new_lookup(post, comment_id):
+    return post[comment_id]
+
+
+def query_plan(engine):
+    statement = str(DBSession.query(Comment)
+                    .filter_by(post_id=1, id=1)
+                    .statement.compile(engine))
+    if engine.dialect.name == 'sqlite':
+        explain = 'EXPLAIN QUERY PLAN '
+    else:
+        explain = 'EXPLAIN '
+    params = {'post_id_1': 1, 'id_1': 1}
+    if engine.dialect.paramstyle == 'qmark':
+        params = (1, 1)
+    return [' '.join(str(c) for c in row)
+            for row in engine.execute(explain + statement, params)]
+
+
+def main(argv=sys.argv):
+    url = argv[1] if len(argv) > 1 else 'sqlite://'
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    DBSession.configure(bind=engine)
+    populate()
+
+    post = DBSession.query(Post).get(POSTS // 2)
+    ids = [c.id for c in post.comments]
+
+    for name, lookup in [('id + parent walk', old_lookup),
+                         ('(post_id, id)', new_lookup)]:
+        def run():
+            for i in range(LOOKUPS):
+                DBSession.expire_all()
+                lookup(post, ids[i % len(ids)])
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print('%-18s %8.1f us/lookup' % (name, seconds / LOOKUPS * 1e6))
+
+    print('\nQuery plan for scoped lookup:')
+    for line in query_plan(engine):
+        print('  ' + line)
+
+    DBSession.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark authenticated page views with and without the group cache.
+
+Runs the app in-process against a temporary SQLite database, signs in as
+an editor, and times repeated views of a post page with
+``okarchive.group_cache`` off (a membership query every request) and on.
+
+Usage::
+
+    python benchmarks/bench_group_finder.py [requests]
+
+with okarchive and WebTest installed (``pip install -e .[testing]``).
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import transaction
+from sqlalchemy import event
+from webtest import TestApp
+
+from okarchive import main as make_app
+from okarchive.models import (
+    Base,
+    DBSession,
+    Group,
+    Journal,
+    Membership,
+    User,
+)
+
+
+def populate():
+    Base.metadata.create_all(DBSession.get_bind())
+    with transaction.manager:
+        user = User(name='distractionbike')
+        user.setPassword('secret')
+        DBSession.add(user)
+        DBSession.add(Group(name='editors'))
+        DBSession.add(Membership(user_name='distractionbike',
+                                 group_name='editors'))
+        journal = Journal(name='distractionbike')
+        DBSession.add(journal)
+        post = journal.add_post(title='First Post', text='Body', _flush=True)
+        post.add_comment(text='Yay!', user_id='bob')
+
+
+def run(url, group_cache, requests):
+    DBSession.remove()
+    app = TestApp(make_app({}, **{'sqlalchemy.url': url,
+                                  'okarchive.group_cache': group_cache}))
+    app.post('/login', {'login': 'distractionbike',
+                        'password': 'secret',
+                        'form.submitted': 1}, status=302)
+    queries = []
+    event.listen(DBSession.get_bind(), 'before_cursor_execute',
+                 lambda *args: queries.append(1))
+    start = time.perf_counter()
+    for i in range(requests):
+        app.get('/journals/distractionbike/1/', status=200)
+    seconds = time.perf_counter() - start
+    print('group_cache=%-7s %8.1f requests/s %6.2f queries/request'
+          % (group_cache, requests / seconds, len(queries) / requests))
+
+
+def main(argv=sys.argv):
+    requests = int(argv[1]) if len(argv) > 1 else 500
+    fd, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(fd)
+    url = 'sqlite:///' + path
+    try:
+        make_app({}, **{'sqlalchemy.url': url})
+        populate()
+        for group_cache in ('none', 'memory'):
+            run(url, group_cache, requests)
+    finally:
+        os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark the journals directory with many journals.
+
+Compares listing every journal (the old directory page) with one page of
+one letter bucket, deep in the bucket and with cached bucket counts.
+
+Usage::
+
+    python benchmarks/bench_journals_directory.py [sqlalchemy-url]
+
+with okarchive installed (``pip install -e .``).
+
+The default URL is an in-memory SQLite database.
+"""
+
+import random
+import string
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+
+from okarchive.models import (
+    Base,
+    DBSession,
+    Journal,
+    bucket_counts,
+    journals_container,
+)
+from okarchive.utils.sharedcache import MemoryCache
+
+JOURNALS = 50000
+PAGE = 100
+RUNS = 20
+
+
+def populate():
+    rng = random.Random(1)
+    names = {''.join(rng.choice(string.ascii_letters + string.digits)
+                     for _ in range(rng.randint(4, 12)))
+             for _ in range(JOURNALS)}
+    DBSession.bulk_insert_mappings(Journal, [dict(name=n) for n in names])
+    DBSession.flush()
+
+
+def whole_list():
+    return [journal.name for journal in journals_container.journals]
+
+
+def bucket_page():
+    counts = bucket_counts.get()
+    first = journals_container.bucket_page('m', limit=PAGE)
+    # Five pages in, by cursor.
+    page = first
+    for _ in range(5):
+        page = journals_container.bucket_page('m', after=page.next_cursor,
+                                              limit=PAGE)
+    return counts, [row.name for row in page]
+
+
+def main(argv=sys.argv):
+    url = argv[1] if len(argv) > 1 else 'sqlite://'
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    DBSession.configure(bind=engine)
+    bucket_counts.configure(MemoryCache())
+    populate()
+
+    for name, fn in [('every journal', whole_list),
+                     ('6 bucket pages', bucket_page)]:
+        def run():
+            for _ in range(RUNS):
+                DBSession.expire_all()
+                fn()
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print('%-16s %8.2f ms' % (name, seconds / RUNS * 1e3))
+
+    DBSession.rollback()
+
+
+if __name__ == '__main__':
+    main()
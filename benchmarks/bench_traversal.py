@@ -0,0 +1,96 @@
+"""Micro-benchmarks of per-request traversal and authorization overhead.
+
+Each case is what one request to a post or comment page does before its
+view runs (or, for the last ones, what the post view does to decide which
+buttons to show), timed in isolation against an in-memory SQLite
+database with the traversal cache on.
+
+Usage::
+
+    python benchmarks/bench_traversal.py [iterations]
+
+with okarchive installed (``pip install -e .``).
+"""
+
+import sys
+import timeit
+
+from sqlalchemy import create_engine
+
+from pyramid import testing
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.security import (
+    Authenticated,
+    Everyone,
+)
+from pyramid.traversal import ResourceTreeTraverser
+
+from okarchive.models import (
+    Base,
+    DBSession,
+    Journal,
+    siteRoot,
+)
+from okarchive.models.traversal import traversal_cache
+from okarchive.security import permitted
+from okarchive.utils.sharedcache import MemoryCache
+
+PRINCIPALS = [Everyone, Authenticated, 'otherguy']
+
+
+def populate():
+    journal = Journal(name='distractionbike')
+    DBSession.add(journal)
+    post = journal.add_post(title='First Post', text='Body', _flush=True)
+    post.add_comment(text='Yay!', user_id='bob', _flush=True)
+
+
+def traverse(path):
+    request = testing.DummyRequest(path=path)
+    request.matchdict = None
+    return ResourceTreeTraverser(siteRoot)(request)['context']
+
+
+def cases():
+    policy = ACLAuthorizationPolicy()
+    post = traverse('/journals/distractionbike/1/')
+    comment = traverse('/journals/distractionbike/1/1/')
+    request = testing.DummyRequest()
+
+    return [
+        ('root lookup', lambda: siteRoot['journals']),
+        ('traverse to post', lambda: traverse('/journals/distractionbike/1/')),
+        ('traverse to comment',
+         lambda: traverse('/journals/distractionbike/1/1/')),
+        ('post __acl__', lambda: post.__acl__),
+        ('comment __acl__', lambda: comment.__acl__),
+        ('permits view on post',
+         lambda: policy.permits(post, PRINCIPALS, 'view')),
+        ('permits hide on comment',
+         lambda: policy.permits(comment, PRINCIPALS, 'hide')),
+        ('post view edit+delete checks',
+         lambda: permitted(request, post, ('edit', 'delete'), PRINCIPALS)),
+    ]
+
+
+def main(argv=sys.argv):
+    number = int(argv[1]) if len(argv) > 1 else 10000
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    DBSession.configure(bind=engine)
+    traversal_cache.configure(MemoryCache())
+    config = testing.setUp()
+    config.testing_securitypolicy(userid='otherguy')
+    config.set_authorization_policy(ACLAuthorizationPolicy())
+    try:
+        populate()
+        for name, case in cases():
+            seconds = min(timeit.repeat(case, number=number, repeat=3))
+            print('%-30s %8.2f us' % (name, seconds / number * 1e6))
+    finally:
+        testing.tearDown()
+        DBSession.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,39 +1,73 @@
-from sqlalchemy import engine_from_config
-
 from pyramid.config import Configurator
-from pyramid.session import UnencryptedCookieSessionFactoryConfig
-from pyramid.authentication import AuthTktAuthenticationPolicy
-from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.settings import asbool
 
-from .security import group_finder
+from .security import (
+    CachingAuthenticationPolicy,
+    CachingAuthorizationPolicy,
+    group_cache,
+    group_finder,
+)
+from .compression import compression_from_settings
+from .database import (
+    database_stats,
+    engine_from_settings,
+)
+from .pagecache import page_cache
+from .passwords import passwords
 from .models import (
     DBSession,
     Base,
+    bucket_counts,
     )
-
-my_session_factory = UnencryptedCookieSessionFactoryConfig('itsaseekreet')
+from .models.traversal import traversal_cache
+from .sessions import session_factory_from_settings
+from .templating import (
+    configure_cache,
+    warm,
+)
+from .uploads import archive_imports
+from .utils.sharedcache import cache_from_settings
 
 def main(global_config, **settings):
     """This function returns a Pyramid WSGI application."""
 
-    engine = engine_from_config(settings, 'sqlalchemy.')
+    # Waitress threads, from [DEFAULT] threads (shared with [server:main]).
+    threads = int(global_config.get('threads', 4))
+    engine = engine_from_settings(settings, threads)
+    database_stats.configure(settings)
+    page_cache.configure(
+        int(settings.get('okarchive.page_cache.max_bytes', 0)),
+        max_age=int(settings.get('okarchive.page_cache.max_age', 0)) or None)
+    traversal_cache.configure(
+        cache_from_settings(settings, 'okarchive.traversal_cache'))
+    passwords.configure(settings, threads)
+    group_cache.configure(
+        cache_from_settings(settings, 'okarchive.group_cache'))
+    bucket_counts.configure(
+        cache_from_settings(settings, 'okarchive.journal_buckets'))
+    archive_imports.configure(settings)
+    if settings.get('okarchive.template_cache'):
+        configure_cache(settings['okarchive.template_cache'])
     DBSession.configure(bind=engine)
     Base.metadata.bind = engine
-    authn_policy = AuthTktAuthenticationPolicy(
+    authn_policy = CachingAuthenticationPolicy(
         secret='sosecret',
         callback=group_finder,
         hashalg='sha512',
         )
-    authz_policy = ACLAuthorizationPolicy()
+    authz_policy = CachingAuthorizationPolicy()
     config = Configurator(
         settings=settings,
-        session_factory=my_session_factory,
+        session_factory=session_factory_from_settings(settings),
         root_factory='okarchive.models.RootFactory',
     )
     config.set_authentication_policy(authn_policy)
     config.set_authorization_policy(authz_policy)
-    config.add_static_view('static', 'static', cache_max_age=3600)
+    config.include('okarchive.assets')
     config.add_static_view('deform', 'deform:static', cache_max_age=3600)
     config.include('pyramid_chameleon')
     config.scan()
-    return config.make_wsgi_app()
+    app = config.make_wsgi_app()
+    if asbool(settings.get('okarchive.warm_templates', False)):
+        warm(app.registry)
+    return compression_from_settings(app, settings)
@@ -0,0 +1,228 @@
+"""Fingerprinted, precompressed static assets.
+
+:py:func:`build` (the ``build_okarchive_assets`` command) copies each
+static file the templates reference, and the files their CSS refers to,
+into ``static/build/`` under a name containing a hash of its content,
+along with ``.gz`` (and, if the ``brotli`` package is installed, ``.br``)
+variants. ``static/build/manifest.json`` maps each original path to its
+fingerprinted one.
+
+When the manifest exists, ``request.static_url()`` hands out
+fingerprinted URLs, which are served with a far-future expiry; the
+:py:func:`precompressed_tween_factory` tween serves a precompressed
+variant when the browser accepts it. Without a build, plain URLs and
+files are used.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from pyramid.path import AssetResolver
+from pyramid.response import FileResponse
+from pyramid.settings import asbool
+from pyramid.static import ManifestCacheBuster
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+STATIC_SPEC = 'okarchive:static/'
+BUILD_DIR = 'build'
+MANIFEST_SPEC = STATIC_SPEC + BUILD_DIR + '/manifest.json'
+
+# Unfingerprinted files may change under the same URL.
+PLAIN_MAX_AGE = 3600
+FINGERPRINTED_MAX_AGE = 365 * 24 * 3600
+
+_template_ref = re.compile(r'okarchive:static/([^\'"\s)]+)')
+_css_url = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+# Compressed variants, best first: (Content-Encoding, file suffix).
+ENCODINGS = [('gzip', '.gz')]
+if brotli is not None:  # pragma: no cover
+    ENCODINGS.insert(0, ('br', '.br'))
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.eot', '.ttf', '.html', '.txt',
+                '.json')
+
+
+def _abspath(spec):
+    return AssetResolver().resolve(spec).abspath()
+
+
+def referenced_assets(template_dir):
+    """Static paths (relative to ``static/``) used by the templates."""
+
+    paths = set()
+    for dirpath, dirnames, filenames in os.walk(template_dir):
+        for name in filenames:
+            if name.endswith('.pt'):
+                with open(os.path.join(dirpath, name)) as fh:
+                    paths.update(_template_ref.findall(fh.read()))
+    return paths
+
+
+def _css_refs(path, css):
+    """Static paths referred to by ``url()`` in CSS at ``path``."""
+
+    for quote, url in _css_url.findall(css):
+        target = _local_target(path, url)
+        if target is not None:
+            yield target
+
+
+def _local_target(path, url):
+    if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+        return None
+    target = re.split(r'[?#]', url, 1)[0]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(path),
+                                             target))
+
+
+def _fingerprinted(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = posixpath.splitext(path)
+    return '{}/{}.{}{}'.format(BUILD_DIR, root, digest, ext)
+
+
+def _rewrite_css(path, css, manifest):
+    """Point ``url()`` references at fingerprinted files."""
+
+    def replace(match):
+        quote, url = match.groups()
+        target = _local_target(path, url)
+        if target not in manifest:
+            return match.group(0)
+        suffix = url[len(re.split(r'[?#]', url, 1)[0]):]
+        # Both files live under build/, at the same relative positions.
+        new = posixpath.relpath(manifest[target],
+                                posixpath.dirname(_fingerprinted(path, b'')))
+        return 'url({0}{1}{2}{0})'.format(quote, new, suffix)
+
+    return _css_url.sub(replace, css)
+
+
+def _compress(encoding, content):
+    if encoding == 'gzip':
+        # mtime=0 keeps builds of the same content identical.
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    return brotli.compress(content)  # pragma: no cover
+
+
+def _write(path, content):
+    """Write a built file and its compressed variants."""
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    variants = [('', content)]
+    if path.endswith(COMPRESSIBLE):
+        variants.extend((suffix, _compress(encoding, content))
+                        for encoding, suffix in ENCODINGS)
+    for suffix, data in variants:
+        with open(path + suffix, 'wb') as fh:
+            fh.write(data)
+
+
+def build(static_dir=None, template_dir=None):
+    """Build fingerprinted, compressed copies of referenced assets.
+
+    :returns: the manifest, mapping original paths to built ones.
+    """
+
+    if static_dir is None:
+        static_dir = _abspath(STATIC_SPEC)
+    if template_dir is None:
+        template_dir = _abspath('okarchive:templates/')
+
+    # Find everything needed, following CSS references.
+    needed = set()
+    pending = list(referenced_assets(template_dir))
+    while pending:
+        path = pending.pop()
+        if path in needed or path.startswith(BUILD_DIR + '/'):
+            continue
+        if not os.path.isfile(os.path.join(static_dir, path)):
+            continue
+        needed.add(path)
+        if path.endswith('.css'):
+            with open(os.path.join(static_dir, path)) as fh:
+                pending.extend(_css_refs(path, fh.read()))
+
+    build_dir = os.path.join(static_dir, BUILD_DIR)
+    shutil.rmtree(build_dir, ignore_errors=True)
+
+    # CSS last, so that what it refers to is already fingerprinted.
+    manifest = {}
+    for path in sorted(needed, key=lambda p: (p.endswith('.css'), p)):
+        with open(os.path.join(static_dir, path), 'rb') as fh:
+            content = fh.read()
+        if path.endswith('.css'):
+            content = _rewrite_css(path, content.decode('utf-8'),
+                                   manifest).encode('utf-8')
+        manifest[path] = _fingerprinted(path, content)
+        _write(os.path.join(static_dir, manifest[path]), content)
+
+    with open(os.path.join(build_dir, 'manifest.json'), 'w') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def precompressed_tween_factory(handler, registry, static_dir=None):
+    """Serve fingerprinted assets precompressed, and cache them for good."""
+
+    if static_dir is None:
+        static_dir = _abspath(STATIC_SPEC)
+    prefix = '/static/{}/'.format(BUILD_DIR)
+    build_dir = os.path.join(static_dir, BUILD_DIR)
+
+    def precompressed_tween(request):
+        if (not request.path_info.startswith(prefix)
+                or request.method not in ('GET', 'HEAD')):
+            return handler(request)
+
+        relative = request.path_info[len(prefix):]
+        path = os.path.normpath(os.path.join(build_dir, relative))
+        response = None
+        # Without Accept-Encoding, send the file as is.
+        if (path.startswith(build_dir + os.sep) and os.path.isfile(path)
+                and 'Accept-Encoding' in request.headers):
+            suffixes = dict(ENCODINGS)
+            offered = request.accept_encoding.acceptable_offers(
+                list(suffixes))
+            for encoding, quality in offered:
+                if os.path.isfile(path + suffixes[encoding]):
+                    content_type, _ = mimetypes.guess_type(path)
+                    response = FileResponse(
+                        path + suffixes[encoding], request=request,
+                        content_type=content_type or
+                        'application/octet-stream')
+                    response.content_encoding = encoding
+                    break
+        if response is None:
+            response = handler(request)
+        if response.status_int == 200:
+            response.cache_control = 'public, max-age={}, immutable'.format(
+                FINGERPRINTED_MAX_AGE)
+            response.vary = ('Accept-Encoding',)
+        return response
+
+    return precompressed_tween
+
+
+def includeme(config):
+    """Add the static view, the cache buster and the tween."""
+
+    settings = config.get_settings()
+    config.add_static_view('static', STATIC_SPEC,
+                           cache_max_age=PLAIN_MAX_AGE)
+    reload = asbool(settings.get('pyramid.reload_assets', False))
+    if reload or os.path.exists(_abspath(MANIFEST_SPEC)):
+        config.add_cache_buster(
+            STATIC_SPEC, ManifestCacheBuster(MANIFEST_SPEC, reload=reload))
+    config.add_tween('okarchive.assets.precompressed_tween_factory')
@@ -0,0 +1,212 @@
+"""gzip compression of responses.
+
+:py:class:`CompressionMiddleware` wraps the whole WSGI app. It compresses
+text responses for clients that accept gzip, as the body streams out,
+and leaves alone bodies that are small or already encoded (such as the
+precompressed assets of :py:mod:`okarchive.assets`).
+
+A compressed response's ETag gets a ``-gz`` suffix, since its bytes
+differ from the uncompressed page's; the suffix is taken off
+``If-None-Match`` on the way in, so conditional GETs still match. Bodies
+of responses with an ETag are cached compressed, keyed by it, so a page
+is compressed once per change rather than once per request.
+
+Configured by the ``okarchive.compression.*`` settings; see
+:py:func:`compression_from_settings`.
+"""
+
+import itertools
+import zlib
+
+from webob import Request
+
+from .utils.lru import LRUCache
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+ETAG_SUFFIX = '-gz'
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _without(headers, *names):
+    names = {name.lower() for name in names}
+    return [(key, value) for key, value in headers
+            if key.lower() not in names]
+
+
+def _accepts_gzip(environ):
+    if 'HTTP_ACCEPT_ENCODING' not in environ:
+        return False
+    request = Request(environ)
+    return (request.method in ('GET', 'POST')
+            and bool(request.accept_encoding.acceptable_offers(['gzip'])))
+
+
+def _gzip_etag(etag):
+    # '"abc"' -> '"abc-gz"'; weak ETags keep their W/.
+    return etag[:-1] + ETAG_SUFFIX + '"' if etag.endswith('"') else etag
+
+
+class CompressionMiddleware:
+    """WSGI middleware gzipping responses.
+
+    :param level: zlib compression level, 1 (fastest) to 9 (smallest).
+    :param min_size: bodies smaller than this many bytes are sent as is.
+    :param cache_bytes: budget for cached compressed bodies; 0 disables.
+    """
+
+    def __init__(self, app, level=6, min_size=1024, cache_bytes=0):
+        self.app = app
+        self.level = level
+        self.min_size = min_size
+        self.cache = LRUCache(max_bytes=cache_bytes) if cache_bytes else None
+
+    def __call__(self, environ, start_response):
+        if not _accepts_gzip(environ):
+            return self.app(environ, start_response)
+
+        # Conditional GETs name the compressed ETag; the app knows the
+        # plain one.
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH', '')
+        revalidating = ETAG_SUFFIX + '"' in if_none_match
+        if revalidating:
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match.replace(
+                ETAG_SUFFIX + '"', '"')
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None
+
+        app_iter = self.app(environ, capture)
+        status, headers, exc_info = captured
+        if status.startswith('304') and revalidating:
+            # The client holds the compressed page.
+            etag = _header(headers, 'ETag')
+            if etag:
+                headers = _without(headers, 'ETag')
+                headers.append(('ETag', _gzip_etag(etag)))
+            start_response(status, headers, exc_info)
+            return app_iter
+        return self._respond(environ, app_iter, status, headers, exc_info,
+                             start_response)
+
+    def _compressible(self, status, headers):
+        content_type = _header(headers, 'Content-Type') or ''
+        cache_control = _header(headers, 'Cache-Control') or ''
+        length = _header(headers, 'Content-Length')
+        return (status.startswith('200')
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+                and _header(headers, 'Content-Encoding') is None
+                and 'no-transform' not in cache_control
+                and (length is None or int(length) >= self.min_size))
+
+    def _respond(self, environ, app_iter, status, headers, exc_info,
+                 start_response):
+        etag = _header(headers, 'ETag')
+        if not self._compressible(status, headers):
+            start_response(status, headers, exc_info)
+            return app_iter
+
+        vary = _header(headers, 'Vary')
+        headers = _without(headers, 'Content-Length', 'ETag', 'Vary')
+        headers.append(('Vary', vary + ', Accept-Encoding' if vary
+                        else 'Accept-Encoding'))
+        cache_key = None
+        if (self.cache is not None and etag
+                and _header(headers, 'Set-Cookie') is None):
+            cache_key = (environ.get('PATH_INFO'),
+                         environ.get('QUERY_STRING'),
+                         etag,
+                         self.level)
+        if etag:
+            headers.append(('ETag', _gzip_etag(etag)))
+
+        if cache_key is not None:
+            body = self.cache.get(cache_key)
+            if body is not None:
+                _close(app_iter)
+                headers.extend([('Content-Encoding', 'gzip'),
+                                ('Content-Length', str(len(body)))])
+                start_response(status, headers, exc_info)
+                return [body]
+
+        # Read as far as min_size, to skip small bodies of unknown length.
+        chunks = iter(app_iter)
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            _close(app_iter)
+            body = b''.join(head)
+            headers.append(('Content-Length', str(len(body))))
+            start_response(status, headers, exc_info)
+            return [body]
+
+        headers.append(('Content-Encoding', 'gzip'))
+        start_response(status, headers, exc_info)
+        return self._compress(app_iter, head, chunks, cache_key)
+
+    def _compress(self, app_iter, head, chunks, cache_key):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                                      16 + zlib.MAX_WBITS)
+        kept = [] if cache_key is not None else None
+        try:
+            for chunk in itertools.chain(head, chunks):
+                data = compressor.compress(chunk)
+                if data:
+                    if kept is not None:
+                        kept.append(data)
+                    yield data
+            data = compressor.flush()
+            if kept is not None:
+                kept.append(data)
+                body = b''.join(kept)
+                self.cache.set(cache_key, body, size=len(body))
+            yield data
+        finally:
+            _close(app_iter)
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
+
+
+def compression_from_settings(app, settings):
+    """Wrap app in compression, unless it is turned off.
+
+    ``okarchive.compression.level`` is the zlib level, 0 to turn
+    compression off; ``okarchive.compression.min_size`` the smallest body
+    compressed and ``okarchive.compression.cache_bytes`` the budget for
+    cached compressed pages, both in bytes.
+    """
+
+    prefix = 'okarchive.compression.'
+    level = int(settings.get(prefix + 'level', 6))
+    if level == 0:
+        return app
+    return CompressionMiddleware(
+        app,
+        level=level,
+        min_size=int(settings.get(prefix + 'min_size', 1024)),
+        cache_bytes=int(settings.get(prefix + 'cache_bytes', 0)))
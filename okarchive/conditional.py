@@ -0,0 +1,77 @@
+"""Conditional GET support for resource pages.
+
+Pages get a strong ETag and a Last-Modified header from their resource's
+``modification_date``. A request whose ``If-None-Match`` or
+``If-Modified-Since`` still matches is answered with 304 before the view
+loads or renders anything more than traversal already did.
+"""
+
+import datetime
+import hashlib
+
+from pyramid.httpexceptions import HTTPNotModified
+from pyramid.security import (
+    authenticated_userid,
+    effective_principals,
+)
+from pyramid.traversal import resource_path
+
+
+def last_modified(context):
+    """Last modification datetime (UTC) of a resource, or None."""
+
+    stamp = (getattr(context, 'modification_date', None)
+             or getattr(context, 'creation_date', None))
+    if stamp is None:
+        return None
+    return stamp.replace(tzinfo=datetime.timezone.utc)
+
+
+def page_etag(context, request, stamp):
+    """ETag for this page as seen by this viewer."""
+
+    parts = [resource_path(context),
+             request.view_name,
+             request.query_string,
+             stamp.isoformat()]
+    parts.extend(sorted(effective_principals(request)))
+    return hashlib.sha1('\0'.join(parts).encode()).hexdigest()
+
+
+def _not_modified(request, etag, stamp):
+    if request.if_none_match:
+        return etag in request.if_none_match
+    since = request.if_modified_since
+    return since is not None and stamp.replace(microsecond=0) <= since
+
+
+def conditional_get(view):
+    """View decorator adding ETag and Last-Modified, answering 304s."""
+
+    def conditional_view(context, request):
+        stamp = last_modified(context)
+        if (stamp is None
+                or request.method not in ('GET', 'HEAD')
+                or request.session.peek_flash()):
+            return view(context, request)
+
+        etag = page_etag(context, request, stamp)
+        if _not_modified(request, etag, stamp):
+            response = HTTPNotModified()
+        else:
+            response = view(context, request)
+            if response.status_int != 200:
+                return response
+
+        response.etag = etag
+        response.last_modified = stamp
+        # Pages differ by who is signed in: let shared caches keep only
+        # anonymous ones, and always revalidate.
+        if authenticated_userid(request) is None:
+            response.cache_control = 'public, no-cache'
+        else:
+            response.cache_control = 'private, no-cache'
+        response.vary = ('Cookie',)
+        return response
+
+    return conditional_view
@@ -0,0 +1,241 @@
+"""Database engine, connection pool sizing and pool instrumentation.
+
+:py:func:`engine_from_settings` sizes the pool to the server's threads:
+each waitress thread holds at most one connection (its transaction's), so
+the pool keeps that many, with ``okarchive.db.max_overflow`` more for
+the odd extra (a background import, a script). Pooled connections are
+pinged before use and replaced after ``okarchive.db.pool_recycle``
+seconds, so ones the server dropped are not handed out. SQLite keeps
+SQLAlchemy's own pools, and none of this.
+
+Each request collects what it did with the database (connections
+checked out, seconds waited for one, queries and their time). When the
+response goes out it is logged on the ``okarchive.database`` channel and
+added to :py:data:`database_stats`, labelled with the view that handled
+it; queries slower than ``okarchive.db.slow_query`` seconds are logged
+as warnings. Editors can see the totals at ``/db-stats``.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from sqlalchemy import (
+    engine_from_config,
+    event,
+)
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+
+from pyramid.events import (
+    NewResponse,
+    subscriber,
+)
+from pyramid.threadlocal import get_current_request
+
+log = logging.getLogger(__name__)
+
+
+def view_label(request):
+    """Name of the view that handled a request, for stats."""
+
+    route = getattr(request, 'matched_route', None)
+    if route is not None:
+        return route.name
+    context = getattr(request, 'context', None)
+    if context is None:
+        return '-'
+    label = type(context).__name__
+    if request.view_name:
+        label += ':' + request.view_name
+    return label
+
+
+class RequestStats:
+    """What one request did with the database."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.slow = []
+
+
+def request_stats(request):
+    """Database stats of a request, made on first use."""
+
+    stats = getattr(request, '_database_stats', None)
+    if stats is None:
+        stats = request._database_stats = RequestStats()
+    return stats
+
+
+def _current_stats():
+    request = get_current_request()
+    return request_stats(request) if request is not None else None
+
+
+class ViewStats:
+    """Totals for the requests handled by one view."""
+
+    def __init__(self):
+        self.requests = 0
+        self.checkouts = 0
+        self.wait = 0.0
+        self.max_wait = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.slow = 0
+
+    def add(self, stats):
+        self.requests += 1
+        self.checkouts += stats.checkouts
+        self.wait += stats.wait
+        self.max_wait = max(self.max_wait, stats.wait)
+        self.queries += stats.queries
+        self.query_time += stats.query_time
+        self.slow += len(stats.slow)
+
+    def as_dict(self):
+        return dict(requests=self.requests,
+                    checkouts=self.checkouts,
+                    checkouts_per_request=self.checkouts / self.requests,
+                    wait_seconds=self.wait,
+                    max_wait_seconds=self.max_wait,
+                    queries=self.queries,
+                    queries_per_request=self.queries / self.requests,
+                    query_seconds=self.query_time,
+                    slow_queries=self.slow)
+
+
+class DatabaseStats:
+    """Holder for per-view database totals and the slow query threshold."""
+
+    def __init__(self):
+        self.slow_query = 0.25
+        self._views = collections.defaultdict(ViewStats)
+        self._lock = threading.Lock()
+
+    def configure(self, settings):
+        """Set up from ``okarchive.db.*`` settings, emptying the totals."""
+
+        self.slow_query = float(settings.get('okarchive.db.slow_query', 0.25))
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+
+    def add(self, label, stats):
+        with self._lock:
+            self._views[label].add(stats)
+
+    def views(self):
+        """Totals by view label, as dicts."""
+
+        with self._lock:
+            return {label: view.as_dict()
+                    for label, view in sorted(self._views.items())}
+
+
+database_stats = DatabaseStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool timing how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats = _current_stats()
+            if stats is not None:
+                stats.wait += time.perf_counter() - start
+
+
+def pool_status(engine):
+    """Sizes and use of an engine's pool."""
+
+    pool = engine.pool
+    status = dict(pool=type(pool).__name__)
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(),
+                      checked_out=pool.checkedout(),
+                      idle=pool.checkedin(),
+                      overflow=pool.overflow(),
+                      timeout=pool.timeout())
+    return status
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _current_stats()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def _before_execute(conn, cursor, statement, parameters, context, many):
+    # Kept on the statement's own context, which goes away with it even
+    # when the statement fails.
+    context._okarchive_query_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, many):
+    elapsed = time.perf_counter() - context._okarchive_query_start
+    stats = _current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_time += elapsed
+        if elapsed >= database_stats.slow_query:
+            stats.slow.append((elapsed, statement))
+
+
+def instrument(engine):
+    """Collect request stats from an engine's pool and queries."""
+
+    event.listen(engine, 'checkout', _checkout)
+    event.listen(engine, 'before_cursor_execute', _before_execute)
+    event.listen(engine, 'after_cursor_execute', _after_execute)
+
+
+def engine_from_settings(settings, threads=4):
+    """Engine for ``sqlalchemy.url``, pooled for ``threads`` threads.
+
+    ``okarchive.db.pool_size`` (default: ``threads``),
+    ``okarchive.db.max_overflow``, ``okarchive.db.pool_timeout`` and
+    ``okarchive.db.pool_recycle`` (seconds) tune the pool.
+    """
+
+    options = {}
+    if make_url(settings['sqlalchemy.url']).get_backend_name() != 'sqlite':
+        prefix = 'okarchive.db.'
+        options = dict(
+            poolclass=InstrumentedQueuePool,
+            pool_size=int(settings.get(prefix + 'pool_size', threads)),
+            max_overflow=int(settings.get(prefix + 'max_overflow', 2)),
+            pool_timeout=float(settings.get(prefix + 'pool_timeout', 10)),
+            pool_recycle=int(settings.get(prefix + 'pool_recycle', 3600)),
+            pool_pre_ping=True)
+    engine = engine_from_config(settings, 'sqlalchemy.', **options)
+    instrument(engine)
+    return engine
+
+
+@subscriber(NewResponse)
+def record_database_stats(event):
+    """Log a request's database use and add it to the view's totals."""
+
+    request = event.request
+    stats = request_stats(request)
+    label = view_label(request)
+    database_stats.add(label, stats)
+    for elapsed, statement in stats.slow:
+        log.warning('%s: slow query (%.3fs): %s', label, elapsed, statement)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('%s %s [%s]: %d checkouts, waited %.1fms, '
+                  '%d queries in %.1fms',
+                  request.method, request.path, label,
+                  stats.checkouts, stats.wait * 1000,
+                  stats.queries, stats.query_time * 1000)
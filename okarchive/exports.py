@@ -0,0 +1,174 @@
+"""Streaming journal exports.
+
+A journal is exported as a ZIP of post CSVs in the layout the importer
+reads (see :py:mod:`okarchive.utils.unarchive`), or as JSON. Either way
+the response body is a generator: posts are fetched ``BATCH_SIZE`` rows
+at a time (``yield_per``; a server-side cursor on PostgreSQL) and each
+is sent as soon as it is written, so an export of any size takes the
+same memory.
+
+The body is read after the view has returned and the request's
+transaction has ended, so the generators use a session of their own,
+outside ``zope.sqlalchemy``, and close it when done or when the client
+goes away.
+"""
+
+import datetime
+import io
+import itertools
+import json
+import zipfile
+
+from sqlalchemy.orm import Session
+
+from .models import (
+    Comment,
+    Post,
+)
+from .utils.unarchive import write_post
+
+# Rows fetched from the database at a time.
+BATCH_SIZE = 100
+
+_POST_COLUMNS = (Post.id, Post.title, Post.lede, Post.text, Post.privacy,
+                 Post.creation_date, Post.modification_date)
+_COMMENT_COLUMNS = (Comment.post_id, Comment.id, Comment.user_id,
+                    Comment.text, Comment.hidden, Comment.creation_date,
+                    Comment.modification_date)
+
+
+def posts_with_comments(session, journal_name, hidden=False):
+    """Posts of a journal, oldest first, each with its comments.
+
+    Posts and comments are read by two cursors in step, in ``post_id``
+    order, rather than a query for each post.
+
+    :param hidden: include hidden comments.
+    :returns: iterator of ``(post, comments)``; rows, and lists of rows.
+    """
+
+    posts = (session
+             .query(*_POST_COLUMNS)
+             .filter(Post.journal_name == journal_name)
+             .order_by(Post.id)
+             .yield_per(BATCH_SIZE))
+    comments = (session
+                .query(*_COMMENT_COLUMNS)
+                .join(Post, Post.id == Comment.post_id)
+                .filter(Post.journal_name == journal_name)
+                .order_by(Comment.post_id, Comment.id)
+                .yield_per(BATCH_SIZE))
+    if not hidden:
+        comments = comments.filter(Comment.hidden == False)
+
+    by_post = itertools.groupby(comments, key=lambda row: row.post_id)
+    pending = next(by_post, None)
+    for post in posts:
+        post_comments = []
+        if pending is not None and pending[0] == post.id:
+            post_comments = list(pending[1])
+            pending = next(by_post, None)
+        yield post, post_comments
+
+
+class _Sink:
+    """Write-only file collecting what ZipFile writes, to hand on.
+
+    Having no ``tell()``, it makes ZipFile write a streamable archive.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def member_name(post_id):
+    """Archive member name of a post; name order is post order."""
+
+    return 'post{:08d}.csv'.format(post_id)
+
+
+def zip_chunks(bind, journal_name):
+    """Body of a journal's ZIP export, a post at a time.
+
+    Everything is included; post privacy and hidden comments are marked
+    as :py:func:`okarchive.utils.unarchive.write_post` describes, so
+    importing the archive gives back the same journal.
+    """
+
+    session = Session(bind=bind)
+    try:
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for post, comments in posts_with_comments(session,
+                                                      journal_name,
+                                                      hidden=True):
+                text = io.StringIO()
+                write_post(text,
+                           post._asdict(),
+                           [comment._asdict() for comment in comments])
+                info = zipfile.ZipInfo(member_name(post.id),
+                                       _zip_date(post.creation_date))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                zf.writestr(info, text.getvalue().encode('utf-8'))
+                yield sink.take()
+        yield sink.take()
+    finally:
+        session.close()
+
+
+def _zip_date(dt):
+    # ZIP dates start in 1980.
+    return max(dt, datetime.datetime(1980, 1, 1)).timetuple()[:6]
+
+
+def _isoformat(dt):
+    return dt.isoformat() if dt is not None else None
+
+
+def json_chunks(bind, journal_name):
+    """Body of a journal's JSON export, a post at a time.
+
+    Everything is included: ledes, privacy and hidden comments.
+    """
+
+    session = Session(bind=bind)
+    try:
+        yield '{{"journal": {}, "posts": ['.format(
+            json.dumps(journal_name)).encode('utf-8')
+        separator = ''
+        for post, comments in posts_with_comments(session, journal_name,
+                                                  hidden=True):
+            document = dict(
+                id=post.id,
+                title=post.title,
+                lede=post.lede,
+                text=post.text,
+                privacy=post.privacy,
+                creation_date=_isoformat(post.creation_date),
+                modification_date=_isoformat(post.modification_date),
+                comments=[dict(id=comment.id,
+                               user_id=comment.user_id,
+                               text=comment.text,
+                               hidden=comment.hidden,
+                               creation_date=_isoformat(
+                                   comment.creation_date),
+                               modification_date=_isoformat(
+                                   comment.modification_date))
+                          for comment in comments])
+            yield (separator + json.dumps(document)).encode('utf-8')
+            separator = ', '
+        yield b']}'
+    finally:
+        session.close()
@@ -0,0 +1,273 @@
+"""Background jobs, queued in the app's own database.
+
+Slow work is queued as a :py:class:`okarchive.models.Job` by
+:py:func:`enqueue`, inside the caller's transaction, so a job exists
+exactly when the change that asked for it was committed. Jobs are run by
+``okarchive_worker`` processes (see :py:class:`Worker`), separate from
+the web server; several workers, and several threads in each, may share
+a database, since :py:func:`claim` takes a job with an UPDATE that only
+one of them can win.
+
+Each kind of job has a function registered with :py:func:`handler`,
+called with a :py:class:`Context` and the job's arguments. Handlers run
+outside any transaction and commit their own work. A handler that raises
+is retried after an exponentially growing delay until the job has had
+``max_attempts`` tries; then it fails. The handler's ``retrying`` and
+``failed`` functions, if it has them, are called after each attempt that
+will be retried and when the job fails for good. A worker that dies
+mid-job stops the job's heartbeat (its ``modification_date``, touched by
+progress reports); such jobs are queued again after ``stale`` seconds.
+"""
+
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+
+import transaction
+from zope.sqlalchemy import mark_changed
+
+from .models import (
+    DBSession,
+    Job,
+)
+
+log = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+class Handler:
+    """A registered kind of job."""
+
+    def __init__(self, run, max_attempts=3, failed=None, retrying=None):
+        self.run = run
+        self.max_attempts = max_attempts
+        self.failed = failed
+        self.retrying = retrying
+
+
+def handler(kind, max_attempts=3, failed=None, retrying=None):
+    """Decorator registering the function that runs jobs of ``kind``.
+
+    :param max_attempts: tries before the job fails.
+    :param failed: called as ``failed(context, error, **args)``, in a
+      transaction, when a job has failed for good.
+    :param retrying: called as ``retrying(context, error, **args)``, in a
+      transaction, when an attempt has failed and will be retried.
+    """
+
+    def register(run):
+        _handlers[kind] = Handler(run, max_attempts, failed, retrying)
+        return run
+
+    return register
+
+
+def enqueue(kind, user_id=None, **args):
+    """Queue a job in the current transaction; return it.
+
+    :param user_id: who asked for it; they may see its status.
+    :param args: keyword arguments for the handler, as JSON.
+    """
+
+    job = Job(kind=kind,
+              args=json.dumps(args, sort_keys=True),
+              user_id=user_id,
+              max_attempts=_handlers[kind].max_attempts)
+    DBSession.add(job)
+    DBSession.flush()
+    return job
+
+
+class Context:
+    """What a handler is told about the job it runs."""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.attempt = job.attempts
+        # Progress of earlier attempts, for handlers that can resume.
+        self.done = job.done
+
+    def progress(self, done, total=None, message=None):
+        """Record progress, in the current transaction."""
+
+        self.done = done
+        values = {Job.done: done,
+                  Job.modification_date: datetime.datetime.utcnow()}
+        if total is not None:
+            values[Job.total] = total
+        if message is not None:
+            values[Job.message] = message
+        (DBSession
+         .query(Job)
+         .filter(Job.id == self.job_id)
+         .update(values, synchronize_session=False))
+        mark_changed(DBSession())
+
+
+def backoff(attempts, base=30, limit=3600):
+    """Seconds to wait before retrying after ``attempts`` tries."""
+
+    return min(base * 2 ** (attempts - 1), limit)
+
+
+def claim(worker, stale=3600):
+    """Take the next runnable job for ``worker``; return its ID, or None.
+
+    Jobs left running for ``stale`` seconds without a heartbeat are
+    queued again first.
+    """
+
+    now = datetime.datetime.utcnow()
+    with transaction.manager:
+        requeued = (DBSession
+                    .query(Job)
+                    .filter(Job.status == 'running')
+                    .filter(Job.modification_date <
+                            now - datetime.timedelta(seconds=stale))
+                    .update({Job.status: 'queued', Job.run_after: now},
+                            synchronize_session=False))
+        if requeued:
+            log.warning('requeued %d stale jobs', requeued)
+            mark_changed(DBSession())
+        candidates = (DBSession
+                      .query(Job.id)
+                      .filter(Job.status == 'queued')
+                      .filter(Job.run_after <= now)
+                      .order_by(Job.run_after, Job.id)
+                      .limit(10)
+                      .all())
+        for job_id, in candidates:
+            # Someone else may have taken it since; only one UPDATE wins.
+            taken = (DBSession
+                     .query(Job)
+                     .filter(Job.id == job_id)
+                     .filter(Job.status == 'queued')
+                     .update({Job.status: 'running',
+                              Job.worker: worker,
+                              Job.attempts: Job.attempts + 1,
+                              Job.modification_date: now},
+                             synchronize_session=False))
+            if taken:
+                mark_changed(DBSession())
+                return job_id
+    return None
+
+
+def run(job_id, base_backoff=30, max_backoff=3600):
+    """Run a claimed job and record how it went."""
+
+    with transaction.manager:
+        job = DBSession.query(Job).get(job_id)
+        kind = job.kind
+        args = json.loads(job.args)
+        context = Context(job)
+    found = _handlers.get(kind)
+    try:
+        if found is None:
+            raise LookupError('No handler for jobs of kind {}'.format(kind))
+        found.run(context, **args)
+    except Exception as e:
+        log.exception('job %s (%s) failed', job_id, kind)
+        transaction.abort()
+        now = datetime.datetime.utcnow()
+        with transaction.manager:
+            job = DBSession.query(Job).get(job_id)
+            job.error = '{}: {}'.format(type(e).__name__, e)
+            if found is not None and job.attempts < job.max_attempts:
+                job.status = 'queued'
+                job.run_after = now + datetime.timedelta(
+                    seconds=backoff(job.attempts, base_backoff, max_backoff))
+                if found.retrying is not None:
+                    found.retrying(context, e, **args)
+            else:
+                job.status = 'failed'
+                job.finished_date = now
+                if found is not None and found.failed is not None:
+                    found.failed(context, e, **args)
+    else:
+        with transaction.manager:
+            job = DBSession.query(Job).get(job_id)
+            job.status = 'done'
+            job.finished_date = datetime.datetime.utcnow()
+
+
+class Worker:
+    """Runs queued jobs on ``concurrency`` threads.
+
+    :param poll_interval: seconds a thread waits when there is no job.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=5, backoff=30,
+                 max_backoff=3600, stale=3600, name=None):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stale = stale
+        self.name = name or '{}:{}'.format(socket.gethostname(), os.getpid())
+        self._stopping = threading.Event()
+
+    def run_next(self, thread_name=None):
+        """Claim and run one job; return False if there was none."""
+
+        try:
+            job_id = claim(thread_name or self.name, self.stale)
+            if job_id is None:
+                return False
+            run(job_id, self.backoff, self.max_backoff)
+            return True
+        finally:
+            DBSession.remove()
+
+    def _loop(self, number, drain):
+        thread_name = '{}/{}'.format(self.name, number)
+        while not self._stopping.is_set():
+            if not self.run_next(thread_name):
+                if drain:
+                    return
+                self._stopping.wait(self.poll_interval)
+
+    def work(self, drain=False):
+        """Run jobs until :py:meth:`stop` is called.
+
+        :param drain: return once no job is ready, instead.
+        """
+
+        threads = [threading.Thread(target=self._loop,
+                                    args=(number, drain),
+                                    name='okarchive-worker-{}'.format(number))
+                   for number in range(1, self.concurrency + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop(self):
+        """Finish running jobs, then stop."""
+
+        self._stopping.set()
+
+
+def worker_from_settings(settings, **overrides):
+    """Worker set up by the ``okarchive.jobs.*`` settings.
+
+    ``concurrency`` is threads running jobs, ``poll_interval`` seconds
+    between looks for work when there is none, ``backoff`` seconds
+    before the first retry (doubled for each one after, up to
+    ``max_backoff``) and ``stale`` seconds without a heartbeat before a
+    running job is queued again.
+    """
+
+    prefix = 'okarchive.jobs.'
+    options = dict(
+        concurrency=int(settings.get(prefix + 'concurrency', 1)),
+        poll_interval=float(settings.get(prefix + 'poll_interval', 5)),
+        backoff=float(settings.get(prefix + 'backoff', 30)),
+        max_backoff=float(settings.get(prefix + 'max_backoff', 3600)),
+        stale=float(settings.get(prefix + 'stale', 3600)))
+    options.update(overrides)
+    return Worker(**options)
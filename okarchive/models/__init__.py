@@ -5,6 +5,8 @@ These classes are for the journals, posts, and comments on the posts.
 They will be persisted in SQLAlchemy.
 """
 
+from types import MappingProxyType
+
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import (
     scoped_session,
@@ -13,7 +15,7 @@ from sqlalchemy.orm import (
 
 from zope.sqlalchemy import ZopeTransactionExtension
 
-from pyramid.security import Allow, Everyone
+from .acl import SITE_ACL
 
 
 DBSession = scoped_session(
@@ -31,26 +33,46 @@ def RootFactory(request):
 class SiteRoot:
     """Site root for OkArchive.
 
-    A simple resource that has the journals object in its
-    mapping.
+    A simple resource that has the journals, search, uploads and jobs
+    objects in its mapping.
     """
 
     __name__ = ''
     __parent__ = None
-    __acl__ = [(Allow, Everyone, 'view')]
+    __acl__ = SITE_ACL
+
+    # Filled in below, once the containers exist.
+    children = MappingProxyType({})
 
     def __getitem__(self, item):
-        """Return items in root; only journals."""
+        """Return items in root: journals, search, uploads and jobs."""
 
-        return {'journals': journals_container}[item]
+        return self.children[item]
 
 
 siteRoot = SiteRoot()
 
 
 from .user import User
+from .group import Group
+from .membership import Membership
 from .journal import Journal
-from .journals import Journals, journals_container
+from .journals import (
+    BUCKETS,
+    Journals,
+    bucket_counts,
+    journals_container,
+)
 from .post import Post
 from .comment import Comment
-
+from . import counts, modified
+from .search import Search, search_container
+from .upload import Upload
+from .uploads import Uploads, uploads_container
+from .job import Job
+from .jobs import Jobs, jobs_container
+
+SiteRoot.children = MappingProxyType({'journals': journals_container,
+                                      'search': search_container,
+                                      'uploads': uploads_container,
+                                      'jobs': jobs_container})
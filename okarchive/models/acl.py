@@ -0,0 +1,87 @@
+"""Shared, immutable ACLs.
+
+Resources return one of these from ``__acl__`` instead of building a new
+list on every permission check: there is one ACL per resource type and
+owner, made the first time it is asked for.
+"""
+
+from functools import lru_cache
+
+from pyramid.security import (
+    Allow,
+    Deny,
+    DENY_ALL,
+    Everyone,
+    Authenticated,
+)
+
+EDITORS = 'group:editors'
+
+# Number of owners whose ACLs are kept, per resource type.
+CACHED_OWNERS = 4096
+
+SITE_ACL = ((Allow, Everyone, 'view'),
+            (Allow, EDITORS, 'stats'),
+            )
+
+# The job list is for editors; each job says who else may see it.
+JOBS_ACL = ((Allow, EDITORS, 'view'),
+            DENY_ALL,
+            )
+
+
+@lru_cache(maxsize=CACHED_OWNERS)
+def journal_acl(owner):
+    """ACL of a journal owned by ``owner``."""
+
+    return ((Allow, Everyone, 'view'),
+            (Allow, EDITORS, ('edit', 'add', 'delete')),
+            (Allow, owner, ('edit', 'add', 'delete')),
+            )
+
+
+@lru_cache(maxsize=CACHED_OWNERS)
+def post_acl(owner):
+    """ACL of a post in ``owner``'s journal."""
+
+    return ((Allow, Everyone, 'view'),
+            (Allow, Authenticated, 'add'),
+            (Allow, EDITORS, ('edit', 'add', 'delete')),
+            (Allow, owner, ('edit', 'add', 'delete')),
+            )
+
+
+@lru_cache(maxsize=CACHED_OWNERS)
+def comment_acl(owner):
+    """ACL of a comment on a post in ``owner``'s journal."""
+
+    return ((Allow, Everyone, 'view'),
+            (Allow, Authenticated, 'add'),
+            (Deny, Everyone, ('add', 'edit', 'delete')),
+            (Allow, EDITORS, ('edit', 'delete', 'publish', 'hide')),
+            (Allow, owner, ('publish', 'hide')),
+            )
+
+
+@lru_cache(maxsize=CACHED_OWNERS)
+def upload_acl(owner):
+    """ACL of an archive uploaded to ``owner``'s journal."""
+
+    return ((Allow, EDITORS, 'view'),
+            (Allow, owner, 'view'),
+            DENY_ALL,
+            )
+
+
+@lru_cache(maxsize=CACHED_OWNERS)
+def job_acl(owner):
+    """ACL of a background job asked for by ``owner``."""
+
+    if owner is None:
+        return ((Allow, EDITORS, 'view'),
+                DENY_ALL,
+                )
+    return ((Allow, EDITORS, 'view'),
+            (Allow, owner, 'view'),
+            DENY_ALL,
+            )
@@ -1,3 +1,5 @@
+import datetime
+
 from sqlalchemy import (
     Column,
     Index,
@@ -14,14 +16,9 @@ from sqlalchemy.orm import (
     backref,
     )
 
-from pyramid.security import (
-    Allow,
-    Deny,
-    Everyone,
-    Authenticated,
-)
-
 from . import Base, DBSession
+from .acl import comment_acl
+from .counts import adjust
 
 
 class Comment(Base):
@@ -41,12 +38,7 @@ class Comment(Base):
     def __acl__(self):
         """Permissions."""
 
-        return [(Allow, Everyone, 'view'),
-                (Allow, Authenticated, 'add'),
-                (Deny, Everyone, ('add', 'edit', 'delete')),
-                (Allow, 'group:editors', ('edit', 'delete', 'publish', 'hide')),
-                (Allow, self.post.journal_name, ('publish', 'hide')),
-        ]
+        return comment_acl(self.post.journal_name)
 
     id = Column(
         Integer,
@@ -71,12 +63,15 @@ class Comment(Base):
 
     creation_date = Column(
         DateTime,
+        default=datetime.datetime.utcnow,
         server_default=func.now(),
         )
 
+    # Maintained in Python; see okarchive.models.modified.
     modification_date = Column(
         DateTime,
-        server_onupdate=func.now(),
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
     )
 
     hidden = Column(
@@ -92,5 +87,19 @@ class Comment(Base):
                         passive_deletes=True)
     )
 
+    def hide(self):
+        """Hide comment from readers."""
+
+        if not self.hidden:
+            self.hidden = True
+            adjust(self.post, type(self.post).comment_count, -1)
+
+    def publish(self):
+        """Show hidden comment again."""
+
+        if self.hidden:
+            self.hidden = False
+            adjust(self.post, type(self.post).comment_count, 1)
+
 
-Index('comment_postid', Comment.post_id)
\ No newline at end of file
+Index('comment_post_hidden_id', Comment.post_id, Comment.hidden, Comment.id)
\ No newline at end of file
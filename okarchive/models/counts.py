@@ -0,0 +1,78 @@
+"""Denormalized counters: ``Journal.public_post_count`` and
+``Post.comment_count``.
+
+Listings show how many public posts a journal has and how many (published)
+comments a post has without counting rows. Only public posts are counted
+so the number can be shown to anyone. The counters are kept by the
+methods that add, delete, hide, publish and change privacy
+(:py:func:`adjust` does the arithmetic in SQL, so concurrent writers don't
+lose updates) and by the archive importer. :py:func:`repair` recomputes
+them all from the tables.
+"""
+
+from sqlalchemy import (
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.sql import ClauseElement
+
+from zope.sqlalchemy import mark_changed
+
+from . import DBSession
+
+
+def adjust(obj, column, delta):
+    """Add ``delta`` to counter ``column`` of ``obj``.
+
+    For a row already in the database the new value is ``column + delta``
+    in the UPDATE, so the database adds to whatever is stored when the
+    session flushes; new rows just start from the right number.
+    """
+
+    key = column.key
+    current = obj.__dict__.get(key)
+    if isinstance(current, ClauseElement):
+        value = current + delta
+    elif inspect(obj).persistent:
+        value = column + delta
+    else:
+        value = (current or 0) + delta
+    setattr(obj, key, value)
+
+
+def _true_post_count():
+    from .journal import Journal
+    from .post import Post
+    return (select([func.count()])
+            .where(Post.journal_name == Journal.name)
+            .where(Post.privacy == 'public')
+            .as_scalar())
+
+
+def _true_comment_count():
+    from .post import Post
+    from .comment import Comment
+    return (select([func.count()])
+            .where(Comment.post_id == Post.id)
+            .where(Comment.hidden == False)
+            .as_scalar())
+
+
+def repair():
+    """Recompute every counter; return how many rows were wrong."""
+
+    from .journal import Journal
+    from .post import Post
+
+    session = DBSession()
+    fixed = 0
+    for model, column, true_count in [
+            (Journal, Journal.public_post_count, _true_post_count()),
+            (Post, Post.comment_count, _true_comment_count())]:
+        fixed += (session
+                  .query(model)
+                  .filter(column != true_count)
+                  .update({column: true_count}, synchronize_session=False))
+    mark_changed(session)
+    return fixed
@@ -0,0 +1,26 @@
+from sqlalchemy import (
+    Column,
+    String,
+)
+
+from . import Base
+
+
+class Group(Base):
+    """Group of users, such as editors; its principal is ``group:<name>``."""
+
+    __tablename__ = 'groups'
+
+    name = Column(
+        String,
+        primary_key=True,
+    )
+
+    title = Column(
+        String,
+        nullable=True,
+    )
+
+    @property
+    def principal(self):
+        return 'group:' + self.name
@@ -0,0 +1,118 @@
+"""Model for background jobs."""
+
+import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    Text,
+)
+
+from . import Base
+from .acl import job_acl
+
+
+class Job(Base):
+    """Unit of background work, run by an ``okarchive_worker``.
+
+    ``status`` is ``queued`` (waiting for ``run_after``), ``running``,
+    ``done`` or ``failed``. ``done`` out of ``total`` is progress, in
+    whatever units the job's handler counts. See :py:mod:`okarchive.jobs`.
+    """
+
+    __tablename__ = 'jobs'
+
+    @property
+    def __name__(self):
+        return str(self.id)
+
+    @property
+    def __parent__(self):
+        from .jobs import jobs_container
+        return jobs_container
+
+    @property
+    def __acl__(self):
+        """Permissions: editors, and whoever asked for the job."""
+
+        return job_acl(self.user_id)
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        )
+
+    # Name of the handler that runs it.
+    kind = Column(
+        String,
+        nullable=False,
+        )
+
+    # JSON object of the handler's keyword arguments.
+    args = Column(
+        Text,
+        nullable=False,
+        default='{}',
+        )
+
+    user_id = Column(String)
+
+    status = Column(
+        String,
+        nullable=False,
+        default='queued',
+        )
+
+    attempts = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        )
+
+    max_attempts = Column(
+        Integer,
+        nullable=False,
+        default=3,
+        )
+
+    run_after = Column(
+        DateTime,
+        nullable=False,
+        default=datetime.datetime.utcnow,
+        )
+
+    # Worker running it, or that ran it last.
+    worker = Column(String)
+
+    done = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        )
+
+    total = Column(Integer)
+
+    message = Column(String)
+
+    error = Column(Text)
+
+    creation_date = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        )
+
+    # Also the heartbeat of a running job; see okarchive.jobs.
+    modification_date = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        )
+
+    finished_date = Column(DateTime)
+
+
+# Workers look for the next runnable job by status and time.
+Index('job_status_run_after', Job.status, Job.run_after, Job.id)
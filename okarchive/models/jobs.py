@@ -0,0 +1,47 @@
+"""Container of background jobs, for their status pages."""
+
+from sqlalchemy import func
+
+from . import DBSession, siteRoot
+from .acl import JOBS_ACL
+from .job import Job
+
+
+class Jobs:
+    """Traversable container of jobs, by ID."""
+
+    __name__ = 'jobs'
+    __parent__ = siteRoot
+    __acl__ = JOBS_ACL
+
+    def __getitem__(self, key):
+        """Get job by ID.
+
+        :rtype: :py:class:`.job.Job`
+        """
+
+        if not key.isdigit():
+            raise KeyError('Not an integer')
+        job = DBSession.query(Job).get(int(key))
+        if job is None:
+            raise KeyError('No such job: {}'.format(key))
+        return job
+
+    def recent(self, limit=50):
+        """Newest jobs, and how many jobs there are in each status.
+
+        :returns: ``(jobs, counts)``.
+        """
+
+        jobs = (DBSession
+                .query(Job)
+                .order_by(Job.id.desc())
+                .limit(limit)
+                .all())
+        counts = dict(DBSession
+                      .query(Job.status, func.count())
+                      .group_by(Job.status))
+        return jobs, counts
+
+
+jobs_container = Jobs()
@@ -1,14 +1,31 @@
 """Model for Journals."""
 
+import datetime
+
 from sqlalchemy import (
     Column,
+    DateTime,
+    Index,
+    Integer,
     String,
+    func,
 )
-
-from pyramid.security import Allow, Everyone
+from sqlalchemy.orm.attributes import set_committed_value
 
 from . import Base, DBSession
+from .acl import journal_acl
+from .counts import adjust
 from .post import Post
+from .traversal import (
+    known_instance,
+    traversal_cache,
+)
+from .visibility import (
+    can_view_post,
+    viewer_principals,
+    visible_posts,
+)
+from ..utils.paging import keyset_page
 
 class Journal(Base):
     """Journal."""
@@ -28,10 +45,7 @@ class Journal(Base):
     def __acl__(self):
         """Permisssions."""
 
-        return [(Allow, Everyone, 'view'),
-                (Allow, 'group:editors', ('edit', 'add', 'delete')),
-                (Allow, self.name, ('edit', 'add', 'delete')),
-        ]
+        return journal_acl(self.name)
 
     def __getitem__(self, key):
         """Get post by key.
@@ -44,19 +58,37 @@ class Journal(Base):
         if type(key)==str and not key.isdigit():
             raise KeyError('Not an integer')
 
-        post = (DBSession
-                .query(Post)
-                .filter_by(id=key)
-                .filter_by(journal_name=self.name)
-                .first())
-        if not post:
-            raise KeyError('No such post: {}'.format(key))
+        post_id = int(key)
+        cached = traversal_cache.post(post_id)
+        if cached is not None:
+            journal_name, privacy = cached
+            if (journal_name != self.name
+                    or not can_view_post(journal_name, privacy,
+                                         viewer_principals())):
+                raise KeyError('No such post: {}'.format(key))
+            post = known_instance(Post,
+                                  id=post_id,
+                                  journal_name=journal_name,
+                                  privacy=privacy)
+        else:
+            post = (DBSession
+                    .query(Post)
+                    .filter_by(id=post_id)
+                    .filter_by(journal_name=self.name)
+                    .filter(visible_posts(viewer_principals()))
+                    .first())
+            if not post:
+                raise KeyError('No such post: {}'.format(key))
+            traversal_cache.set_post(post)
+        # We are the post's parent; hold on to that rather than have
+        # __parent__ lazy-load the journal again.
+        set_committed_value(post, 'journal', self)
         return post
 
     def __delitem__(self, key):
         """Delete post."""
 
-        self.posts.remove(self[key])
+        self[key].delete()
 
     def values(self):
         """List of posts."""
@@ -73,6 +105,30 @@ class Journal(Base):
 
         return [(p.id, p) for p in self.posts]
 
+    def post_page(self, after=None, before=None, limit=20, principals=None):
+        """Page of post summaries, newest first.
+
+        Only ``id``, ``title``, ``creation_date`` and ``comment_count``
+        are selected, so the deferred post text is never loaded.
+
+        :param after: cursor; return the page following it.
+        :param before: cursor; return the page preceding it.
+        :param principals: viewer's principals; only posts they may read
+          are listed. If None, all posts are listed.
+        :rtype: :py:class:`okarchive.utils.paging.Page`
+        """
+
+        query = (DBSession
+                 .query(Post.id, Post.title, Post.creation_date,
+                        Post.comment_count)
+                 .filter(Post.journal_name == self.name)
+                 .filter(visible_posts(principals)))
+        return keyset_page(query,
+                           (Post.creation_date, Post.id),
+                           after=after,
+                           before=before,
+                           limit=limit,
+                           descending=True)
 
     name = Column(
         String,
@@ -80,6 +136,21 @@ class Journal(Base):
         doc='Journal name; this is the same as the user who created it.',
     )
 
+    modification_date = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        doc='Last change to journal or any of its posts or comments.',
+    )
+
+    public_post_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+        doc='Number of public posts; see okarchive.models.counts.',
+    )
+
     def add_post(self,
                  post=None,
                  _flush=False,
@@ -103,8 +174,13 @@ class Journal(Base):
         else:
             post.journal_name = self.name
         DBSession.add(post)
+        if post.privacy in (None, 'public'):
+            adjust(self, Journal.public_post_count, 1)
         if _flush:
             DBSession.flush()
         return post
 
 
+Index('journal_moddate', Journal.modification_date)
+# The journals directory pages through names case-insensitively.
+Index('journal_lower_name', func.lower(Journal.name), Journal.name)
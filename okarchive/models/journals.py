@@ -1,5 +1,73 @@
+import string
+
+from sqlalchemy import (
+    and_,
+    case,
+    event,
+    func,
+    or_,
+)
+
 from . import DBSession, siteRoot
 from .journal import Journal
+from .traversal import (
+    known_instance,
+    traversal_cache,
+)
+from ..utils.paging import keyset_page
+from ..utils.sharedcache import NullCache
+
+# The directory's buckets: journals by first letter, and "#" for names
+# starting with anything else.
+BUCKETS = tuple(string.ascii_lowercase) + ('#',)
+
+# Sorts and pages by the journal_lower_name index.
+_sort_name = func.lower(Journal.name).label('sort_name')
+
+
+def _in_bucket(bucket):
+    """Filter for journals in a bucket: one or two index ranges."""
+
+    if bucket == '#':
+        return or_(_sort_name < 'a', _sort_name >= chr(ord('z') + 1))
+    return and_(_sort_name >= bucket, _sort_name < chr(ord(bucket) + 1))
+
+
+class BucketCounts:
+    """Cache of how many journals each directory bucket holds.
+
+    The backend is chosen by the ``okarchive.journal_buckets`` settings;
+    see :py:func:`okarchive.utils.sharedcache.cache_from_settings`. The
+    counts are dropped when journals are added or deleted through the
+    session.
+    """
+
+    key = ('journal_buckets',)
+
+    def __init__(self):
+        self.backend = NullCache()
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def get(self):
+        """Dict of bucket to count; buckets with no journals are left out."""
+
+        counts = self.backend.get(self.key)
+        if counts is None:
+            first = func.substr(_sort_name, 1, 1)
+            bucket = case([(first.between('a', 'z'), first)], else_='#')
+            counts = dict(DBSession
+                          .query(bucket, func.count())
+                          .group_by(bucket))
+            self.backend.set(self.key, counts)
+        return counts
+
+    def forget(self):
+        self.backend.delete(self.key)
+
+
+bucket_counts = BucketCounts()
 
 
 class Journals:
@@ -11,12 +79,16 @@ class Journals:
     def __getitem__(self, item):
         """Get journal by name."""
 
+        if traversal_cache.journal_exists(item):
+            return known_instance(Journal, name=item)
+
         journal = (DBSession
                    .query(Journal)
                    .filter_by(name=item)
                    .first())
         if not journal:
             raise KeyError('No such journal: {}'.format(item))
+        traversal_cache.set_journal(item)
         return journal
 
     def __setitem__(self, key, value):
@@ -30,19 +102,30 @@ class Journals:
         raise NotImplementedError("Can't delete journal")
 
     def values(self):
-        """List of journals."""
+        """Iterate over journals, loading them in batches."""
 
-        return [j for j in self.journals]
+        return iter(self.journals.yield_per(1000))
 
     def keys(self):
-        """List of journal names."""
+        """Iterate over journal names."""
 
-        return [j.name for j in self.journals]
+        return (name for (name,) in (DBSession
+                                     .query(Journal.name)
+                                     .order_by(Journal.name)
+                                     .yield_per(1000)))
 
     def items(self):
-        """List of (journal-name, journal) tuples."""
+        """Iterate over (journal-name, journal) tuples."""
+
+        return ((j.name, j) for j in self.values())
 
-        return [(j.name, j) for j in self.journals]
+    @property
+    def modification_date(self):
+        """Last change to any journal."""
+
+        return (DBSession
+                .query(func.max(Journal.modification_date))
+                .scalar())
 
     @property
     def journals(self):
@@ -54,5 +137,52 @@ class Journals:
                 .order_by(Journal.name)
         )
 
+    def bucket_page(self, bucket, after=None, before=None, limit=100):
+        """Page of journal names in a bucket, case-insensitively sorted.
+
+        Rows have ``name``, ``public_post_count`` and ``sort_name``.
+
+        :param bucket: one of :py:data:`BUCKETS`.
+        :param after: cursor; return the page following it.
+        :param before: cursor; return the page preceding it.
+        :raises ValueError: if the bucket or a cursor is malformed.
+        :rtype: :py:class:`okarchive.utils.paging.Page`
+        """
+
+        if bucket not in BUCKETS:
+            raise ValueError('No such bucket: {}'.format(bucket))
+        query = (DBSession
+                 .query(Journal.name, Journal.public_post_count, _sort_name)
+                 .filter(_in_bucket(bucket)))
+        return keyset_page(query,
+                           (_sort_name, Journal.name),
+                           after=after,
+                           before=before,
+                           limit=limit)
+
 
 journals_container = Journals()
+
+
+@event.listens_for(DBSession, 'after_flush')
+def forget_changed_buckets(session, flush_context):
+    """Drop bucket counts when journals come or go."""
+
+    if any(isinstance(obj, Journal)
+           for obj in session.new | session.deleted):
+        bucket_counts.forget()
+        session.info['okarchive.bucket_changes'] = True
+
+
+@event.listens_for(DBSession, 'after_commit')
+def forget_committed_buckets(session):
+    """Drop them again: another request may have counted the old
+    journals between the flush and the commit."""
+
+    if session.info.pop('okarchive.bucket_changes', False):
+        bucket_counts.forget()
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def discard_bucket_changes(session):
+    session.info.pop('okarchive.bucket_changes', None)
@@ -0,0 +1,29 @@
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    String,
+)
+
+from . import Base
+
+
+class Membership(Base):
+    """A user's membership in a group.
+
+    Keyed by user first: it is looked up by user on every authenticated
+    request (see :py:func:`okarchive.security.group_finder`).
+    """
+
+    __tablename__ = 'memberships'
+
+    user_name = Column(
+        String,
+        ForeignKey('users.name', ondelete='CASCADE', onupdate='CASCADE'),
+        primary_key=True,
+    )
+
+    group_name = Column(
+        String,
+        ForeignKey('groups.name', ondelete='CASCADE', onupdate='CASCADE'),
+        primary_key=True,
+    )
@@ -0,0 +1,52 @@
+"""Keep modification dates current.
+
+A journal page shows its posts and a post page shows its comments, so a
+change to a comment also modifies its post and journal, and a change to a
+post modifies its journal. Conditional GETs and the page cache rely on
+these dates.
+
+Bulk writes (the archive importer) bypass the session, so they must
+update ``Journal.modification_date`` themselves.
+"""
+
+import datetime
+
+from sqlalchemy import event
+
+from . import DBSession
+from .journal import Journal
+from .post import Post
+from .comment import Comment
+
+
+def _parents(session, obj):
+    """Resources whose pages show ``obj``."""
+
+    # A new object may have only its foreign key set, not the relationship.
+    if isinstance(obj, Comment):
+        post = obj.post or session.query(Post).get(obj.post_id)
+        if post is not None:
+            yield post
+            obj = post
+    if isinstance(obj, Post):
+        journal = obj.journal or session.query(Journal).get(obj.journal_name)
+        if journal is not None:
+            yield journal
+
+
+@event.listens_for(DBSession, 'before_flush')
+def touch_parents(session, flush_context, instances):
+    """Set modification date of the parents of anything changed."""
+
+    changed = [obj for obj in session.dirty if session.is_modified(obj)]
+    changed.extend(session.new)
+    changed.extend(session.deleted)
+
+    now = datetime.datetime.utcnow()
+    touched = set()
+    with session.no_autoflush:
+        for obj in changed:
+            for parent in _parents(session, obj):
+                if parent not in touched and parent not in session.deleted:
+                    touched.add(parent)
+                    parent.modification_date = now
@@ -1,3 +1,5 @@
+import datetime
+
 from sqlalchemy import (
     Column,
     Index,
@@ -13,18 +15,16 @@ from sqlalchemy.orm import (
     backref,
     deferred,
     )
+from sqlalchemy.orm.attributes import set_committed_value
 
 import deform
 import colander
 
-from pyramid.security import (
-    Allow,
-    Everyone,
-    Authenticated,
-    )
-
 from . import Base, DBSession
+from .acl import post_acl
 from .comment import Comment
+from .counts import adjust
+from ..utils.paging import keyset_page
 
 
 class Post(Base):
@@ -44,11 +44,7 @@ class Post(Base):
     def __acl__(self):
         """Permissions."""
 
-        return [(Allow, Everyone, 'view'),
-                (Allow, Authenticated, 'add'),
-                (Allow, 'group:editors', ('edit', 'add', 'delete')),
-                (Allow, self.journal_name, ('edit', 'add', 'delete')),
-                ]
+        return post_acl(self.journal_name)
 
     def __getitem__(self, comment_id):
         """Get comment by id."""
@@ -58,18 +54,24 @@ class Post(Base):
         if type(comment_id) == str and not comment_id.isdigit():
             raise KeyError('Not an integer')
 
+        # Look up by (post_id, id), so a comment is only found through its
+        # own post.
         comment = (DBSession
                    .query(Comment)
-                   .filter_by(id=comment_id)
+                   .filter_by(post_id=self.id, id=comment_id)
                    .first())
         if not comment:
             raise KeyError('No such comment: {}'.format(comment_id))
+        set_committed_value(comment, 'post', self)
         return comment
 
     def __delitem__(self, key):
         """Delete comment."""
 
-        self.comments.remove(self[key])
+        comment = self[key]
+        if not comment.hidden:
+            adjust(self, Post.comment_count, -1)
+        self.comments.remove(comment)
 
     def values(self):
         """List of comments."""
@@ -132,14 +134,19 @@ class Post(Base):
                        )},
         ))
 
+    # Set in Python as well, so that every row stores the same datetime
+    # format; keyset paging compares on this column.
     creation_date = Column(
         DateTime,
+        default=datetime.datetime.utcnow,
         server_default=func.now(),
         )
 
+    # Maintained in Python; see okarchive.models.modified.
     modification_date = Column(
         DateTime,
-        server_onupdate=func.now(),
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
     )
 
     privacy = Column(
@@ -157,6 +164,14 @@ class Post(Base):
         default='public',
         )
 
+    # Published comments; see okarchive.models.counts.
+    comment_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+        )
+
     journal = relationship(
         'Journal',
         backref=backref('posts',
@@ -168,8 +183,45 @@ class Post(Base):
     def delete(self):
         """Delete post."""
 
+        if self.privacy == 'public':
+            self._count_public(-1)
         DBSession.delete(self)
 
+    def set_privacy(self, privacy):
+        """Change who may read post."""
+
+        if privacy != self.privacy:
+            if 'public' in (privacy, self.privacy):
+                self._count_public(1 if privacy == 'public' else -1)
+            self.privacy = privacy
+
+    def _count_public(self, delta):
+        from .journal import Journal
+        adjust(self.journal, Journal.public_post_count, delta)
+
+    def comment_page(self, after=None, before=None, limit=50,
+                     principals=None):
+        """Page of comments, oldest first.
+
+        :param after: cursor; return the page following it.
+        :param before: cursor; return the page preceding it.
+        :param principals: viewer's principals; hidden comments are left
+          out unless they may hide comments here. If None, all comments
+          are listed.
+        :rtype: :py:class:`okarchive.utils.paging.Page`
+        """
+
+        from .visibility import visible_comments
+        query = (DBSession
+                 .query(Comment)
+                 .filter(Comment.post_id == self.id)
+                 .filter(visible_comments(self, principals)))
+        return keyset_page(query,
+                           (Comment.id,),
+                           after=after,
+                           before=before,
+                           limit=limit)
+
     def add_comment(self,
                     comment=None,
                     _flush=False,
@@ -182,11 +234,14 @@ class Post(Base):
             comment.post_id = self.id
             #DBSession.add(comment)
         self.comments.append(comment)
+        if not comment.hidden:
+            adjust(self, Post.comment_count, 1)
         if _flush:
             DBSession.flush()
         return comment
 
 
 
-Index('post_journalname', Post.journal_name)
+Index('post_journal_privacy_date',
+      Post.journal_name, Post.privacy, Post.creation_date)
 Index('post_title', Post.title)
@@ -0,0 +1,314 @@
+"""Full-text search over posts and comments.
+
+Each post (title, lede and text) and each comment is one document in
+``search_index``. On PostgreSQL that is a table with a ``tsvector``
+column under a GIN index; on SQLite it is an FTS5 virtual table. It is
+created along with the other tables by ``Base.metadata.create_all``.
+
+The index is kept current from the session: :py:func:`index_changes`
+runs after every flush, indexing new and edited posts and comments and
+dropping deleted ones. Bulk writes (the archive importer) bypass the
+session and call :py:func:`index_documents` themselves. An existing
+database can be filled with :py:func:`rebuild`.
+
+Results are joined back to ``posts`` and ``comments``, so the same
+visibility rules as everywhere else apply.
+"""
+
+import html
+import itertools
+import re
+
+from sqlalchemy import (
+    and_,
+    column,
+    event,
+    func,
+    inspect,
+    literal_column,
+    or_,
+    table,
+    text,
+)
+
+from zope.sqlalchemy import mark_changed
+
+from . import Base, DBSession, siteRoot
+from .post import Post
+from .comment import Comment
+from .visibility import (
+    visible_comments_anywhere,
+    visible_posts,
+)
+from ..utils.paging import Page
+
+
+def post_document(post_id, title, lede, body):
+    """Index document for a post."""
+
+    return dict(doc_id=2 * post_id,
+                post_id=post_id,
+                comment_id=None,
+                title=title or '',
+                body=_plain_text((lede or '') + ' ' + (body or '')))
+
+
+def comment_document(comment_id, post_id, body):
+    """Index document for a comment."""
+
+    return dict(doc_id=2 * comment_id + 1,
+                post_id=post_id,
+                comment_id=comment_id,
+                title='',
+                body=_plain_text(body))
+
+
+def _plain_text(markup):
+    """Text of HTML, without tags or entities."""
+
+    return html.unescape(re.sub(r'<[^>]*>', ' ', markup or ''))
+
+
+class SQLiteIndex:
+    """FTS5 virtual table; documents are keyed by rowid."""
+
+    create = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+              "post_id UNINDEXED, comment_id UNINDEXED, title, body, "
+              "tokenize='porter unicode61')"]
+    drop = ["DROP TABLE IF EXISTS search_index"]
+    insert = ("INSERT INTO search_index (rowid, post_id, comment_id, "
+              "title, body) "
+              "VALUES (:doc_id, :post_id, :comment_id, :title, :body)")
+    delete = "DELETE FROM search_index WHERE rowid = :doc_id"
+    # post_id is not indexed in FTS5; find the post's comments by way of
+    # the comments table instead of scanning.
+    delete_post = ("DELETE FROM search_index "
+                   "WHERE rowid = 2 * :post_id OR rowid IN "
+                   "(SELECT 2 * id + 1 FROM comments "
+                   "WHERE post_id = :post_id)")
+    clear = "DELETE FROM search_index"
+
+    docs = table('search_index',
+                 column('rowid'), column('post_id'), column('comment_id'))
+
+    def match(self, terms):
+        """(filter, rank ordering, snippet) SQL for ``terms``."""
+
+        # Quote each word, so user input is never FTS5 query syntax.
+        query = ' '.join('"{}"'.format(word)
+                         for word in re.findall(r'\w+', terms))
+        this = literal_column('search_index')
+        return (this.op('MATCH')(query),
+                # bm25() is lower for better matches; titles weigh more.
+                func.bm25(this, 0.0, 0.0, 10.0, 1.0),
+                func.snippet(this, 3, '', '', '…', 16))
+
+
+class PostgresIndex:
+    """Table with a weighted ``tsvector`` column under a GIN index."""
+
+    create = ["CREATE TABLE IF NOT EXISTS search_index ("
+              "doc_id bigint PRIMARY KEY, "
+              "post_id integer NOT NULL, "
+              "comment_id integer, "
+              "title text NOT NULL, "
+              "body text NOT NULL, "
+              "document tsvector NOT NULL)",
+              "CREATE INDEX IF NOT EXISTS search_index_document "
+              "ON search_index USING gin (document)",
+              "CREATE INDEX IF NOT EXISTS search_index_post "
+              "ON search_index (post_id)"]
+    drop = ["DROP TABLE IF EXISTS search_index"]
+    insert = ("INSERT INTO search_index "
+              "(doc_id, post_id, comment_id, title, body, document) "
+              "VALUES (:doc_id, :post_id, :comment_id, :title, :body, "
+              "setweight(to_tsvector('english', :title), 'A') || "
+              "setweight(to_tsvector('english', :body), 'B'))")
+    delete = "DELETE FROM search_index WHERE doc_id = :doc_id"
+    delete_post = "DELETE FROM search_index WHERE post_id = :post_id"
+    clear = "DELETE FROM search_index"
+
+    docs = table('search_index',
+                 column('doc_id'), column('post_id'), column('comment_id'),
+                 column('body'), column('document'))
+
+    def match(self, terms):
+        """(filter, rank ordering, snippet) SQL for ``terms``."""
+
+        query = func.plainto_tsquery('english', terms)
+        document = self.docs.c.document
+        return (document.op('@@')(query),
+                func.ts_rank(document, query).desc(),
+                func.ts_headline('english', self.docs.c.body, query,
+                                 'MaxWords=24, MinWords=12, '
+                                 'StartSel="", StopSel=""'))
+
+
+_indexes = {
+    'sqlite': SQLiteIndex(),
+    'postgresql': PostgresIndex(),
+}
+
+
+def search_index(bind):
+    """Index implementation for a connection's database, or None."""
+
+    return _indexes.get(bind.dialect.name)
+
+
+@event.listens_for(Base.metadata, 'after_create')
+def create_index(target, connection, **kw):
+    index = search_index(connection)
+    if index is not None:
+        for statement in index.create:
+            connection.execute(text(statement))
+
+
+@event.listens_for(Base.metadata, 'before_drop')
+def drop_index(target, connection, **kw):
+    index = search_index(connection)
+    if index is not None:
+        for statement in index.drop:
+            connection.execute(text(statement))
+
+
+def index_documents(connection, documents=(), removed=(), deleted_posts=()):
+    """Bring the index up to date with written rows.
+
+    :param documents: dicts from :py:func:`post_document` and
+      :py:func:`comment_document`, added or replacing what is indexed.
+    :param removed: IDs of deleted comments.
+    :param deleted_posts: IDs of deleted posts; their comments go too.
+    """
+
+    index = search_index(connection)
+    if index is None:
+        return
+    if deleted_posts:
+        connection.execute(text(index.delete_post),
+                           [dict(post_id=id) for id in deleted_posts])
+    stale = ([dict(doc_id=doc['doc_id']) for doc in documents]
+             + [dict(doc_id=2 * id + 1) for id in removed])
+    if stale:
+        connection.execute(text(index.delete), stale)
+    if documents:
+        connection.execute(text(index.insert), list(documents))
+
+
+def _changed(obj, *attrs):
+    state = inspect(obj).attrs
+    return any(state[attr].history.has_changes() for attr in attrs)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def index_changes(session, flush_context):
+    """Index posts and comments written in this flush."""
+
+    documents = []
+    removed = []
+    deleted_posts = []
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Post):
+                documents.append(
+                    post_document(obj.id, obj.title, obj.lede, obj.text))
+            elif isinstance(obj, Comment):
+                documents.append(
+                    comment_document(obj.id, obj.post_id, obj.text))
+        for obj in session.dirty:
+            if isinstance(obj, Post) and _changed(obj, 'title', 'lede',
+                                                  'text'):
+                documents.append(
+                    post_document(obj.id, obj.title, obj.lede, obj.text))
+            elif isinstance(obj, Comment) and _changed(obj, 'text',
+                                                       'post_id'):
+                documents.append(
+                    comment_document(obj.id, obj.post_id, obj.text))
+        for obj in session.deleted:
+            if isinstance(obj, Post):
+                deleted_posts.append(obj.id)
+            elif isinstance(obj, Comment):
+                removed.append(obj.id)
+    if documents or removed or deleted_posts:
+        index_documents(session.connection(), documents, removed,
+                        deleted_posts)
+
+
+def rebuild():
+    """Index every post and comment from scratch."""
+
+    session = DBSession()
+    connection = session.connection()
+    index = search_index(connection)
+    if index is None:
+        return
+    connection.execute(text(index.clear))
+    posts = (session
+             .query(Post.id, Post.title, Post.lede, Post.text)
+             .yield_per(1000))
+    comments = (session
+                .query(Comment.id, Comment.post_id, Comment.text)
+                .yield_per(1000))
+    documents = itertools.chain((post_document(*row) for row in posts),
+                                (comment_document(*row) for row in comments))
+    while True:
+        batch = list(itertools.islice(documents, 1000))
+        if not batch:
+            break
+        connection.execute(text(index.insert), batch)
+    mark_changed(session)
+
+
+class Search:
+    """Traversable search page resource."""
+
+    __name__ = 'search'
+    __parent__ = siteRoot
+
+    def results(self, terms, page=1, limit=20, principals=None):
+        """Page of posts and comments matching ``terms``, best first.
+
+        Rows have ``post_id``, ``journal_name``, ``title``,
+        ``comment_id`` (None for a post), ``user_id`` (comment author)
+        and ``snippet``. Search pages are numbered: ranked results have
+        no stable key to page on.
+
+        :param page: page number, from 1.
+        :param principals: viewer's principals; only posts and comments
+          they may read are found. If None, everything is searched.
+        :rtype: :py:class:`okarchive.utils.paging.Page`, whose cursors
+          are page numbers.
+        """
+
+        connection = DBSession.connection()
+        index = search_index(connection)
+        if index is None or not re.search(r'\w', terms):
+            return Page([])
+
+        match, rank, snippet = index.match(terms)
+        docs = index.docs
+        rows = (DBSession
+                .query(Post.id.label('post_id'),
+                       Post.journal_name,
+                       Post.title,
+                       docs.c.comment_id,
+                       Comment.user_id,
+                       snippet.label('snippet'))
+                .select_from(docs)
+                .join(Post, Post.id == docs.c.post_id)
+                .outerjoin(Comment, Comment.id == docs.c.comment_id)
+                .filter(match)
+                .filter(visible_posts(principals))
+                .filter(or_(docs.c.comment_id == None,
+                            and_(Comment.id != None,
+                                 visible_comments_anywhere(principals))))
+                .order_by(rank, docs.c.post_id, docs.c.comment_id)
+                .offset((page - 1) * limit)
+                .limit(limit + 1)
+                .all())
+        return Page(rows[:limit],
+                    next_cursor=page + 1 if len(rows) > limit else None,
+                    prev_cursor=page - 1 if page > 1 else None)
+
+
+search_container = Search()
@@ -0,0 +1,120 @@
+"""Cache of facts traversal needs, to skip lookup queries.
+
+Traversal of ``/journals/<name>/<post>/`` would otherwise query for the
+journal and the post before the view runs. The cache holds:
+
+- ``('journal', name)``: True if the journal exists.
+- ``('post', id)``: ``(journal_name, privacy)`` of a post.
+
+On a hit, traversal hands back an unloaded instance with just its key
+(and, for posts, the cached columns) set; anything else is loaded in one
+query the first time it is used, if it is used at all.
+
+Entries are dropped when posts or journals are deleted or a post's
+journal or privacy changes. The backend is chosen by the
+``okarchive.traversal_cache`` settings; see
+:py:func:`okarchive.utils.sharedcache.cache_from_settings`.
+"""
+
+from sqlalchemy import (
+    event,
+    inspect,
+    )
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from . import DBSession
+from ..utils.sharedcache import NullCache
+
+
+class TraversalCache:
+    """Holder for the configured cache backend."""
+
+    def __init__(self):
+        self.backend = NullCache()
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def journal_exists(self, name):
+        return self.backend.get(('journal', name))
+
+    def set_journal(self, name):
+        self.backend.set(('journal', name), True)
+
+    def post(self, post_id):
+        """Return ``(journal_name, privacy)`` of post, if cached."""
+
+        return self.backend.get(('post', post_id))
+
+    def set_post(self, post):
+        self.backend.set(('post', post.id), (post.journal_name, post.privacy))
+
+    def forget_journal(self, name):
+        self.backend.delete(('journal', name))
+
+    def forget_post(self, post_id):
+        self.backend.delete(('post', post_id))
+
+
+traversal_cache = TraversalCache()
+
+
+def known_instance(cls, **values):
+    """Persistent instance of a row known to exist, without a query.
+
+    ``values`` must include the primary key; other attributes are loaded
+    when first used.
+    """
+
+    key = identity_key(cls, tuple(values[col.key]
+                                  for col in inspect(cls).primary_key))
+    obj = DBSession.identity_map.get(key)
+    if obj is None:
+        obj = cls(**values)
+        make_transient_to_detached(obj)
+        DBSession.add(obj)
+    return obj
+
+
+@event.listens_for(DBSession, 'after_flush')
+def forget_changed(session, flush_context):
+    """Drop cache entries for deleted or re-homed journals and posts."""
+
+    from .journal import Journal
+    from .post import Post
+
+    changed = session.info.setdefault('okarchive.traversal_changes', set())
+    for obj in session.deleted:
+        if isinstance(obj, Journal):
+            changed.add(('journal', obj.name))
+        elif isinstance(obj, Post):
+            changed.add(('post', obj.id))
+    for obj in session.dirty:
+        if isinstance(obj, Post):
+            attrs = inspect(obj).attrs
+            if (attrs.privacy.history.has_changes()
+                    or attrs.journal_name.history.has_changes()):
+                changed.add(('post', obj.id))
+    _forget(changed)
+
+
+@event.listens_for(DBSession, 'after_commit')
+def forget_committed(session):
+    """Drop them again: another request may have cached the old row
+    between the flush and the commit."""
+
+    _forget(session.info.pop('okarchive.traversal_changes', ()))
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('okarchive.traversal_changes', None)
+
+
+def _forget(changed):
+    for kind, key in changed:
+        if kind == 'journal':
+            traversal_cache.forget_journal(key)
+        else:
+            traversal_cache.forget_post(key)
@@ -0,0 +1,102 @@
+"""Model for uploaded journal archives."""
+
+import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
+from sqlalchemy.orm import relationship
+
+from . import Base
+from .acl import upload_acl
+
+
+class Upload(Base):
+    """Archive uploaded to a journal, and how its import is going.
+
+    ``status`` goes from ``received`` to ``importing`` and then ``done``
+    (with ``posts`` and ``comments`` counted) or ``failed`` (with
+    ``error``). An attempt that fails but will be tried again leaves it
+    ``retrying``, with that attempt's ``error``.
+    """
+
+    __tablename__ = 'uploads'
+
+    @property
+    def __name__(self):
+        return str(self.id)
+
+    @property
+    def __parent__(self):
+        from .uploads import uploads_container
+        return uploads_container
+
+    @property
+    def __acl__(self):
+        """Permissions: only the journal's owner and editors may look."""
+
+        return upload_acl(self.journal_name)
+
+    id = Column(
+        Integer,
+        primary_key=True,
+        )
+
+    journal_name = Column(
+        String,
+        ForeignKey('journals.name',
+                   ondelete='CASCADE',
+                   onupdate='CASCADE'),
+        nullable=False,
+        )
+
+    user_id = Column(
+        String,
+        nullable=False,
+        )
+
+    # Bytes of the archive as uploaded.
+    size = Column(
+        Integer,
+        nullable=False,
+        )
+
+    status = Column(
+        String,
+        nullable=False,
+        default='received',
+        )
+
+    # The import_upload job importing it.
+    job_id = Column(
+        Integer,
+        ForeignKey('jobs.id'),
+        )
+
+    job = relationship('Job')
+
+    posts = Column(Integer)
+
+    comments = Column(Integer)
+
+    error = Column(Text)
+
+    creation_date = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        )
+
+    modification_date = Column(
+        DateTime,
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        )
+
+
+Index('upload_journal_id', Upload.journal_name, Upload.id)
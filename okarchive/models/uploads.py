@@ -0,0 +1,27 @@
+"""Container of uploaded archives, for their status pages."""
+
+from . import DBSession, siteRoot
+from .upload import Upload
+
+
+class Uploads:
+    """Traversable container of uploads, by ID."""
+
+    __name__ = 'uploads'
+    __parent__ = siteRoot
+
+    def __getitem__(self, key):
+        """Get upload by ID.
+
+        :rtype: :py:class:`.upload.Upload`
+        """
+
+        if not key.isdigit():
+            raise KeyError('Not an integer')
+        upload = DBSession.query(Upload).get(int(key))
+        if upload is None:
+            raise KeyError('No such upload: {}'.format(key))
+        return upload
+
+
+uploads_container = Uploads()
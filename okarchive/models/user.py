@@ -1,11 +1,10 @@
-import hashlib
-
 from sqlalchemy import (
     Column,
     String,
 )
 
 from . import Base
+from ..passwords import passwords
 
 
 class User(Base):
@@ -17,14 +16,31 @@ class User(Base):
         String,
         primary_key=True,
     )
+    password_hash = Column(
+        String,
+        nullable=True,
+        doc='Encoded hash; see okarchive.passwords.',
+    )
     password_md5 = Column(
         String,
-        nullable=False,
+        nullable=True,
+        doc='Legacy unsalted MD5, replaced by password_hash at next sign in.',
     )
 
     def verifyPassword(self, password):
         """Verify password."""
 
-        md5 = hashlib.md5(password.encode()).hexdigest()
-        return md5 == self.password_md5
+        return passwords.check(password, self.password_hash,
+                               self.password_md5)
+
+    def setPassword(self, password):
+        """Store a new hash of password."""
+
+        self.password_hash = passwords.hash(password)
+        self.password_md5 = None
+
+    def needsNewHash(self):
+        """Should the password be hashed again (by the current hasher)?"""
 
+        return (self.password_hash is None
+                or passwords.hasher.needs_update(self.password_hash))
@@ -0,0 +1,99 @@
+"""Which posts and comments a viewer may read, as SQL.
+
+Post privacy is enforced inside the queries that list and traverse posts,
+so posts a viewer can't read are never loaded at all.
+
+- ``public`` posts are visible to everyone.
+- ``private`` and ``friends`` posts are visible to the journal's owner and
+  to editors. (There is no friends list yet, so ``friends`` behaves like
+  ``private``.)
+
+Hidden comments are visible only to those who may hide them: the
+journal's owner and editors.
+"""
+
+from sqlalchemy import (
+    or_,
+    true,
+    )
+
+from pyramid.security import effective_principals
+from pyramid.threadlocal import get_current_request
+
+from .post import Post
+from .comment import Comment
+from .acl import EDITORS
+
+
+def viewer_principals(request=None):
+    """Principals of the viewer, or None when not handling a request.
+
+    Outside a request (scripts, the importer) there is no viewer, and
+    nothing is filtered.
+    """
+
+    if request is None:
+        request = get_current_request()
+    if request is None:
+        return None
+    return effective_principals(request)
+
+
+def viewer_userids(principals):
+    """User IDs among principals (dropping system and group principals)."""
+
+    return [p for p in principals
+            if not p.startswith('system.') and not p.startswith('group:')]
+
+
+def visible_posts(principals):
+    """SQL predicate for posts visible to ``principals``.
+
+    :param principals: effective principals of viewer, or None for
+      no restriction.
+    """
+
+    if principals is None or EDITORS in principals:
+        return true()
+    owners = viewer_userids(principals)
+    if owners:
+        return or_(Post.privacy == 'public', Post.journal_name.in_(owners))
+    return Post.privacy == 'public'
+
+
+def can_view_post(journal_name, privacy, principals):
+    """Python twin of :py:func:`visible_posts`, for a single post."""
+
+    return (principals is None
+            or EDITORS in principals
+            or privacy == 'public'
+            or journal_name in viewer_userids(principals))
+
+
+def visible_comments(post, principals):
+    """SQL predicate for comments on ``post`` visible to ``principals``.
+
+    :param principals: effective principals of viewer, or None for
+      no restriction.
+    """
+
+    if (principals is None
+            or EDITORS in principals
+            or post.journal_name in principals):
+        return true()
+    return Comment.hidden == False
+
+
+def visible_comments_anywhere(principals):
+    """SQL predicate for comments visible to ``principals`` on any post.
+
+    Unlike :py:func:`visible_comments`, the query must join each comment
+    to its post.
+    """
+
+    if principals is None or EDITORS in principals:
+        return true()
+    owners = viewer_userids(principals)
+    if owners:
+        return or_(Comment.hidden == False, Post.journal_name.in_(owners))
+    return Comment.hidden == False
@@ -0,0 +1,137 @@
+"""Cache of rendered pages for anonymous readers.
+
+Pages are keyed by resource, view, query string, the resource's last
+modification time and the viewer's principals. Views that change a
+resource invalidate the cached pages of it and of everything above it,
+since journal and post listings show their children.
+
+The cache is per process and sized in bytes of response body by the
+``okarchive.page_cache.max_bytes`` setting; 0 disables it. Pages older
+than ``okarchive.page_cache.max_age`` seconds are rendered again, which
+bounds how long a change made behind the site's back (by a script, or
+another process) goes unseen.
+"""
+
+import logging
+import time
+
+import transaction
+
+from pyramid.response import Response
+from pyramid.security import (
+    authenticated_userid,
+    effective_principals,
+)
+from pyramid.traversal import (
+    lineage,
+    resource_path,
+)
+
+from .utils.lru import LRUCache
+
+log = logging.getLogger(__name__)
+
+
+class PageCache:
+    """LRU cache of rendered responses, invalidated by resource path."""
+
+    def __init__(self, max_bytes=0, max_age=None, clock=time.monotonic):
+        self.configure(max_bytes, max_age, clock)
+
+    def configure(self, max_bytes, max_age=None, clock=time.monotonic):
+        """(Re)create the cache with a new byte budget, emptying it.
+
+        :param max_age: *(optional)* seconds a page is served from cache.
+        """
+
+        self.enabled = max_bytes > 0
+        self._by_path = {}
+        self._cache = LRUCache(max_bytes=max_bytes, ttl=max_age,
+                               on_evict=self._forget, clock=clock)
+
+    def _forget(self, key):
+        keys = self._by_path.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_path[key[0]]
+
+    def key_for(self, context, request):
+        """Cache key for this request, or None if it can't be cached."""
+
+        if (not self.enabled
+                or request.method != 'GET'
+                or authenticated_userid(request) is not None
+                or request.session.peek_flash()):
+            return None
+        return (resource_path(context),
+                request.view_name,
+                request.query_string,
+                getattr(context, 'modification_date', None),
+                tuple(sorted(effective_principals(request))))
+
+    def get(self, key):
+        """Return a fresh copy of a cached response, or None.
+
+        Pages older than ``max_age`` count as missing.
+        """
+
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        status, headerlist, body = cached
+        return Response(status=status, headerlist=list(headerlist), body=body)
+
+    def set(self, key, response):
+        """Cache a successful, fully-rendered response."""
+
+        if response.status_int != 200 or 'Set-Cookie' in response.headers:
+            return
+        body = response.body
+        self._cache.set(key,
+                        (response.status, tuple(response.headerlist), body),
+                        size=len(body))
+        self._by_path.setdefault(key[0], set()).add(key)
+
+    def invalidate_path(self, path):
+        """Drop all cached pages for a resource path."""
+
+        for key in list(self._by_path.pop(path, ())):
+            self._cache.delete(key)
+
+    def invalidate(self, resource):
+        """Drop cached pages for a resource and all its ancestors.
+
+        This happens now and again when the transaction commits, so a
+        page rendered from the old data in the meantime is not kept.
+        """
+
+        paths = [resource_path(r) for r in lineage(resource)]
+
+        def invalidate(success=True):
+            for path in paths:
+                self.invalidate_path(path)
+
+        invalidate()
+        transaction.get().addAfterCommitHook(invalidate)
+
+
+page_cache = PageCache()
+
+
+def cached_page(view):
+    """View decorator serving anonymous pages from :py:data:`page_cache`."""
+
+    def cached_view(context, request):
+        key = page_cache.key_for(context, request)
+        if key is None:
+            return view(context, request)
+        response = page_cache.get(key)
+        if response is not None:
+            log.debug('page cache hit: %s', key[0])
+            return response
+        response = view(context, request)
+        page_cache.set(key, response)
+        return response
+
+    return cached_view
@@ -0,0 +1,247 @@
+"""Password hashing and the sign-in guard rails around it.
+
+- :py:class:`ScryptHasher` hashes passwords with ``hashlib.scrypt``.
+  Hashes record their own parameters, so raising the cost later still
+  verifies old hashes; they are re-hashed at the user's next sign in.
+- :py:class:`Throttle` allows each user a token bucket of sign-in
+  attempts.
+- :py:class:`HashPool` runs hashing on a few threads of its own, and turns
+  work away when they are busy, so a flood of sign ins can't tie up every
+  server thread: it never admits as many sign ins as there are server
+  threads, leaving at least one for everything else.
+
+They are configured from ``okarchive.password_hasher*``,
+``okarchive.login_throttle.*`` and ``okarchive.password_pool.*`` settings
+by :py:meth:`Passwords.configure`.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyramid.path import DottedNameResolver
+
+from .utils.lru import LRUCache
+
+
+class LoginUnavailable(Exception):
+    """Sign in can't be tried now; the message says why."""
+
+
+class PoolFull(LoginUnavailable):
+    """Every password thread is taken; try again after ``retry_after``."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+class ScryptHasher:
+    """scrypt password hashes, as ``scrypt$n$r$p$salt$hash``."""
+
+    algorithm = 'scrypt'
+
+    def __init__(self, n=2 ** 14, r=8, p=1, salt_bytes=16, dklen=32):
+        self.n = int(n)
+        self.r = int(r)
+        self.p = int(p)
+        self.salt_bytes = int(salt_bytes)
+        self.dklen = int(dklen)
+
+    def _derive(self, password, salt, n, r, p, dklen):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              dklen=dklen,
+                              # scrypt needs about 128 * n * r bytes.
+                              maxmem=256 * n * r + 2 ** 20)
+
+    def hash(self, password):
+        """Encoded hash of password, with a new salt."""
+
+        salt = os.urandom(self.salt_bytes)
+        digest = self._derive(password, salt, self.n, self.r, self.p,
+                              self.dklen)
+        return '$'.join([self.algorithm, str(self.n), str(self.r),
+                         str(self.p), _b64(salt), _b64(digest)])
+
+    def verify(self, password, encoded):
+        """Does password match an encoded hash?"""
+
+        try:
+            algorithm, n, r, p, salt, digest = encoded.split('$')
+            salt = base64.b64decode(salt)
+            digest = base64.b64decode(digest)
+            n, r, p = int(n), int(r), int(p)
+        except ValueError:
+            return False
+        if algorithm != self.algorithm:
+            return False
+        return hmac.compare_digest(
+            self._derive(password, salt, n, r, p, len(digest)), digest)
+
+    def needs_update(self, encoded):
+        """Was encoded hash made by another hasher or with other settings?"""
+
+        prefix = '$'.join([self.algorithm, str(self.n), str(self.r),
+                           str(self.p)]) + '$'
+        return not encoded.startswith(prefix)
+
+
+def verify_md5(password, md5):
+    """Check password against a legacy unsalted MD5 hex digest."""
+
+    return hmac.compare_digest(hashlib.md5(password.encode()).hexdigest(),
+                               md5)
+
+
+class TokenBucket:
+    """``burst`` tokens, refilled at ``rate`` per second."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def take(self):
+        """Take a token if there is one."""
+
+        now = self.clock()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class Throttle:
+    """Per-key token buckets.
+
+    Buckets of keys not seen for long enough to have refilled are
+    forgotten, and at most ``max_keys`` are kept.
+    """
+
+    def __init__(self, rate=0.2, burst=5, max_keys=100000,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._buckets = LRUCache(max_items=max_keys,
+                                 ttl=burst / rate if rate else None,
+                                 clock=clock)
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """May ``key`` try now? Uses up a token if so."""
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst, self.clock)
+            allowed = bucket.take()
+            self._buckets.set(key, bucket)
+            return allowed
+
+
+class HashPool:
+    """Threads for password hashing, with bounded admission.
+
+    At most ``workers`` hashes run at once and ``waiting`` more queue for
+    a thread; past that, :py:meth:`run` refuses at once rather than hold
+    up the calling server thread. The caller's thread waits for the hash,
+    so given the server's ``threads``, fewer than that are ever admitted.
+    """
+
+    def __init__(self, workers=2, waiting=8, threads=None, retry_after=1):
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password')
+        self.admitted = workers + waiting
+        if threads is not None:
+            self.admitted = max(1, min(self.admitted, threads - 1))
+        self.retry_after = retry_after
+        self._admission = threading.BoundedSemaphore(self.admitted)
+
+    def run(self, fn, *args):
+        """Call ``fn(*args)`` on a pool thread and return its result.
+
+        :raises PoolFull: if the pool is full.
+        """
+
+        if not self._admission.acquire(blocking=False):
+            raise PoolFull('Too many people are signing in; '
+                           'please try again in a moment.',
+                           self.retry_after)
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._admission.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class Passwords:
+    """Holder for the configured hasher, throttle and pool."""
+
+    def __init__(self):
+        self.hasher = ScryptHasher()
+        self.throttle = Throttle()
+        self.pool = HashPool()
+
+    def configure(self, settings, threads=None):
+        """Set up from ``okarchive.*`` settings.
+
+        :param threads: server threads, which bound the pool's admission.
+        """
+
+        prefix = 'okarchive.password_hasher'
+        factory = DottedNameResolver().maybe_resolve(
+            settings.get(prefix, ScryptHasher))
+        options = {key[len(prefix) + 1:]: value
+                   for key, value in settings.items()
+                   if key.startswith(prefix + '.')}
+        self.hasher = factory(**options)
+
+        self.throttle = Throttle(
+            rate=float(settings.get('okarchive.login_throttle.rate', 0.2)),
+            burst=int(settings.get('okarchive.login_throttle.burst', 5)))
+
+        self.pool.shutdown()
+        self.pool = HashPool(
+            workers=int(settings.get('okarchive.password_pool.workers', 2)),
+            waiting=int(settings.get('okarchive.password_pool.waiting', 8)),
+            threads=threads,
+            retry_after=int(settings.get(
+                'okarchive.password_pool.retry_after', 1)))
+
+    def check(self, password, password_hash=None, password_md5=None):
+        """Check password against a user's stored hash (on a pool thread).
+
+        :raises LoginUnavailable: if the pool is full.
+        """
+
+        if password_hash:
+            return self.pool.run(self.hasher.verify, password, password_hash)
+        if password_md5:
+            return verify_md5(password, password_md5)
+        # Take as long as a real check, so unknown users don't stand out.
+        self.pool.run(self.hasher.hash, password)
+        return False
+
+    def hash(self, password):
+        """New hash of password (on a pool thread)."""
+
+        return self.pool.run(self.hasher.hash, password)
+
+
+passwords = Passwords()
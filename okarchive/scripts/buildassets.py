@@ -0,0 +1,22 @@
+"""Build fingerprinted, compressed static assets (see okarchive.assets)."""
+
+import os
+import sys
+
+from ..assets import build
+
+
+def usage(argv): #pragma NOCOVER
+    cmd = os.path.basename(argv[0])
+    print('usage: %s\n'
+          '(rebuilds okarchive/static/build/; run after changing templates '
+          'or static files)' % cmd)
+    sys.exit(1)
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    if len(argv) != 1:
+        usage(argv)
+
+    manifest = build()
+    print('Built %d assets.' % len(manifest))
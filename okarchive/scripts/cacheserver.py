@@ -0,0 +1,36 @@
+"""Run the shared traversal cache server for one host."""
+
+import os
+import sys
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from ..utils.sharedcache import serve
+
+
+def usage(argv): #pragma NOCOVER
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <config_uri>\n'
+          '(example: "%s production.ini")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    if len(argv) != 2:
+        usage(argv)
+
+    config_uri = argv[1]
+    setup_logging(config_uri)
+    settings = get_appsettings(config_uri)
+    prefix = 'okarchive.traversal_cache'
+    address = settings[prefix + '.address']
+    if os.path.exists(address):
+        os.unlink(address)  # stale socket from a previous run
+    print('Serving traversal cache on %s' % address)
+    serve(address,
+          settings[prefix + '.authkey'].encode(),
+          max_items=int(settings.get(prefix + '.max_items', 10000)),
+          ttl=float(settings.get(prefix + '.ttl', 300)))
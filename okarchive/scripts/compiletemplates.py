@@ -0,0 +1,34 @@
+"""Compile every template into the okarchive.template_cache directory."""
+
+import os
+import sys
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from .. import main as make_app
+
+
+def usage(argv): #pragma NOCOVER
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <config_uri>\n'
+          '(example: "%s production.ini")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    if len(argv) != 2:
+        usage(argv)
+
+    config_uri = argv[1]
+    setup_logging(config_uri)
+    settings = dict(get_appsettings(config_uri))
+    if not settings.get('okarchive.template_cache'):
+        print('okarchive.template_cache is not set in %s' % config_uri)
+        sys.exit(1)
+    settings['okarchive.warm_templates'] = 'true'
+    # Built as the server builds it, so the compiled templates match.
+    make_app({}, **settings)
+    print('Compiled templates into %s.' % settings['okarchive.template_cache'])
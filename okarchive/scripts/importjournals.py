@@ -0,0 +1,102 @@
+"""Import a directory of journal archives across worker processes."""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from sqlalchemy import engine_from_config
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from ..models import (
+    DBSession,
+    Base,
+    )
+from ..utils.unarchive import import_journal
+
+
+def journal_name_for(path):
+    """Journal name for an archive; ``distractionbike.zip`` is
+    imported into journal ``distractionbike``."""
+
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def init_worker(settings): #pragma NOCOVER
+    """Give each worker process its own engine and session."""
+
+    engine = engine_from_config(settings, 'sqlalchemy.')
+    DBSession.remove()
+    DBSession.configure(bind=engine)
+
+
+def import_archive(path):
+    """Import one archive, capturing failure rather than raising.
+
+    :returns: ``(path, counts, seconds, error)``; ``counts`` is the
+      ``(posts, comments)`` tuple or None if the import failed.
+    """
+
+    start = time.time()
+    try:
+        counts = import_journal(path, journal_name_for(path))
+    except Exception as e:
+        return path, None, time.time() - start, '%s: %s' % (
+            type(e).__name__, e)
+    return path, counts, time.time() - start, None
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Import every journal archive (*.zip) in a directory.')
+    parser.add_argument('config_uri', help='e.g. development.ini')
+    parser.add_argument('directory', help='directory of journal archives')
+    parser.add_argument('-j', '--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of worker processes '
+                             '(default: %(default)s)')
+    return parser.parse_args(argv[1:])
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    args = parse_args(argv)
+    setup_logging(args.config_uri)
+    settings = get_appsettings(args.config_uri)
+
+    engine = engine_from_config(settings, 'sqlalchemy.')
+    Base.metadata.create_all(engine)
+    engine.dispose()  # never share pooled connections with workers
+
+    paths = sorted(os.path.join(args.directory, f)
+                   for f in os.listdir(args.directory)
+                   if f.lower().endswith('.zip'))
+    total = len(paths)
+    failures = []
+    start = time.time()
+
+    with multiprocessing.Pool(args.workers,
+                              initializer=init_worker,
+                              initargs=(settings,)) as pool:
+        results = pool.imap_unordered(import_archive, paths)
+        for done, (path, counts, seconds, error) in enumerate(results, 1):
+            name = journal_name_for(path)
+            if error:
+                failures.append((path, error))
+                print('[%d/%d] %s: FAILED in %.1fs: %s'
+                      % (done, total, name, seconds, error))
+            else:
+                print('[%d/%d] %s: %d posts, %d comments in %.1fs'
+                      % ((done, total, name) + counts + (seconds,)))
+            sys.stdout.flush()
+
+    print('Imported %d of %d archives in %.1fs.'
+          % (total - len(failures), total, time.time() - start))
+    for path, error in failures:
+        print('FAILED %s: %s' % (path, error))
+    sys.exit(1 if failures else 0)
@@ -1,6 +1,5 @@
 import os
 import sys
-import hashlib
 
 import transaction
 from sqlalchemy import engine_from_config
@@ -13,7 +12,9 @@ from pyramid.paster import (
 from ..models import (
     DBSession,
     Base,
+    Group,
     Journal,
+    Membership,
     Post,
     User,
     )
@@ -39,11 +40,16 @@ def main(argv=sys.argv): #pragma NOCOVER
     Base.metadata.create_all(engine)
 
     with transaction.manager:
-        password = hashlib.md5('secret'.encode()).hexdigest()
-        user = User(name='distractionbike', password_md5=password)
+        user = User(name='distractionbike')
+        user.setPassword('secret')
         DBSession.add(user)
-        user2 = User(name='otherguy', password_md5=password)
+        user2 = User(name='otherguy')
+        user2.setPassword('secret')
         DBSession.add(user2)
+        DBSession.add(Group(name='editors', title='Editors'))
+        DBSession.add(Group(name='moderators', title='Moderators'))
+        DBSession.add(Membership(user_name='distractionbike',
+                                 group_name='editors'))
         journal = Journal(name='distractionbike')
         DBSession.add(journal)
         post = Post(journal_name='distractionbike',
@@ -0,0 +1,41 @@
+"""Rebuild the search index from the posts and comments tables."""
+
+import os
+import sys
+
+import transaction
+from sqlalchemy import engine_from_config
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from ..models import (
+    DBSession,
+    Base,
+    )
+from ..models.search import rebuild
+
+
+def usage(argv): #pragma NOCOVER
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <config_uri>\n'
+          '(example: "%s development.ini")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    if len(argv) != 2:
+        usage(argv)
+
+    config_uri = argv[1]
+    setup_logging(config_uri)
+    settings = get_appsettings(config_uri)
+    engine = engine_from_config(settings, 'sqlalchemy.')
+    DBSession.configure(bind=engine)
+    # Creates the index if this database predates it.
+    Base.metadata.create_all(engine)
+
+    with transaction.manager:
+        rebuild()
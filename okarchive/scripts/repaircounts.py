@@ -0,0 +1,37 @@
+"""Recompute the denormalized post and comment counters."""
+
+import os
+import sys
+
+import transaction
+from sqlalchemy import engine_from_config
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from ..models import DBSession
+from ..models.counts import repair
+
+
+def usage(argv): #pragma NOCOVER
+    cmd = os.path.basename(argv[0])
+    print('usage: %s <config_uri>\n'
+          '(example: "%s development.ini")' % (cmd, cmd))
+    sys.exit(1)
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    if len(argv) != 2:
+        usage(argv)
+
+    config_uri = argv[1]
+    setup_logging(config_uri)
+    settings = get_appsettings(config_uri)
+    engine = engine_from_config(settings, 'sqlalchemy.')
+    DBSession.configure(bind=engine)
+
+    with transaction.manager:
+        fixed = repair()
+    print('Fixed %d counters.' % fixed)
@@ -0,0 +1,56 @@
+"""Run background jobs queued in the database."""
+
+import argparse
+import os
+import signal
+import sys
+
+from pyramid.paster import (
+    get_appsettings,
+    setup_logging,
+    )
+
+from ..database import engine_from_settings
+from ..jobs import worker_from_settings
+from ..models import (
+    DBSession,
+    Base,
+    )
+from ..uploads import archive_imports  # also registers import_upload
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]),
+        description='Run queued background jobs.')
+    parser.add_argument('config_uri', help='e.g. development.ini')
+    parser.add_argument('-c', '--concurrency', type=int,
+                        help='jobs run at once (default: '
+                             'okarchive.jobs.concurrency, or 1)')
+    parser.add_argument('--drain', action='store_true',
+                        help='exit once no job is ready to run')
+    return parser.parse_args(argv[1:])
+
+
+def main(argv=sys.argv): #pragma NOCOVER
+    args = parse_args(argv)
+    setup_logging(args.config_uri)
+    settings = get_appsettings(args.config_uri)
+
+    overrides = {}
+    if args.concurrency:
+        overrides['concurrency'] = args.concurrency
+    worker = worker_from_settings(settings, **overrides)
+    engine = engine_from_settings(settings, worker.concurrency)
+    DBSession.configure(bind=engine)
+    # Creates the jobs table if this database predates it.
+    Base.metadata.create_all(engine)
+    archive_imports.configure(settings)
+
+    def stop(signum, frame):
+        print('Stopping once running jobs finish.')
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    worker.work(drain=args.drain)
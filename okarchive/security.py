@@ -2,31 +2,247 @@
 
 import logging
 
+from sqlalchemy import (
+    event,
+    inspect,
+)
+
+from pyramid.authentication import AuthTktAuthenticationPolicy
+from pyramid.authorization import ACLAuthorizationPolicy
+from pyramid.events import (
+    NewResponse,
+    subscriber,
+)
+from pyramid.interfaces import (
+    IAuthenticationPolicy,
+    IAuthorizationPolicy,
+)
+from pyramid.security import effective_principals
+from pyramid.threadlocal import get_current_request
+
 from .models import (
     DBSession,
+    Membership,
     User,
 )
-
-GROUPS = {'distractionbike': ['group:editors'],
-}
+from .passwords import (
+    LoginUnavailable,
+    passwords,
+)
+from .utils.sharedcache import NullCache
 
 log = logging.getLogger(__name__)
 
+_UNKNOWN = object()
+
+
+class GroupCache:
+    """Cache of each user's group principals.
+
+    The backend is chosen by the ``okarchive.group_cache`` settings; see
+    :py:func:`okarchive.utils.sharedcache.cache_from_settings`. Entries
+    are dropped when memberships change through the session; a process
+    with its own memory cache sees other processes' changes once the
+    entry expires.
+    """
+
+    def __init__(self):
+        self.backend = NullCache()
+
+    def configure(self, backend):
+        self.backend = backend
+
+    def get(self, userid):
+        """Tuple of group principals of user, if cached."""
+
+        return self.backend.get(('groups', userid))
+
+    def set(self, userid, groups):
+        self.backend.set(('groups', userid), tuple(groups))
+
+    def forget(self, userid):
+        """Drop user's entry, after changing their memberships."""
+
+        self.backend.delete(('groups', userid))
+
+
+group_cache = GroupCache()
+
 
 def group_finder(userid, request):
     """Given a userid, return groups they are part of."""
 
-    log.debug('groupfinder: %s', userid)
-    return GROUPS.get(userid, [])
+    groups = group_cache.get(userid)
+    if groups is None:
+        log.debug('groupfinder: %s', userid)
+        groups = tuple('group:' + name for (name,) in
+                       DBSession
+                       .query(Membership.group_name)
+                       .filter(Membership.user_name == userid)
+                       .order_by(Membership.group_name))
+        group_cache.set(userid, groups)
+    return list(groups)
+
+
+@event.listens_for(DBSession, 'after_flush')
+def forget_changed_groups(session, flush_context):
+    """Drop cached groups of users whose memberships changed."""
+
+    changed = session.info.setdefault('okarchive.group_changes', set())
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Membership):
+            history = inspect(obj).attrs.user_name.history
+            changed.update(history.sum())
+    for userid in changed:
+        group_cache.forget(userid)
+
+
+@event.listens_for(DBSession, 'after_commit')
+def forget_committed_groups(session):
+    """Drop them again: another request may have cached the old groups
+    between the flush and the commit."""
+
+    for userid in session.info.pop('okarchive.group_changes', ()):
+        group_cache.forget(userid)
+
+
+@event.listens_for(DBSession, 'after_rollback')
+def discard_group_changes(session):
+    session.info.pop('okarchive.group_changes', None)
+
+
+class AuthorizationCache:
+    """What one request has learned about its viewer.
+
+    :ivar evaluations: permission checks that walked the ACLs.
+    :ivar hits: permission checks answered from the cache.
+    """
+
+    def __init__(self):
+        self.userid = _UNKNOWN
+        self.principals = None
+        self.permits = {}
+        self.evaluations = 0
+        self.hits = 0
+
+    def clear(self):
+        """Forget the viewer, after they sign in or out."""
+
+        self.userid = _UNKNOWN
+        self.principals = None
+        self.permits = {}
+
+
+def authorization_cache(request):
+    """The request's :py:class:`AuthorizationCache`."""
+
+    cache = getattr(request, '_authorization_cache', None)
+    if cache is None:
+        cache = request._authorization_cache = AuthorizationCache()
+    return cache
+
+
+class CachingAuthenticationPolicy(AuthTktAuthenticationPolicy):
+    """Auth ticket policy that works out each request's viewer once.
+
+    ``group_finder`` runs once per request, however many times views and
+    templates ask who is signed in.
+    """
+
+    def authenticated_userid(self, request):
+        cache = authorization_cache(request)
+        if cache.userid is _UNKNOWN:
+            cache.userid = super().authenticated_userid(request)
+        return cache.userid
+
+    def effective_principals(self, request):
+        cache = authorization_cache(request)
+        if cache.principals is None:
+            cache.principals = super().effective_principals(request)
+        return cache.principals
+
+    def remember(self, request, userid, **kw):
+        authorization_cache(request).clear()
+        return super().remember(request, userid, **kw)
+
+    def forget(self, request):
+        authorization_cache(request).clear()
+        return super().forget(request)
+
+
+class CachingAuthorizationPolicy(ACLAuthorizationPolicy):
+    """ACL policy that remembers each decision for the current request."""
+
+    def permits(self, context, principals, permission):
+        request = get_current_request()
+        if request is None:
+            return super().permits(context, principals, permission)
+        cache = authorization_cache(request)
+        key = (id(context), tuple(principals), permission)
+        try:
+            # The context is kept with its decision, so its id can't be
+            # reused by another object during the request.
+            result = cache.permits[key][1]
+            cache.hits += 1
+        except KeyError:
+            result = super().permits(context, principals, permission)
+            cache.permits[key] = (context, result)
+            cache.evaluations += 1
+        return result
+
+
+@subscriber(NewResponse)
+def log_authorization(event):
+    """Log how many permission checks a request made."""
+
+    cache = getattr(event.request, '_authorization_cache', None)
+    if cache is not None and log.isEnabledFor(logging.DEBUG):
+        log.debug('%s %s: %d ACL evaluations, %d cached',
+                  event.request.method, event.request.path,
+                  cache.evaluations, cache.hits)
+
+
+def permitted(request, context, permissions, principals=None):
+    """Which of ``permissions`` the viewer has on ``context``.
+
+    Like ``has_permission`` for each permission, but the viewer's
+    principals are worked out only once (or passed in).
+    """
+
+    registry = request.registry
+    policy = registry.queryUtility(IAuthorizationPolicy)
+    if registry.queryUtility(IAuthenticationPolicy) is None or policy is None:
+        return set(permissions)
+    if principals is None:
+        principals = effective_principals(request)
+    return {permission for permission in permissions
+            if policy.permits(context, principals, permission)}
 
 
 def authenticate(userid, password):
-    """Authenticate user."""
+    """Authenticate user.
+
+    Stored hashes made by an older hasher (or older settings) are
+    replaced with a current one.
+
+    :raises okarchive.passwords.LoginUnavailable: if the user has tried
+      too often lately, or too many sign ins are being checked at once.
+    """
 
-    log.debug('authenticate: %s, %s', userid, password)
+    log.debug('authenticate: %s', userid)
+    if not passwords.throttle.allow(userid):
+        log.warning('sign in throttled for %s', userid)
+        raise LoginUnavailable('Too many sign in attempts; '
+                               'please wait a minute and try again.')
     user = (DBSession
             .query(User)
             .filter(User.name == userid)
             .first())
-    if user:
-        return user.verifyPassword(password)
\ No newline at end of file
+    if not user:
+        passwords.check(password)
+        return False
+    if not user.verifyPassword(password):
+        return False
+    if user.needsNewHash():
+        user.setPassword(password)
+    return True
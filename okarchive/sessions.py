@@ -0,0 +1,340 @@
+"""Server-side sessions.
+
+The session cookie holds only a random session id; the data stays on the
+server in a store:
+
+- :py:class:`SQLSessionStore`: a ``sessions`` table, through an engine of
+  its own (sessions are written after the request's transaction ends).
+- :py:class:`FileSessionStore`: one small file per session in a local
+  directory, for a single host.
+
+Sessions are loaded only when a request carries a session cookie, and
+written only when they change (or, when read, once they are halfway to
+expiring). A :py:class:`Sweeper` thread deletes expired sessions.
+
+Configured by the ``okarchive.session.*`` settings; see
+:py:func:`session_factory_from_settings`.
+"""
+
+import binascii
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import (
+    Column,
+    Float,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+)
+from zope.interface import implementer
+
+from pyramid.interfaces import ISession
+from pyramid.settings import asbool
+
+log = logging.getLogger(__name__)
+
+
+def _new_id():
+    return binascii.hexlify(os.urandom(32)).decode('ascii')
+
+
+def _valid_id(session_id):
+    return (len(session_id) == 64
+            and all(c in '0123456789abcdef' for c in session_id))
+
+
+class SQLSessionStore:
+    """Sessions in a database table, as JSON."""
+
+    def __init__(self, url, **engine_options):
+        self.engine = create_engine(url, **engine_options)
+        metadata = MetaData()
+        self.table = Table(
+            'sessions', metadata,
+            Column('id', String, primary_key=True),
+            Column('data', Text, nullable=False),
+            Column('created', Float, nullable=False),
+            Column('expires', Float, nullable=False, index=True),
+        )
+        metadata.create_all(self.engine)
+
+    def load(self, session_id):
+        """Return (data, created, expires) of a live session, or None."""
+
+        table = self.table
+        row = self.engine.execute(
+            table.select()
+            .where(table.c.id == session_id)
+            .where(table.c.expires > time.time())).first()
+        if row is None:
+            return None
+        return json.loads(row.data), row.created, row.expires
+
+    def save(self, session_id, data, created, expires):
+        table = self.table
+        values = dict(data=json.dumps(data), created=created, expires=expires)
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                table.update().where(table.c.id == session_id).values(values))
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(id=session_id,
+                                                         **values))
+
+    def delete(self, session_id):
+        self.engine.execute(
+            self.table.delete().where(self.table.c.id == session_id))
+
+    def sweep(self):
+        """Delete expired sessions; return how many."""
+
+        return self.engine.execute(
+            self.table.delete().where(self.table.c.expires <= time.time())
+        ).rowcount
+
+
+class FileSessionStore:
+    """Sessions as JSON files in a directory, spread over subdirectories.
+
+    Each file is replaced whole, so readers never see a partial write.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, session_id[:2], session_id)
+
+    def _read(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, session_id):
+        """Return (data, created, expires) of a live session, or None."""
+
+        record = self._read(self._path(session_id))
+        if record is None or record['expires'] <= time.time():
+            return None
+        return record['data'], record['created'], record['expires']
+
+    def save(self, session_id, data, created, expires):
+        path = self._path(session_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(dict(data=data, created=created, expires=expires),
+                          fh)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def delete(self, session_id):
+        try:
+            os.unlink(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        """Delete expired sessions; return how many."""
+
+        now = time.time()
+        swept = 0
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                record = self._read(path)
+                if record is None or record['expires'] <= now:
+                    try:
+                        os.unlink(path)
+                        swept += 1
+                    except FileNotFoundError:
+                        pass
+        return swept
+
+
+class Sweeper(threading.Thread):
+    """Daemon thread sweeping a store every ``interval`` seconds."""
+
+    def __init__(self, store, interval):
+        super().__init__(name='session-sweeper', daemon=True)
+        self.store = store
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                swept = self.store.sweep()
+                log.debug('swept %d expired sessions', swept)
+            except Exception:
+                log.exception('sweeping sessions failed')
+
+    def stop(self):
+        self.stopped.set()
+
+
+def _changes(method):
+    """Wrap a dict method so that calling it marks the session changed."""
+
+    def wrapper(self, *args, **kw):
+        self.changed()
+        return method(self, *args, **kw)
+
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+@implementer(ISession)
+class ServerSession(dict):
+    """Session whose data is kept in a store, keyed by the cookie."""
+
+    def __init__(self, factory, request, session_id=None, data=None,
+                 created=None, expires=None):
+        super().__init__(data or {})
+        self._factory = factory
+        self._id = session_id
+        self._expires = expires
+        self._changed = False
+        self._invalidated = False
+        self.created = created if created is not None else time.time()
+        self.new = session_id is None
+        request.add_response_callback(self._respond)
+
+    def changed(self):
+        self._changed = True
+
+    def invalidate(self):
+        self.clear()
+        self._invalidated = True
+        self._changed = False
+
+    __setitem__ = _changes(dict.__setitem__)
+    __delitem__ = _changes(dict.__delitem__)
+    clear = _changes(dict.clear)
+    pop = _changes(dict.pop)
+    popitem = _changes(dict.popitem)
+    setdefault = _changes(dict.setdefault)
+    update = _changes(dict.update)
+
+    def flash(self, msg, queue='', allow_duplicate=True):
+        storage = self.setdefault('_f_' + queue, [])
+        if allow_duplicate or msg not in storage:
+            storage.append(msg)
+
+    def pop_flash(self, queue=''):
+        # Only a session that had messages changes; templates pop the
+        # queue on every page.
+        if '_f_' + queue not in self:
+            return []
+        return self.pop('_f_' + queue)
+
+    def peek_flash(self, queue=''):
+        return self.get('_f_' + queue, [])
+
+    def new_csrf_token(self):
+        token = binascii.hexlify(os.urandom(20)).decode('ascii')
+        self['_csrft_'] = token
+        return token
+
+    def get_csrf_token(self):
+        token = self.get('_csrft_')
+        if token is None:
+            token = self.new_csrf_token()
+        return token
+
+    def _respond(self, request, response):
+        factory = self._factory
+        store = factory.store
+        if self._invalidated or not self:
+            # Nothing left worth keeping a session for.
+            if self._id is not None and (self._invalidated or self._changed):
+                store.delete(self._id)
+                response.delete_cookie(factory.cookie_name, path=factory.path)
+                self._id = self._expires = None
+            if not self:
+                return
+
+        now = time.time()
+        renew = (self._expires is not None
+                 and self._expires - now < factory.timeout / 2)
+        if not (self._changed or renew):
+            return
+        if self._id is None:
+            self._id = _new_id()
+        self._expires = now + factory.timeout
+        store.save(self._id, dict(self), self.created, self._expires)
+        response.set_cookie(factory.cookie_name, self._id,
+                            max_age=factory.timeout,
+                            path=factory.path,
+                            secure=factory.secure,
+                            httponly=True)
+        self._changed = False
+
+
+class ServerSessionFactory:
+    """Pyramid session factory for a session store.
+
+    :param timeout: seconds a session lives after its last write.
+    """
+
+    def __init__(self, store, cookie_name='okarchive_session', timeout=86400,
+                 path='/', secure=False):
+        self.store = store
+        self.cookie_name = cookie_name
+        self.timeout = timeout
+        self.path = path
+        self.secure = secure
+
+    def __call__(self, request):
+        session_id = request.cookies.get(self.cookie_name)
+        if session_id and _valid_id(session_id):
+            loaded = self.store.load(session_id)
+            if loaded is not None:
+                data, created, expires = loaded
+                return ServerSession(self, request, session_id, data,
+                                     created, expires)
+        return ServerSession(self, request)
+
+
+def session_factory_from_settings(settings):
+    """Build a session factory, and start its sweeper.
+
+    ``okarchive.session.backend`` is ``sql`` (default) or ``file``.
+    ``okarchive.session.url`` is the database for ``sql`` (default: the
+    app's ``sqlalchemy.url``); ``okarchive.session.directory`` is where
+    ``file`` keeps sessions. ``okarchive.session.timeout`` and
+    ``okarchive.session.sweep_interval`` are in seconds;
+    ``okarchive.session.secure`` sends the cookie over HTTPS only.
+    """
+
+    prefix = 'okarchive.session.'
+    backend = settings.get(prefix + 'backend', 'sql')
+    if backend == 'sql':
+        store = SQLSessionStore(settings.get(prefix + 'url',
+                                             settings['sqlalchemy.url']))
+    elif backend == 'file':
+        store = FileSessionStore(settings[prefix + 'directory'])
+    else:
+        raise ValueError('Unknown session backend: {}'.format(backend))
+
+    interval = float(settings.get(prefix + 'sweep_interval', 600))
+    if interval > 0:
+        Sweeper(store, interval).start()
+
+    return ServerSessionFactory(
+        store,
+        timeout=int(settings.get(prefix + 'timeout', 86400)),
+        secure=asbool(settings.get(prefix + 'secure', False)))
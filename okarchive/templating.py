@@ -0,0 +1,63 @@
+"""Compiled template cache and warm start.
+
+Chameleon compiles each template to Python the first time it renders.
+With ``okarchive.template_cache`` set to a directory, compiled templates
+are kept there as modules, named by a digest of the template source and
+Chameleon's version, so a stale file is never used; the
+``okarchive_compile_templates`` command fills it during deploy. With
+``okarchive.warm_templates`` on, the app loads every template (and the
+``load:`` macros each one uses) at startup rather than on first hit.
+"""
+
+import logging
+import os
+import re
+
+from chameleon.loader import ModuleLoader
+from chameleon.template import BaseTemplate
+
+from pyramid.path import AssetResolver
+from pyramid.renderers import RendererHelper
+
+log = logging.getLogger(__name__)
+
+TEMPLATES_SPEC = 'okarchive:templates/'
+
+_load_ref = re.compile(r'load:\s*([\w./-]+\.pt)')
+
+
+def configure_cache(directory):
+    """Keep compiled templates in a directory, across processes."""
+
+    os.makedirs(directory, exist_ok=True)
+    BaseTemplate.loader = ModuleLoader(directory)
+
+
+def template_names():
+    """File names of the app's templates."""
+
+    directory = AssetResolver().resolve(TEMPLATES_SPEC).abspath()
+    return sorted(name for name in os.listdir(directory)
+                  if name.endswith('.pt'))
+
+
+def warm(registry):
+    """Compile (or load from the cache) every template; return how many.
+
+    Templates are loaded through the same renderers views use, so they
+    stay loaded for requests.
+    """
+
+    count = 0
+    for name in template_names():
+        helper = RendererHelper(name=TEMPLATES_SPEC + name, registry=registry)
+        template = helper.renderer.template
+        template.cook_check()
+        count += 1
+        # Macros from "load:" are loaded (and kept) by each template.
+        with open(template.filename) as fh:
+            for ref in sorted(set(_load_ref.findall(fh.read()))):
+                template._loader(ref).cook_check()
+                count += 1
+    log.debug('warmed %d templates', count)
+    return count
@@ -1,9 +1,14 @@
 """OkArchive tests."""
 
+import contextlib
 import hashlib
 import unittest
 
-from sqlalchemy import create_engine
+import transaction
+from sqlalchemy import (
+    create_engine,
+    event,
+)
 
 from okarchive.models import (
     Base,
@@ -20,13 +25,29 @@ class BaseDatabaseTest(unittest.TestCase):
         self.setUpDb()
 
     def tearDown(self):
+        transaction.abort()
         DBSession.remove()
 
     def setUpDb(self):
-        engine = create_engine('sqlite://')
+        self.engine = engine = create_engine('sqlite://')
         Base.metadata.create_all(engine)
         DBSession.configure(bind=engine)
 
+    @contextlib.contextmanager
+    def countQueries(self):
+        """Collect SQL statements run inside the ``with`` block."""
+
+        statements = []
+
+        def count(conn, cursor, statement, parameters, context, many):
+            statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', count)
+        try:
+            yield statements
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', count)
+
     def addUser(self):
         if not (DBSession
                 .query(User)
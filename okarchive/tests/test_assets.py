@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from webob import Request
+
+from pyramid.response import Response
+
+from .test_functional import BaseFunctionalTest
+
+from okarchive.assets import (
+    build,
+    precompressed_tween_factory,
+)
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fh:
+        fh.write(content)
+
+
+class BuildTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.static = os.path.join(self.root, 'static')
+        self.templates = os.path.join(self.root, 'templates')
+        _write(os.path.join(self.templates, 'main.pt'),
+               '<link href="${request.static_url('
+               "'okarchive:static/css/site.css')}\"/>")
+        _write(os.path.join(self.static, 'css', 'site.css'),
+               "a { background: url('../img/a.svg#x') }"
+               " b { background: url(data:image/png;base64,AA==) }")
+        _write(os.path.join(self.static, 'img', 'a.svg'), '<svg/>')
+        _write(os.path.join(self.static, 'js', 'unused.js'), 'x')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _build(self):
+        return build(self.static, self.templates)
+
+    def test_build(self):
+        manifest = self._build()
+
+        self.assertEqual(sorted(manifest), ['css/site.css', 'img/a.svg'])
+        with open(os.path.join(self.static, 'build', 'manifest.json')) as fh:
+            self.assertEqual(json.load(fh), manifest)
+        css = os.path.join(self.static, manifest['css/site.css'])
+        with open(css) as fh:
+            built = fh.read()
+        svg = os.path.basename(manifest['img/a.svg'])
+        self.assertIn("url('../img/{}#x')".format(svg), built)
+        self.assertIn('url(data:image/png;base64,AA==)', built)
+        with gzip.open(css + '.gz', 'rt') as fh:
+            self.assertEqual(fh.read(), built)
+
+    def test_fingerprint_follows_content(self):
+        before = self._build()
+        self.assertEqual(self._build(), before)
+
+        _write(os.path.join(self.static, 'img', 'a.svg'), '<svg></svg>')
+        after = self._build()
+        self.assertNotEqual(after['img/a.svg'], before['img/a.svg'])
+        # The CSS names the new file, so it changes too.
+        self.assertNotEqual(after['css/site.css'], before['css/site.css'])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.static, before['img/a.svg'])))
+
+    def test_precompressed(self):
+        manifest = self._build()
+        tween = precompressed_tween_factory(lambda request: Response('plain'),
+                                            None, self.static)
+        url = '/static/' + manifest['css/site.css']
+
+        res = tween(Request.blank(url, headers={'Accept-Encoding': 'gzip'}))
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(res.content_type, 'text/css')
+        self.assertIn('immutable', res.headers['Cache-Control'])
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertTrue(gzip.decompress(res.body).startswith(b'a {'))
+
+        res = tween(Request.blank(url))
+        self.assertEqual(res.body, b'plain')
+        self.assertIsNone(res.content_encoding)
+        self.assertIn('immutable', res.headers['Cache-Control'])
+
+        res = tween(Request.blank('/static/build/../css/site.css',
+                                  headers={'Accept-Encoding': 'gzip'}))
+        self.assertIsNone(res.content_encoding)
+
+
+class StaticViewTest(BaseFunctionalTest):
+    def test_unbuilt(self):
+        res = self.testapp.get('/login', status=200)
+        self.assertIn('http://localhost/static/css/signin.css', res)
+        res = self.testapp.get('/static/css/signin.css', status=200)
+        self.assertEqual(res.headers['Cache-Control'], 'max-age=3600')
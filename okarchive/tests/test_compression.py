@@ -0,0 +1,115 @@
+import gzip
+import unittest
+
+from webob import Request, Response
+
+from okarchive.compression import (
+    CompressionMiddleware,
+    compression_from_settings,
+)
+
+BODY = b'<p>A long post.</p>' * 200
+
+
+class App:
+    """WSGI app counting its calls, with a fixed response."""
+
+    def __init__(self, body=BODY, **headers):
+        self.body = body
+        self.headers = headers
+        self.calls = 0
+        self.closed = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        request = Request(environ)
+        response = Response(content_type='text/html', charset='utf-8',
+                            **self.headers)
+        if self.headers.get('etag') and request.if_none_match and (
+                self.headers['etag'] in request.if_none_match):
+            response.status = 304
+        else:
+            response.app_iter = self._iter()
+        return response(environ, start_response)
+
+    def _iter(self):
+        try:
+            # In pieces, like a streamed response.
+            for start in range(0, len(self.body), 1000):
+                yield self.body[start:start + 1000]
+        finally:
+            self.closed += 1
+
+
+def _get(app, **headers):
+    headers.setdefault('Accept-Encoding', 'gzip')
+    return Request.blank('/journals/x/1/', headers=headers).get_response(app)
+
+
+class CompressionTest(unittest.TestCase):
+    def test_compressed(self):
+        app = App()
+        res = _get(CompressionMiddleware(app))
+
+        self.assertEqual(res.content_encoding, 'gzip')
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(res.body), BODY)
+        self.assertLess(len(res.body), len(BODY) / 10)
+        self.assertEqual(app.closed, 1)
+
+    def test_not_accepted(self):
+        middleware = CompressionMiddleware(App())
+
+        res = _get(middleware, **{'Accept-Encoding': 'identity'})
+        self.assertIsNone(res.content_encoding)
+        self.assertEqual(res.body, BODY)
+        res = Request.blank('/').get_response(middleware)
+        self.assertIsNone(res.content_encoding)
+
+    def test_small(self):
+        app = App(body=b'<p>Short.</p>')
+        res = _get(CompressionMiddleware(app))
+
+        self.assertIsNone(res.content_encoding)
+        self.assertEqual(res.body, b'<p>Short.</p>')
+        self.assertEqual(res.content_length, len(b'<p>Short.</p>'))
+        self.assertEqual(app.closed, 1)
+
+    def test_already_encoded(self):
+        res = _get(CompressionMiddleware(App(content_encoding='br')))
+        self.assertEqual(res.content_encoding, 'br')
+        self.assertEqual(res.body, BODY)
+
+    def test_etag(self):
+        app = App(etag='abc')
+        middleware = CompressionMiddleware(app)
+
+        res = _get(middleware)
+        self.assertEqual(res.headers['ETag'], '"abc-gz"')
+        res = _get(middleware, **{'If-None-Match': '"abc-gz"'})
+        self.assertEqual(res.status_int, 304)
+        self.assertEqual(res.headers['ETag'], '"abc-gz"')
+
+    def test_cache(self):
+        app = App(etag='abc')
+        middleware = CompressionMiddleware(app, cache_bytes=1 << 20)
+
+        first = _get(middleware).body
+        second = _get(middleware)
+        self.assertEqual(second.body, first)
+        self.assertEqual(second.content_length, len(first))
+        self.assertEqual(gzip.decompress(second.body), BODY)
+        # The app still ran (for the ETag), but was not read the second
+        # time.
+        self.assertEqual(app.calls, 2)
+
+    def test_settings(self):
+        app = App()
+        self.assertIs(
+            compression_from_settings(app,
+                                      {'okarchive.compression.level': '0'}),
+            app)
+        middleware = compression_from_settings(
+            app, {'okarchive.compression.level': '9',
+                  'okarchive.compression.min_size': '10'})
+        self.assertEqual((middleware.level, middleware.min_size), (9, 10))
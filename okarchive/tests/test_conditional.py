@@ -0,0 +1,115 @@
+import datetime
+
+import transaction
+
+from . import BaseDatabaseTest, DBSession
+from .test_functional import BaseFunctionalTest
+
+from okarchive.models import (
+    Journal,
+    Post,
+    Comment,
+)
+
+
+class ModificationDateTest(BaseDatabaseTest):
+    def _backdate(self):
+        past = datetime.datetime(2000, 1, 1)
+        for model in (Journal, Post):
+            DBSession.query(model).update({model.modification_date: past},
+                                          synchronize_session=False)
+        DBSession.expire_all()
+        return past
+
+    def test_add_comment_touches_post_and_journal(self):
+        self.addAll()
+        past = self._backdate()
+
+        post = DBSession.query(Post).get(1)
+        post.add_comment(text='Hi', user_id='bob', _flush=True)
+
+        self.assertGreater(post.modification_date, past)
+        self.assertGreater(post.journal.modification_date, past)
+
+    def test_comment_by_foreign_key_touches_post(self):
+        self.addAll()
+        past = self._backdate()
+
+        DBSession.add(Comment(post_id=1, user_id='bob', text='Hi'))
+        DBSession.flush()
+
+        self.assertGreater(DBSession.query(Post).get(1).modification_date,
+                           past)
+
+    def test_edit_post_touches_journal(self):
+        self.addAll()
+        past = self._backdate()
+
+        post = DBSession.query(Post).get(1)
+        post.title = 'New'
+        DBSession.flush()
+
+        self.assertGreater(post.modification_date, past)
+        self.assertGreater(post.journal.modification_date, past)
+
+    def test_unchanged_does_not_touch(self):
+        self.addAll()
+        past = self._backdate()
+
+        post = DBSession.query(Post).get(1)
+        post.title = post.title
+        DBSession.flush()
+
+        self.assertEqual(post.journal.modification_date, past)
+
+
+class ConditionalGetTest(BaseFunctionalTest):
+    def test_post_etag(self):
+        self.addAll()
+        transaction.commit()
+
+        res = self.testapp.get('/journals/distractionbike/1/', status=200)
+        etag = res.headers['ETag']
+        self.assertTrue(etag.startswith('"'))
+        self.assertIn('Last-Modified', res.headers)
+        self.assertEqual(res.headers['Cache-Control'], 'public, no-cache')
+
+        res = self.testapp.get('/journals/distractionbike/1/',
+                               headers={'If-None-Match': etag}, status=304)
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.body, b'')
+
+        # A new comment changes the page.
+        post = DBSession.query(Post).get(1)
+        post.add_comment(text='New comment', user_id='bob')
+        transaction.commit()
+        res = self.testapp.get('/journals/distractionbike/1/',
+                               headers={'If-None-Match': etag}, status=200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+
+    def test_if_modified_since(self):
+        self.addAll()
+        transaction.commit()
+
+        res = self.testapp.get('/journals/distractionbike/', status=200)
+        last_modified = res.headers['Last-Modified']
+        self.testapp.get('/journals/distractionbike/',
+                         headers={'If-Modified-Since': last_modified},
+                         status=304)
+        self.testapp.get('/journals/distractionbike/',
+                         headers={'If-Modified-Since':
+                                  'Sat, 01 Jan 2000 00:00:00 GMT'},
+                         status=200)
+
+    def test_etag_differs_by_viewer(self):
+        self.addAll()
+        transaction.commit()
+
+        anonymous = self.testapp.get('/journals/', status=200)
+        self._login()
+        signed_in = self.testapp.get('/journals/', status=200)
+
+        self.assertNotEqual(anonymous.headers['ETag'],
+                            signed_in.headers['ETag'])
+        self.assertEqual(signed_in.headers['Cache-Control'],
+                         'private, no-cache')
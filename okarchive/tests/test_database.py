@@ -0,0 +1,118 @@
+import sqlite3
+import unittest
+
+import transaction
+from sqlalchemy import create_engine
+from sqlalchemy.exc import (
+    OperationalError,
+    TimeoutError,
+)
+from sqlalchemy.pool import QueuePool
+
+from pyramid import testing
+
+from . import DBSession
+from .test_functional import BaseFunctionalTest
+
+from okarchive.database import (
+    InstrumentedQueuePool,
+    database_stats,
+    engine_from_settings,
+    instrument,
+    pool_status,
+    request_stats,
+)
+from okarchive.models import (
+    Group,
+    Membership,
+)
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.request = testing.DummyRequest()
+        testing.setUp(request=self.request)
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def test_wait(self):
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(':memory:'),
+                                     pool_size=1, max_overflow=0, timeout=0.05)
+        held = pool.connect()
+        with self.assertRaises(TimeoutError):
+            pool.connect()
+        held.close()
+        pool.connect().close()
+
+        stats = request_stats(self.request)
+        self.assertGreaterEqual(stats.wait, 0.05)
+        status = pool_status(create_engine('sqlite://', poolclass=QueuePool))
+        self.assertEqual((status['pool'], status['size'], status['overflow']),
+                         ('QueuePool', 5, -5))
+
+    def test_failed_query(self):
+        engine = create_engine('sqlite://')
+        instrument(engine)
+        with engine.connect() as conn:
+            with self.assertRaises(OperationalError):
+                conn.execute('SELECT * FROM nonesuch')
+            conn.execute('SELECT 1')
+            self.assertNotIn('okarchive.query_start', conn.info)
+
+        stats = request_stats(self.request)
+        self.assertEqual(stats.queries, 1)
+
+    def test_sqlite_pool_untouched(self):
+        engine = engine_from_settings({'sqlalchemy.url': 'sqlite://'}, 8)
+        self.assertEqual(pool_status(engine), {'pool': 'SingletonThreadPool'})
+
+
+class StatsTest(BaseFunctionalTest):
+    settings = {'pyramid.includes': 'pyramid_tm'}
+
+    def setUp(self):
+        super().setUp()
+        instrument(self.engine)
+        database_stats.clear()
+
+    def test_labelled_by_view(self):
+        self.addAll()
+        transaction.commit()
+
+        self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.testapp.get('/journals', status=200)
+
+        views = database_stats.views()
+        self.assertEqual(views['Post']['requests'], 2)
+        self.assertEqual(views['Post']['checkouts_per_request'], 1)
+        self.assertGreater(views['Post']['queries'], 2)
+        self.assertEqual(views['Journals']['requests'], 1)
+
+    def test_slow_query(self):
+        database_stats.slow_query = 0
+        self.addAll()
+        transaction.commit()
+        self.testapp.get('/journals', status=200)
+
+        views = database_stats.views()
+        self.assertEqual(views['Journals']['slow_queries'],
+                         views['Journals']['queries'])
+
+    def test_endpoint_for_editors(self):
+        res = self.testapp.get('/db-stats', status=200)
+        self.assertIn('Please sign in', res)
+        self.addUser()
+        DBSession.add(Group(name='editors'))
+        DBSession.add(Membership(user_name='distractionbike',
+                                 group_name='editors'))
+        transaction.commit()
+        self._login()
+
+        res = self.testapp.get('/db-stats', status=200)
+        self.assertEqual(res.json['pool']['pool'], 'SingletonThreadPool')
+        views = res.json['views']
+        self.assertEqual(views['SiteRoot:login']['requests'], 1)
+        # The anonymous try, answered with the sign in page.
+        self.assertEqual(views['SiteRoot:db-stats']['requests'], 1)
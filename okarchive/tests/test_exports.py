@@ -0,0 +1,192 @@
+import io
+import json
+import types
+import zipfile
+
+import transaction
+
+from . import BaseDatabaseTest, DBSession
+from .test_functional import BaseFunctionalTest
+from .test_unarchive import make_archive
+from okarchive.exports import (
+    json_chunks,
+    zip_chunks,
+)
+from okarchive.models import (
+    Comment,
+    Journal,
+    Post,
+)
+from okarchive.utils.unarchive import import_journal
+
+POSTS = [('Post %d' % i,
+          '<p>Body %d, with "quotes"\nand lines</p>' % i,
+          [('user%d' % j, 'Comment, %d' % j) for j in range(i)])
+         for i in range(5)]
+
+
+def journal_contents(name):
+    """Posts and comments of a journal, without IDs."""
+
+    return [(post.title, post.lede, post.text, post.privacy,
+             post.creation_date,
+             [(c.user_id, c.text, c.hidden, c.creation_date)
+              for c in post.comments])
+            for post in (DBSession
+                         .query(Post)
+                         .filter_by(journal_name=name)
+                         .order_by(Post.id))]
+
+
+def make_private(name):
+    """Give posts of a journal the things only some posts have.
+
+    The second is private, the third friends-only with a lede, and the
+    fourth's first comment is hidden.
+    """
+
+    with transaction.manager:
+        posts = (DBSession
+                 .query(Post)
+                 .filter_by(journal_name=name)
+                 .order_by(Post.id)
+                 .all())
+        posts[1].set_privacy('private')
+        posts[2].set_privacy('friends')
+        posts[2].lede = 'The "lede", with\nlines'
+        posts[3].comments[0].hide()
+
+
+class ExportTest(BaseDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        import_journal(io.BytesIO(make_archive(POSTS)), 'original')
+
+    def test_zip_round_trip(self):
+        chunks = zip_chunks(self.engine, 'original')
+        self.assertIsInstance(chunks, types.GeneratorType)
+        archive = b''.join(chunks)
+
+        self.assertEqual(import_journal(io.BytesIO(archive), 'copy'),
+                         (5, 10))
+        self.assertEqual(journal_contents('copy'),
+                         journal_contents('original'))
+        self.assertEqual(
+            DBSession.query(Journal).get('copy').public_post_count, 5)
+
+    def test_zip_round_trip_private(self):
+        make_private('original')
+        archive = b''.join(zip_chunks(self.engine, 'original'))
+
+        self.assertEqual(import_journal(io.BytesIO(archive), 'copy'),
+                         (5, 10))
+        self.assertEqual(journal_contents('copy'),
+                         journal_contents('original'))
+        copy = DBSession.query(Journal).get('copy')
+        self.assertEqual(copy.public_post_count, 3)
+        self.assertEqual([post.comment_count for post in copy.posts],
+                         [0, 1, 2, 2, 4])
+
+    def test_zip_streams_by_post(self):
+        chunks = list(zip_chunks(self.engine, 'original'))
+
+        # One chunk per post, then the central directory.
+        self.assertEqual(len(chunks), 6)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            self.assertEqual(len(zf.namelist()), 5)
+            self.assertIsNone(zf.testzip())
+
+    def test_zip_keeps_hidden(self):
+        with transaction.manager:
+            DBSession.query(Comment).update({Comment.hidden: True})
+        archive = b''.join(zip_chunks(self.engine, 'original'))
+
+        self.assertEqual(import_journal(io.BytesIO(archive), 'copy'),
+                         (5, 10))
+        self.assertEqual(
+            DBSession.query(Comment)
+                     .join(Post)
+                     .filter(Post.journal_name == 'copy')
+                     .filter(Comment.hidden == False)
+                     .count(),
+            0)
+
+    def test_json(self):
+        with transaction.manager:
+            DBSession.query(Comment).filter_by(text='Comment, 0').update(
+                {Comment.hidden: True})
+        document = json.loads(
+            b''.join(json_chunks(self.engine, 'original')).decode('utf-8'))
+
+        self.assertEqual(document['journal'], 'original')
+        self.assertEqual([p['title'] for p in document['posts']],
+                         [title for title, body, comments in POSTS])
+        post = document['posts'][2]
+        self.assertEqual(post['text'], POSTS[2][1])
+        self.assertEqual(post['creation_date'], '2013-10-28T12:30:00')
+        self.assertEqual([(c['user_id'], c['text'], c['hidden'])
+                          for c in post['comments']],
+                         [('user0', 'Comment, 0', True),
+                          ('user1', 'Comment, 1', False)])
+
+    def test_empty(self):
+        self.assertEqual(
+            json.loads(b''.join(json_chunks(self.engine, 'nonesuch'))),
+            {'journal': 'nonesuch', 'posts': []})
+        with zipfile.ZipFile(io.BytesIO(
+                b''.join(zip_chunks(self.engine, 'nonesuch')))) as zf:
+            self.assertEqual(zf.namelist(), [])
+
+
+class ExportViewTest(BaseFunctionalTest):
+    settings = {'pyramid.includes': 'pyramid_tm'}
+
+    def _login(self):
+        self.addUser()
+        self.addJournal()
+        transaction.commit()
+        import_journal(io.BytesIO(make_archive(POSTS)), 'distractionbike')
+        make_private('distractionbike')
+        self.testapp.post('/login',
+                          {'login': 'distractionbike',
+                           'password': 'secret',
+                           'form.submitted': 1},
+                          status=302)
+
+    def test_zip(self):
+        self._login()
+
+        res = self.testapp.get('/journals/distractionbike/export',
+                               status=200)
+        self.assertEqual(res.content_type, 'application/zip')
+        self.assertEqual(res.headers['Content-Disposition'],
+                         'attachment; filename="distractionbike.zip"')
+        self.assertEqual(import_journal(io.BytesIO(res.body), 'copy'),
+                         (5, 10))
+        self.assertEqual(journal_contents('copy'),
+                         journal_contents('distractionbike'))
+
+    def test_json(self):
+        self._login()
+
+        res = self.testapp.get('/journals/distractionbike/export',
+                               {'format': 'json'},
+                               status=200)
+        self.assertEqual(res.content_type, 'application/json')
+        self.assertEqual([p['privacy'] for p in res.json['posts']],
+                         ['public', 'private', 'friends', 'public', 'public'])
+
+    def test_bad_format(self):
+        self._login()
+
+        self.testapp.get('/journals/distractionbike/export',
+                         {'format': 'xml'},
+                         status=400)
+
+    def test_unauthorized(self):
+        self.addJournal()
+        transaction.commit()
+
+        res = self.testapp.get('/journals/distractionbike/export',
+                               status=200)
+        self.assertNotEqual(res.content_type, 'application/zip')
@@ -1,13 +1,21 @@
-from . import BaseDatabaseTest
+import transaction
+
+from . import BaseDatabaseTest, DBSession
+from okarchive.models import Journal
 
 
 class BaseFunctionalTest(BaseDatabaseTest):
+    global_config = {}
+    settings = {}
+
     def setUp(self):
         from okarchive import main
         from webtest import TestApp
 
-        settings = {'sqlalchemy.url': 'sqlite://'}
-        app = main({}, **settings)
+        settings = {'sqlalchemy.url': 'sqlite://',
+                    'okarchive.session.sweep_interval': '0'}
+        settings.update(self.settings)
+        app = main(self.global_config, **settings)
         self.testapp = TestApp(app)
 
         BaseDatabaseTest.setUp(self)
@@ -73,6 +81,23 @@ class JournalTest(BaseFunctionalTest):
             res)
 
 
+    def test_journal_private_posts(self):
+        self.addAll()
+        journal = DBSession.query(Journal).one()
+        journal.add_post(title='Secret Post', privacy='private')
+        transaction.commit()
+
+        res = self.testapp.get('/journals/distractionbike', status=200)
+        self.assertIn('First Post', res)
+        self.assertNotIn('Secret Post', res)
+        self.testapp.get('/journals/distractionbike/2', status=404)
+
+        self._login()
+        res = self.testapp.get('/journals/distractionbike', status=200)
+        self.assertIn('Secret Post', res)
+        self.testapp.get('/journals/distractionbike/2', status=200)
+
+
 class JournalAddPostTest(BaseFunctionalTest):
     def test_add_post_unauth(self):
         self.addJournal()
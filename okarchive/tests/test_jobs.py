@@ -0,0 +1,147 @@
+import datetime
+
+import transaction
+
+from . import BaseDatabaseTest, DBSession
+from okarchive.jobs import (
+    Worker,
+    backoff,
+    claim,
+    enqueue,
+    handler,
+)
+from okarchive.models import (
+    Job,
+    jobs_container,
+)
+
+calls = []
+
+
+@handler('test_ok')
+def ok(context, **args):
+    calls.append(args)
+    with transaction.manager:
+        context.progress(1, 2, 'half way')
+
+
+def retrying(context, error, **args):
+    calls.append(('retrying', str(error)))
+
+
+@handler('test_flaky', retrying=retrying)
+def flaky(context):
+    calls.append(context.attempt)
+    if context.attempt == 1:
+        raise IOError('try again')
+
+
+def gave_up(context, error, **args):
+    calls.append(('gave up', str(error)))
+
+
+@handler('test_broken', max_attempts=2, failed=gave_up)
+def broken(context):
+    raise ValueError('broken')
+
+
+class JobsTest(BaseDatabaseTest):
+    def setUp(self):
+        super().setUp()
+        del calls[:]
+        self.worker = Worker(name='test', backoff=10)
+
+    def _enqueue(self, kind, **args):
+        with transaction.manager:
+            return enqueue(kind, user_id='bob', **args).id
+
+    def _job(self, job_id):
+        DBSession.remove()
+        return DBSession.query(Job).get(job_id)
+
+    def test_run(self):
+        job_id = self._enqueue('test_ok', name='x', n=1)
+
+        self.assertTrue(self.worker.run_next())
+        self.assertFalse(self.worker.run_next())
+
+        self.assertEqual(calls, [{'name': 'x', 'n': 1}])
+        job = self._job(job_id)
+        self.assertEqual((job.status, job.attempts, job.worker),
+                         ('done', 1, 'test'))
+        self.assertEqual((job.done, job.total, job.message),
+                         (1, 2, 'half way'))
+        self.assertIsNotNone(job.finished_date)
+
+    def test_claimed_once(self):
+        job_id = self._enqueue('test_ok')
+
+        self.assertEqual(claim('one'), job_id)
+        self.assertIsNone(claim('two'))
+        self.assertEqual(self._job(job_id).worker, 'one')
+
+    def test_retry_with_backoff(self):
+        job_id = self._enqueue('test_flaky')
+
+        before = datetime.datetime.utcnow()
+        self.worker.run_next()
+        job = self._job(job_id)
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertEqual(job.error, 'OSError: try again')
+        self.assertGreaterEqual(job.run_after,
+                                before + datetime.timedelta(seconds=10))
+        # Not due yet.
+        self.assertFalse(self.worker.run_next())
+
+        with transaction.manager:
+            self._job(job_id).run_after = before
+        self.assertTrue(self.worker.run_next())
+        self.assertEqual(calls, [1, ('retrying', 'try again'), 2])
+        self.assertEqual(self._job(job_id).status, 'done')
+
+    def test_gives_up(self):
+        job_id = self._enqueue('test_broken')
+        self.worker.backoff = 0
+
+        while self.worker.run_next():
+            pass
+
+        job = self._job(job_id)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertEqual(calls, [('gave up', 'broken')])
+
+    def test_unknown_kind(self):
+        with transaction.manager:
+            DBSession.add(Job(kind='nonesuch'))
+
+        self.worker.run_next()
+
+        job = DBSession.query(Job).one()
+        self.assertEqual((job.status, job.attempts), ('failed', 1))
+        self.assertIn('nonesuch', job.error)
+
+    def test_stale_requeued(self):
+        job_id = self._enqueue('test_ok')
+        claim('lost')
+        with transaction.manager:
+            self._job(job_id).modification_date = (
+                datetime.datetime.utcnow() - datetime.timedelta(hours=2))
+
+        self.assertTrue(self.worker.run_next())
+
+        job = self._job(job_id)
+        self.assertEqual((job.status, job.attempts, job.worker),
+                         ('done', 2, 'test'))
+
+    def test_backoff(self):
+        self.assertEqual([backoff(n, 30, 200) for n in range(1, 6)],
+                         [30, 60, 120, 200, 200])
+
+    def test_recent(self):
+        first = self._enqueue('test_ok')
+        second = self._enqueue('test_ok')
+        self.worker.run_next()
+
+        jobs, counts = jobs_container.recent()
+        self.assertEqual([job.id for job in jobs], [second, first])
+        self.assertEqual(counts, {'done': 1, 'queued': 1})
@@ -9,13 +9,19 @@ from pyramid.security import (
 
 from okarchive.tests import BaseDatabaseTest, DBSession
 from okarchive.models import (
+    counts,
     Journals,
     Journal,
     Post,
     Comment,
     RootFactory,
+    bucket_counts,
     journals_container as journals,
 )
+from okarchive.utils.sharedcache import (
+    MemoryCache,
+    NullCache,
+)
 
 
 class SiteRootTest(unittest.TestCase):
@@ -23,6 +29,7 @@ class SiteRootTest(unittest.TestCase):
         root = RootFactory(None)
 
         self.assertIs(root['journals'], journals)
+        self.assertRaises(KeyError, lambda: root['nosuch'])
 
 class ModelBaseTest(BaseDatabaseTest):
     pass
@@ -35,11 +42,45 @@ class JournalsModelTest(ModelBaseTest):
         self.assertIs(journals['distractionbike'], journal)
         self.assertEqual(journal.name, 'distractionbike')
         self.assertSequenceEqual([j for j in journals.journals], [journal])
-        self.assertSequenceEqual(journals.keys(), ['distractionbike'])
-        self.assertSequenceEqual(journals.values(), [journal])
-        self.assertSequenceEqual(journals.items(),
+        self.assertSequenceEqual(list(journals.keys()), ['distractionbike'])
+        self.assertSequenceEqual(list(journals.values()), [journal])
+        self.assertSequenceEqual(list(journals.items()),
                                  [('distractionbike', journal)])
 
+    def test_bucket_page(self):
+        for name in ['Bob', 'alice', 'adam', '_x', '9lives', 'Zoe']:
+            DBSession.add(Journal(name=name))
+        DBSession.flush()
+
+        page = journals.bucket_page('a', limit=1)
+        self.assertEqual([row.name for row in page], ['adam'])
+        page = journals.bucket_page('a', after=page.next_cursor, limit=1)
+        self.assertEqual([row.name for row in page], ['alice'])
+        self.assertIsNone(page.next_cursor)
+        self.assertEqual([row.name for row in journals.bucket_page('b')],
+                         ['Bob'])
+        self.assertEqual([row.name for row in journals.bucket_page('#')],
+                         ['9lives', '_x'])
+        self.assertRaises(ValueError, journals.bucket_page, 'A')
+
+    def test_bucket_counts(self):
+        bucket_counts.configure(MemoryCache())
+        try:
+            self.addJournal()
+            DBSession.add(Journal(name='42'))
+            DBSession.flush()
+            self.assertEqual(bucket_counts.get(), {'d': 1, '#': 1})
+
+            with self.countQueries() as statements:
+                bucket_counts.get()
+            self.assertEqual(statements, [])
+
+            DBSession.add(Journal(name='Dan'))
+            DBSession.flush()
+            self.assertEqual(bucket_counts.get(), {'d': 2, '#': 1})
+        finally:
+            bucket_counts.configure(NullCache())
+
     def test_journal_traversal(self):
         journal = self.addJournal()
 
@@ -122,6 +163,80 @@ class JournalModelTest(ModelBaseTest):
         self.assertSequenceEqual(journal.values(), [post, post2])
 
 
+    def test_post_page(self):
+        import datetime
+        journal = self.addJournal()
+        for i in range(5):
+            # two posts share each timestamp; ties break on id
+            journal.add_post(
+                title='Post %d' % i,
+                creation_date=datetime.datetime(2013, 10, 1 + i // 2))
+        DBSession.flush()
+
+        page1 = journal.post_page(limit=2)
+        self.assertEqual([p.title for p in page1], ['Post 4', 'Post 3'])
+        self.assertIsNone(page1.prev_cursor)
+
+        page2 = journal.post_page(after=page1.next_cursor, limit=2)
+        self.assertEqual([p.title for p in page2], ['Post 2', 'Post 1'])
+
+        page3 = journal.post_page(after=page2.next_cursor, limit=2)
+        self.assertEqual([p.title for p in page3], ['Post 0'])
+        self.assertIsNone(page3.next_cursor)
+
+        back = journal.post_page(before=page3.prev_cursor, limit=2)
+        self.assertEqual([p.title for p in back], ['Post 2', 'Post 1'])
+        back = journal.post_page(before=back.prev_cursor, limit=2)
+        self.assertEqual([p.title for p in back], ['Post 4', 'Post 3'])
+        self.assertIsNone(back.prev_cursor)
+
+    def test_post_page_columns(self):
+        journal = self.addJournal()
+        self.addPost()
+
+        page = journal.post_page()
+        self.assertEqual(page.items[0].keys(),
+                         ['id', 'title', 'creation_date', 'comment_count'])
+
+    def test_post_page_bad_cursor(self):
+        journal = self.addJournal()
+
+        self.assertRaises(ValueError, journal.post_page, after='garbage')
+
+    def test_post_page_cursor_types(self):
+        from okarchive.utils.paging import encode_cursor
+        journal = self.addJournal()
+
+        for values in ([1, 2], ['2013-10-01T00:00:00', 'x'],
+                       ['2013-10-01T00:00:00'], ['2013-10-01T00:00:00', 1, 2],
+                       [[], 1], {'a': 1}):
+            self.assertRaises(ValueError, journal.post_page,
+                              after=encode_cursor(values))
+        journal.post_page(after=encode_cursor(['2013-10-01T00:00:00', 1]))
+
+
+    def test_post_page_privacy(self):
+        journal = self.addJournal()
+        for privacy in ('public', 'private', 'friends'):
+            journal.add_post(title=privacy, privacy=privacy)
+        DBSession.flush()
+
+        def titles(principals):
+            return sorted(p.title for p in
+                          journal.post_page(principals=principals))
+
+        everyone = [Everyone]
+        self.assertEqual(titles(everyone), ['public'])
+        self.assertEqual(titles(everyone + [Authenticated, 'otherguy']),
+                         ['public'])
+        self.assertEqual(titles(everyone + [Authenticated, 'distractionbike']),
+                         ['friends', 'private', 'public'])
+        self.assertEqual(
+            titles(everyone + [Authenticated, 'otherguy', 'group:editors']),
+            ['friends', 'private', 'public'])
+        self.assertEqual(titles(None), ['friends', 'private', 'public'])
+
+
 class PostModelTest(ModelBaseTest):
     def test_post(self):
         journal = self.addJournal()
@@ -152,6 +267,14 @@ class PostModelTest(ModelBaseTest):
              (Allow, 'distractionbike', ('edit', 'add', 'delete')),
             ])
 
+    def test_acl_shared(self):
+        journal = self.addJournal()
+        post = self.addPost()
+        post2 = journal.add_post(title='Second', _flush=True)
+
+        self.assertIs(post.__acl__, post2.__acl__)
+        self.assertIsInstance(post.__acl__, tuple)
+
     def test_post_404(self):
         journal = self.addJournal()
         post = self.addPost()
@@ -208,6 +331,26 @@ class PostModelTest(ModelBaseTest):
         self.assertSequenceEqual(post.keys(), [])
 
 
+    def test_comment_page_hidden(self):
+        journal = self.addJournal()
+        post = self.addPost()
+        post.add_comment(text='Shown', user_id='bob')
+        post.add_comment(text='Hidden', user_id='bob', hidden=True)
+        DBSession.flush()
+
+        def texts(principals):
+            return [c.text for c in post.comment_page(principals=principals)]
+
+        self.assertEqual(texts([Everyone]), ['Shown'])
+        self.assertEqual(texts([Everyone, Authenticated, 'otherguy']),
+                         ['Shown'])
+        self.assertEqual(texts([Everyone, Authenticated, 'distractionbike']),
+                         ['Shown', 'Hidden'])
+        self.assertEqual(texts([Everyone, Authenticated, 'group:editors']),
+                         ['Shown', 'Hidden'])
+        self.assertEqual(texts(None), ['Shown', 'Hidden'])
+
+
 class CommentModelTest(ModelBaseTest):
     def test_comment(self):
         journal = self.addJournal()
@@ -249,6 +392,113 @@ class CommentModelTest(ModelBaseTest):
         self.assertRaises(KeyError, lambda: post[999])
 
 
+    def test_comment_through_other_post_404(self):
+        journal = self.addJournal()
+        post = self.addPost()
+        comment = self.addComment()
+        post2 = journal.add_post(title='Second', _flush=True)
+
+        self.assertIs(post[1], comment)
+        self.assertRaises(KeyError, lambda: post2[1])
+
+    def test_comment_parent_from_traversal(self):
+        journal = self.addJournal()
+        post = self.addPost()
+        self.addComment()
+        DBSession.expunge_all()
+
+        post = journals['distractionbike'][1]
+        with self.countQueries() as statements:
+            comment = post['1']
+            self.assertIs(comment.__parent__, post)
+            comment.__acl__
+        self.assertEqual(len(statements), 1)
+
+
+class CountsTest(ModelBaseTest):
+    def test_add_and_delete(self):
+        journal = self.addJournal()
+        post = journal.add_post(title='Counted', _flush=True)
+        post.add_comment(user_id='bob', text='One')
+        post.add_comment(user_id='bob', text='Two')
+        post.add_comment(user_id='bob', text='Hidden', hidden=True)
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 1)
+        self.assertEqual(post.comment_count, 2)
+
+        comments = post.comments
+        del post[str(comments[0].id)]
+        del post[str(comments[-1].id)]
+        DBSession.flush()
+        self.assertEqual(post.comment_count, 1)
+
+        del journal[str(post.id)]
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 0)
+
+    def test_public_only(self):
+        journal = self.addJournal()
+        post = journal.add_post(title='Public', _flush=True)
+        secret = journal.add_post(title='Private', privacy='private',
+                                  _flush=True)
+        self.assertEqual(journal.public_post_count, 1)
+
+        post.set_privacy('friends')
+        secret.set_privacy('private')
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 0)
+
+        secret.set_privacy('public')
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 1)
+        self.assertEqual(counts.repair(), 0)
+
+        del journal[str(post.id)]
+        del journal[str(secret.id)]
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 0)
+
+    def test_hide_and_publish(self):
+        journal = self.addJournal()
+        post = journal.add_post(title='Counted', _flush=True)
+        comment = post.add_comment(user_id='bob', text='One', _flush=True)
+
+        comment.hide()
+        comment.hide()
+        DBSession.flush()
+        self.assertEqual(post.comment_count, 0)
+
+        comment.publish()
+        DBSession.flush()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_adds_in_sql(self):
+        journal = self.addJournal()
+        DBSession.flush()
+        # Another writer adds a post meanwhile.
+        DBSession.query(Journal).update({Journal.public_post_count: 5},
+                                        synchronize_session=False)
+
+        journal.add_post(title='Counted')
+        DBSession.flush()
+        self.assertEqual(journal.public_post_count, 6)
+
+    def test_repair(self):
+        # The fixtures write rows directly, leaving the counters at 0.
+        self.addAll()
+        self.addComment().hidden = True
+        DBSession.add(Post(journal_name='distractionbike', title='Secret',
+                           privacy='private'))
+        DBSession.flush()
+
+        self.assertEqual(counts.repair(), 2)
+        DBSession.expire_all()
+        journal = journals['distractionbike']
+        self.assertEqual(journal.public_post_count, 1)
+        self.assertEqual(journal[1].comment_count, 1)
+        self.assertEqual(counts.repair(), 0)
+
+
 class UserModelTest(ModelBaseTest):
     def test_user(self):
         user = self.addUser()
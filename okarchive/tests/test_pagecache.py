@@ -0,0 +1,161 @@
+import unittest
+
+from pyramid import testing
+from pyramid.response import Response
+
+from . import DBSession
+from .test_functional import BaseFunctionalTest
+
+from okarchive.pagecache import (
+    PageCache,
+    page_cache,
+)
+from okarchive.utils.lru import LRUCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_max_items(self):
+        cache = LRUCache(max_items=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_max_bytes(self):
+        evicted = []
+        cache = LRUCache(max_bytes=10, on_evict=evicted.append)
+        cache.set('a', 'x', size=6)
+        cache.set('b', 'y', size=6)
+        cache.set('huge', 'z', size=11)
+
+        self.assertNotIn('a', cache)
+        self.assertIn('b', cache)
+        self.assertNotIn('huge', cache)
+        self.assertEqual(cache.size, 6)
+        self.assertEqual(evicted, ['a'])
+
+    def test_ttl(self):
+        now = [100.0]
+        cache = LRUCache(ttl=5, clock=lambda: now[0])
+        cache.set('a', 1)
+        now[0] += 4
+        self.assertEqual(cache.get('a'), 1)
+        now[0] += 2
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class PageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.config = testing.setUp()
+
+    def tearDown(self):
+        testing.tearDown()
+
+    def _resource(self):
+        root = testing.DummyResource()
+        root['journal'] = testing.DummyResource()
+        root['journal']['post'] = testing.DummyResource()
+        return root['journal']['post']
+
+    def test_disabled(self):
+        cache = PageCache(0)
+        request = testing.DummyRequest()
+
+        self.assertIsNone(cache.key_for(self._resource(), request))
+
+    def test_invalidate_lineage(self):
+        cache = PageCache(1000)
+        post = self._resource()
+        journal = post.__parent__
+        request = testing.DummyRequest()
+        post_key = cache.key_for(post, request)
+        journal_key = cache.key_for(journal, request)
+        cache.set(post_key, Response('post'))
+        cache.set(journal_key, Response('journal'))
+
+        self.assertEqual(cache.get(post_key).body, b'post')
+        cache.invalidate(post)
+        self.assertIsNone(cache.get(post_key))
+        self.assertIsNone(cache.get(journal_key))
+
+    def test_max_age(self):
+        now = [100.0]
+        cache = PageCache(1000, max_age=60, clock=lambda: now[0])
+        post = self._resource()
+        key = cache.key_for(post, testing.DummyRequest())
+        cache.set(key, Response('post'))
+
+        now[0] += 59
+        self.assertEqual(cache.get(key).body, b'post')
+        now[0] += 2
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache._by_path, {})
+
+    def test_forgets_empty_paths(self):
+        cache = PageCache(10)
+        request = testing.DummyRequest()
+        post = self._resource()
+        post_key = cache.key_for(post, request)
+        journal_key = cache.key_for(post.__parent__, request)
+
+        cache.set(post_key, Response('post'))
+        cache.set(journal_key, Response('journal'))
+        # Only one fits: the post's page was evicted.
+        self.assertEqual(list(cache._by_path), ['/journal'])
+        cache.invalidate_path('/journal')
+        self.assertEqual(cache._by_path, {})
+
+    def test_not_cached(self):
+        cache = PageCache(1000)
+        request = testing.DummyRequest()
+        key = cache.key_for(self._resource(), request)
+
+        cache.set(key, Response('not found', status=404))
+        self.assertIsNone(cache.get(key))
+
+        request.session.flash(('success', 'Signed out.'))
+        self.assertIsNone(cache.key_for(self._resource(), request))
+
+        self.config.testing_securitypolicy(userid='distractionbike')
+        request = testing.DummyRequest()
+        self.assertIsNone(cache.key_for(self._resource(), request))
+
+
+class PageCacheFunctionalTest(BaseFunctionalTest):
+    settings = {'okarchive.page_cache.max_bytes': '1000000'}
+
+    def test_cached_until_edited(self):
+        self.addAll()
+
+        res = self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.assertIn('<h1>First Post</h1>', res)
+
+        # Changed behind the cache's back: the cached page is served.
+        DBSession.execute("UPDATE posts SET title = 'Sneaky Title'")
+        res = self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.assertIn('<h1>First Post</h1>', res)
+
+        # Edited through the site: the page is rendered again.
+        self._login()
+        res = self.testapp.get('/journals/distractionbike/1/edit')
+        form = res.forms['edit-post']
+        form['title'] = 'Edited Title'
+        form.submit('edit')
+        self.testapp.get('/logout')
+
+        res = self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.assertIn('<h1>Edited Title</h1>', res)
+        res = self.testapp.get('/journals/distractionbike/', status=200)
+        self.assertIn('Edited Title', res)
+
+    def test_logged_in_not_cached(self):
+        self.addAll()
+        self._login()
+
+        self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.assertEqual(len(page_cache._cache), 0)
@@ -0,0 +1,173 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import create_engine
+
+from . import Base, DBSession
+from .test_functional import BaseFunctionalTest
+from okarchive.passwords import (
+    HashPool,
+    LoginUnavailable,
+    Passwords,
+    PoolFull,
+    ScryptHasher,
+    Throttle,
+    verify_md5,
+)
+
+
+class ScryptHasherTest(unittest.TestCase):
+    def test_hash_and_verify(self):
+        hasher = ScryptHasher(n=2 ** 8)
+        encoded = hasher.hash('secret')
+
+        self.assertTrue(encoded.startswith('scrypt$256$8$1$'))
+        self.assertNotEqual(encoded, hasher.hash('secret'))  # salted
+        self.assertTrue(hasher.verify('secret', encoded))
+        self.assertFalse(hasher.verify('wrong', encoded))
+        self.assertFalse(hasher.verify('secret', 'garbage'))
+        self.assertFalse(hasher.needs_update(encoded))
+
+    def test_old_parameters_still_verify(self):
+        encoded = ScryptHasher(n=2 ** 8).hash('secret')
+        hasher = ScryptHasher(n=2 ** 9)
+
+        self.assertTrue(hasher.verify('secret', encoded))
+        self.assertTrue(hasher.needs_update(encoded))
+
+    def test_md5(self):
+        self.assertTrue(verify_md5('secret',
+                                   '5ebe2294ecd0e0f08eab7690d2a6ee69'))
+        self.assertFalse(verify_md5('wrong',
+                                    '5ebe2294ecd0e0f08eab7690d2a6ee69'))
+
+    def test_configure(self):
+        passwords = Passwords()
+        passwords.configure({
+            'okarchive.password_hasher': 'okarchive.passwords:ScryptHasher',
+            'okarchive.password_hasher.n': '512',
+            'okarchive.login_throttle.burst': '2',
+        })
+
+        self.assertEqual(passwords.hasher.n, 512)
+        self.assertEqual(passwords.throttle.burst, 2)
+        self.assertTrue(passwords.check('secret',
+                                        passwords.hash('secret')))
+
+
+class ThrottleTest(unittest.TestCase):
+    def test_token_bucket(self):
+        now = [0.0]
+        throttle = Throttle(rate=0.5, burst=2, clock=lambda: now[0])
+
+        self.assertTrue(throttle.allow('bob'))
+        self.assertTrue(throttle.allow('bob'))
+        self.assertFalse(throttle.allow('bob'))
+        self.assertTrue(throttle.allow('alice'))
+        now[0] += 2
+        self.assertTrue(throttle.allow('bob'))
+        self.assertFalse(throttle.allow('bob'))
+
+
+class HashPoolTest(unittest.TestCase):
+    def test_full(self):
+        pool = HashPool(workers=1, waiting=0)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait()
+            return 'done'
+
+        results = []
+        thread = threading.Thread(
+            target=lambda: results.append(pool.run(slow)))
+        thread.start()
+        started.wait()
+        try:
+            self.assertRaises(LoginUnavailable, pool.run, lambda: None)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(results, ['done'])
+        self.assertEqual(pool.run(lambda: 42), 42)
+        pool.shutdown()
+
+    def test_admission_below_threads(self):
+        self.assertEqual(HashPool(workers=2, waiting=8).admitted, 10)
+        self.assertEqual(HashPool(workers=2, waiting=8, threads=4).admitted, 3)
+        self.assertEqual(HashPool(workers=2, waiting=0, threads=8).admitted, 2)
+        self.assertEqual(HashPool(workers=1, waiting=0, threads=1).admitted, 1)
+
+
+class BlockingHasher(ScryptHasher):
+    """Hasher whose hashes wait for ``release``."""
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def __init__(self, **options):
+        super().__init__(n=2)
+
+    def hash(self, password):
+        self.started.set()
+        self.release.wait()
+        return super().hash(password)
+
+
+class PoolFullTest(BaseFunctionalTest):
+    # Two server threads: one sign in at a time, one thread kept free.
+    global_config = {'threads': '2'}
+    settings = {'okarchive.password_hasher':
+                    'okarchive.tests.test_passwords:BlockingHasher',
+                'okarchive.password_pool.retry_after': '5'}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        BlockingHasher.started.clear()
+        BlockingHasher.release.clear()
+        super().setUp()
+
+    def setUpDb(self):
+        # Sign ins run on threads of their own, which need to see the
+        # same database: in-memory SQLite would give each a new one.
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(self.directory, 'test.sqlite'))
+        Base.metadata.create_all(self.engine)
+        DBSession.configure(bind=self.engine)
+
+    def tearDown(self):
+        BlockingHasher.release.set()
+        super().tearDown()
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def _sign_in(self, status):
+        return self.testapp.post('/login',
+                                 {'login': 'nobody',
+                                  'password': 'secret',
+                                  'form.submitted': 1},
+                                 status=status)
+
+    def _sign_in_waiting(self):
+        try:
+            self._sign_in(200)
+        finally:
+            DBSession.remove()
+
+    def test_other_requests_served(self):
+        thread = threading.Thread(target=self._sign_in_waiting)
+        thread.start()
+        self.assertTrue(BlockingHasher.started.wait(5))
+        try:
+            res = self._sign_in(503)
+            self.assertEqual(res.headers['Retry-After'], '5')
+            self.assertIn('Too many people are signing in', res)
+            self.testapp.get('/', status=200)
+        finally:
+            BlockingHasher.release.set()
+            thread.join()
@@ -0,0 +1,152 @@
+import io
+
+import transaction
+from sqlalchemy import text
+
+from . import BaseDatabaseTest, DBSession
+from .test_functional import BaseFunctionalTest
+from .test_unarchive import make_archive
+
+from okarchive.models import (
+    Journal,
+    Post,
+    search_container,
+)
+from okarchive.models.search import rebuild
+from okarchive.utils.unarchive import import_journal
+
+ANONYMOUS = ['system.Everyone']
+
+
+class SearchTest(BaseDatabaseTest):
+    def _search(self, terms, **kw):
+        return list(search_container.results(terms, **kw))
+
+    def test_post_indexed(self):
+        self.addAll()
+
+        hits = self._search('body')
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].post_id, 1)
+        self.assertIsNone(hits[0].comment_id)
+        # Tags are not indexed.
+        self.assertEqual(self._search('b'), [])
+        # Stemmed.
+        self.assertEqual(len(self._search('bodies')), 1)
+
+    def test_comment_indexed(self):
+        self.addAll()
+        post = DBSession.query(Post).get(1)
+        post.add_comment(text='Wonderful ride', user_id='bob', _flush=True)
+
+        hits = self._search('wonderful')
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0].title, 'First Post')
+        self.assertEqual(hits[0].user_id, 'bob')
+
+    def test_edit_reindexes(self):
+        self.addAll()
+        post = DBSession.query(Post).get(1)
+        post.text = 'Rewritten'
+        DBSession.flush()
+
+        self.assertEqual(self._search('body'), [])
+        self.assertEqual(len(self._search('rewritten')), 1)
+
+    def test_delete_unindexes(self):
+        self.addAll()
+        DBSession.query(Post).get(1).delete()
+        DBSession.flush()
+
+        self.assertEqual(self._search('first'), [])
+        count = DBSession.execute(
+            text('SELECT count(*) FROM search_index')).scalar()
+        self.assertEqual(count, 0)
+
+    def test_ranked_by_title(self):
+        self.addAll()
+        journal = DBSession.query(Journal).get('distractionbike')
+        journal.add_post(title='Other', text='Mentions bicycles once.')
+        journal.add_post(title='Bicycles', text='All about bicycles.',
+                         _flush=True)
+
+        self.assertEqual([hit.title for hit in self._search('bicycles')],
+                         ['Bicycles', 'Other'])
+
+    def test_visibility(self):
+        self.addAll()
+        journal = DBSession.query(Journal).get('distractionbike')
+        journal.add_post(title='Secret', privacy='private', _flush=True)
+        post = DBSession.query(Post).get(1)
+        comment = post.add_comment(text='Secret comment', user_id='bob',
+                                   _flush=True)
+        comment.hidden = True
+        DBSession.flush()
+
+        self.assertEqual(self._search('secret', principals=ANONYMOUS), [])
+        owner = ANONYMOUS + ['system.Authenticated', 'distractionbike']
+        self.assertEqual(len(self._search('secret', principals=owner)), 2)
+
+    def test_paging(self):
+        self.addAll()
+        journal = DBSession.query(Journal).get('distractionbike')
+        for i in range(5):
+            journal.add_post(title='Ride %d' % i)
+        DBSession.flush()
+
+        first = search_container.results('ride', limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(first.next_cursor, 2)
+        self.assertIsNone(first.prev_cursor)
+        second = search_container.results('ride', page=2, limit=3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(second.next_cursor)
+        self.assertEqual(second.prev_cursor, 1)
+
+    def test_query_syntax_is_literal(self):
+        self.addAll()
+
+        self.assertEqual(self._search('"first" AND (NOT'), [])
+        self.assertEqual(len(self._search('first post')), 1)
+        self.assertEqual(self._search('  '), [])
+
+    def test_rebuild(self):
+        self.addAll()
+        DBSession.execute(text('DELETE FROM search_index'))
+        self.assertEqual(self._search('first'), [])
+
+        rebuild()
+        self.assertEqual(len(self._search('first')), 2)
+
+    def test_import_indexes(self):
+        archive = make_archive([('Archived', 'Imported body',
+                                 [('bob', 'Imported comment')])])
+        import_journal(io.BytesIO(archive), 'distractionbike')
+
+        hits = self._search('imported')
+        self.assertEqual(len(hits), 2)
+        self.assertEqual({hit.comment_id is None for hit in hits},
+                         {True, False})
+
+
+class SearchViewTest(BaseFunctionalTest):
+    def test_search(self):
+        self.addAll()
+        transaction.commit()
+
+        res = self.testapp.get('/search', params={'q': 'body'}, status=200)
+        self.assertIn(
+            '<a href="http://localhost/journals/distractionbike/1/">'
+            'First Post</a>', res)
+
+        res = self.testapp.get('/search', params={'q': 'comment'},
+                               status=200)
+        self.assertIn('/journals/distractionbike/1/#comment-1', res)
+
+    def test_no_match(self):
+        res = self.testapp.get('/search', params={'q': 'nothing'}, status=200)
+        self.assertIn('Nothing you can read matches', res)
+
+    def test_bad_page(self):
+        self.testapp.get('/search', params={'q': 'x', 'page': 'x'},
+                         status=400)
@@ -4,9 +4,18 @@ from pyramid.security import (
 )
 
 from okarchive.tests import BaseDatabaseTest, DBSession
+from okarchive.tests.test_functional import BaseFunctionalTest
+from okarchive.models import (
+    Group,
+    Membership,
+    Post,
+)
+from okarchive.utils.sharedcache import NullCache
 from okarchive.security import (
     authenticate,
+    group_cache,
     group_finder,
+    permitted,
 )
 
 class TestSecurity(BaseDatabaseTest):
@@ -16,10 +25,80 @@ class TestSecurity(BaseDatabaseTest):
 
         self.assertTrue(authenticate('distractionbike', 'secret'))
 
+    def test_authenticate_upgrades_md5(self):
+        user = self.addUser()
+
+        self.assertFalse(authenticate('distractionbike', 'wrong'))
+        self.assertIsNone(user.password_hash)
+        self.assertTrue(authenticate('distractionbike', 'secret'))
+        self.assertIsNone(user.password_md5)
+        self.assertTrue(user.password_hash.startswith('scrypt$'))
+        self.assertTrue(authenticate('distractionbike', 'secret'))
+
+    def test_authenticate_throttled(self):
+        from okarchive.passwords import (
+            LoginUnavailable,
+            Throttle,
+            passwords,
+        )
+        self.addUser()
+        throttle = passwords.throttle
+        passwords.throttle = Throttle(rate=0.001, burst=1)
+        try:
+            self.assertFalse(authenticate('distractionbike', 'wrong'))
+            self.assertRaises(LoginUnavailable,
+                              authenticate, 'distractionbike', 'secret')
+            self.assertFalse(authenticate('nosuch', 'secret'))
+        finally:
+            passwords.throttle = throttle
+
     def test_groups(self):
+        self.addUser()
+        DBSession.add(Group(name='editors'))
+        DBSession.add(Membership(user_name='distractionbike',
+                                 group_name='editors'))
+        DBSession.flush()
+
         self.assertSequenceEqual(group_finder('distractionbike',
                                               request=None),
                                  ['group:editors'])
+        self.assertSequenceEqual(group_finder('otherguy', request=None), [])
+
+    def test_groups_cached(self):
+        from okarchive.utils.sharedcache import MemoryCache
+        self.addUser()
+        DBSession.add(Group(name='editors'))
+        DBSession.add(Group(name='moderators'))
+        DBSession.flush()
+        group_cache.configure(MemoryCache())
+        try:
+            self.assertEqual(group_finder('distractionbike', None), [])
+            with self.countQueries() as statements:
+                self.assertEqual(group_finder('distractionbike', None), [])
+            self.assertEqual(statements, [])
+
+            # Changed through the session: forgotten.
+            membership = Membership(user_name='distractionbike',
+                                    group_name='editors')
+            DBSession.add(membership)
+            DBSession.flush()
+            self.assertEqual(group_finder('distractionbike', None),
+                             ['group:editors'])
+            DBSession.add(Membership(user_name='distractionbike',
+                                     group_name='moderators'))
+            DBSession.delete(membership)
+            DBSession.flush()
+            self.assertEqual(group_finder('distractionbike', None),
+                             ['group:moderators'])
+
+            # Changed behind its back: stale until forgotten.
+            DBSession.execute("DELETE FROM memberships")
+            self.assertEqual(group_finder('distractionbike', None),
+                             ['group:moderators'])
+            group_cache.forget('distractionbike')
+            self.assertEqual(group_finder('distractionbike', None), [])
+        finally:
+            group_cache.configure(NullCache())
 
     def test_journal_security(self):
         journal = self.addJournal()
@@ -31,3 +110,76 @@ class TestSecurity(BaseDatabaseTest):
         self.assertSequenceEqual(pabp(journal, 'edit'), [Everyone])
         self.assertSequenceEqual(pabp(journal, 'delete'), [Everyone])
 
+
+    def test_permitted(self):
+        from pyramid import testing
+        from pyramid.authorization import ACLAuthorizationPolicy
+        config = testing.setUp()
+        try:
+            config.testing_securitypolicy(userid='otherguy')
+            config.set_authorization_policy(ACLAuthorizationPolicy())
+            self.addAll()
+            post = DBSession.query(Post).get(1)
+            request = testing.DummyRequest()
+
+            self.assertEqual(
+                permitted(request, post, ('view', 'add', 'edit')),
+                {'view', 'add'})
+            self.assertEqual(
+                permitted(request, post, ('edit', 'delete'),
+                          principals=['distractionbike']),
+                {'edit', 'delete'})
+        finally:
+            testing.tearDown()
+
+    def test_caching_policies(self):
+        from pyramid import testing
+        from okarchive.security import (
+            CachingAuthenticationPolicy,
+            CachingAuthorizationPolicy,
+            authorization_cache,
+        )
+        request = testing.DummyRequest()
+        testing.setUp(request=request)
+        try:
+            calls = []
+
+            def finder(userid, request):
+                calls.append(userid)
+                return ['group:editors']
+
+            authn = CachingAuthenticationPolicy('secret', callback=finder,
+                                                hashalg='sha512')
+            authn.unauthenticated_userid = lambda request: 'distractionbike'
+            for i in range(3):
+                principals = authn.effective_principals(request)
+                self.assertEqual(authn.authenticated_userid(request),
+                                 'distractionbike')
+            self.assertIn('group:editors', principals)
+            self.assertEqual(len(calls), 2)
+
+            self.addAll()
+            post = DBSession.query(Post).get(1)
+            authz = CachingAuthorizationPolicy()
+            for i in range(3):
+                self.assertTrue(authz.permits(post, principals, 'edit'))
+            self.assertFalse(authz.permits(post, [Everyone], 'edit'))
+            cache = authorization_cache(request)
+            self.assertEqual((cache.evaluations, cache.hits), (2, 2))
+
+            authn.forget(request)
+            self.assertEqual(cache.permits, {})
+        finally:
+            testing.tearDown()
+
+
+class AuthorizationLogTest(BaseFunctionalTest):
+    def test_logged(self):
+        self.addAll()
+        self._login()
+
+        with self.assertLogs('okarchive.security', 'DEBUG') as logs:
+            self.testapp.get('/journals/distractionbike/1/', status=200)
+        self.assertIn(
+            'GET /journals/distractionbike/1/: 3 ACL evaluations, 0 cached',
+            logs.output[-1])
@@ -0,0 +1,153 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+from pyramid import testing
+from pyramid.response import Response
+
+from .test_functional import BaseFunctionalTest
+
+from okarchive.sessions import (
+    FileSessionStore,
+    SQLSessionStore,
+    ServerSessionFactory,
+    session_factory_from_settings,
+)
+
+
+class StoreTests:
+    def test_save_load_delete(self):
+        store = self.store
+        store.save('a' * 64, {'x': [1, 2]}, 100.0, time.time() + 60)
+
+        self.assertEqual(store.load('a' * 64)[0], {'x': [1, 2]})
+        store.save('a' * 64, {'x': 3}, 100.0, time.time() + 60)
+        self.assertEqual(store.load('a' * 64)[:2], ({'x': 3}, 100.0))
+        store.delete('a' * 64)
+        self.assertIsNone(store.load('a' * 64))
+        store.delete('a' * 64)
+
+    def test_sweep(self):
+        store = self.store
+        store.save('a' * 64, {}, 100.0, time.time() - 1)
+        store.save('b' * 64, {}, 100.0, time.time() + 60)
+
+        self.assertIsNone(store.load('a' * 64))
+        self.assertEqual(store.sweep(), 1)
+        self.assertIsNotNone(store.load('b' * 64))
+
+
+class SQLSessionStoreTest(StoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = SQLSessionStore('sqlite://')
+
+
+class FileSessionStoreTest(StoreTests, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = FileSessionStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+class ServerSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.store = SQLSessionStore('sqlite://')
+        self.factory = ServerSessionFactory(self.store, timeout=60)
+
+    def _request(self, cookie=None):
+        request = testing.DummyRequest()
+        if cookie:
+            request.cookies['okarchive_session'] = cookie
+        return request
+
+    def _respond(self, request):
+        response = Response()
+        request._process_response_callbacks(response)
+        return response
+
+    def _session_id(self, response):
+        """Value of the last session cookie set."""
+
+        value = None
+        for header in response.headers.getall('Set-Cookie'):
+            name, set_value = header.split(';')[0].split('=', 1)
+            if name == 'okarchive_session':
+                value = set_value
+        return value
+
+    def test_untouched_writes_nothing(self):
+        request = self._request()
+        session = self.factory(request)
+        session.pop_flash()
+        session.peek_flash()
+
+        self.assertTrue(session.new)
+        self.assertNotIn('Set-Cookie', self._respond(request).headers)
+
+    def test_flash_round_trip(self):
+        request = self._request()
+        self.factory(request).flash(('success', 'Hi'))
+        session_id = self._session_id(self._respond(request))
+        self.assertEqual(len(session_id), 64)
+
+        # Read, unchanged: not written again.
+        request = self._request(session_id)
+        session = self.factory(request)
+        self.assertFalse(session.new)
+        self.assertEqual(session.peek_flash(), [['success', 'Hi']])
+        self.assertNotIn('Set-Cookie', self._respond(request).headers)
+
+        # Emptied: deleted.
+        request = self._request(session_id)
+        self.assertEqual(self.factory(request).pop_flash(),
+                         [['success', 'Hi']])
+        self.assertIn('okarchive_session=;',
+                      self._respond(request).headers['Set-Cookie'])
+        self.assertIsNone(self.store.load(session_id))
+
+    def test_bad_cookie(self):
+        request = self._request('../../etc/passwd')
+        session = self.factory(request)
+        session['x'] = 1
+        session_id = self._session_id(self._respond(request))
+
+        self.assertNotEqual(session_id, '../../etc/passwd')
+        self.assertEqual(self.store.load(session_id)[0], {'x': 1})
+
+    def test_invalidate(self):
+        request = self._request()
+        self.factory(request)['x'] = 1
+        session_id = self._session_id(self._respond(request))
+
+        request = self._request(session_id)
+        session = self.factory(request)
+        session.invalidate()
+        session['y'] = 2
+        new_id = self._session_id(self._respond(request))
+
+        self.assertIsNone(self.store.load(session_id))
+        self.assertNotEqual(new_id, session_id)
+        self.assertEqual(self.store.load(new_id)[0], {'y': 2})
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, session_factory_from_settings,
+                          {'okarchive.session.backend': 'cookie'})
+
+
+class SessionFunctionalTest(BaseFunctionalTest):
+    def test_cookie_is_id_only(self):
+        self.addUser()
+        res = self.testapp.post('/login',
+                                {'login': 'distractionbike',
+                                 'password': 'secret',
+                                 'form.submitted': 1},
+                                status=302)
+        self.assertEqual(len(self.testapp.cookies['okarchive_session']), 64)
+
+        res = res.follow()
+        self.assertIn('Signed in.', res)
+        # The flash was shown, so the session is gone.
+        self.assertNotIn('okarchive_session', self.testapp.cookies)
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+
+from chameleon.template import BaseTemplate
+
+from .test_functional import BaseFunctionalTest
+
+from okarchive.templating import (
+    template_names,
+    warm,
+)
+
+
+class WarmTest(BaseFunctionalTest):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.loader = BaseTemplate.loader
+        self.settings = {'okarchive.template_cache': self.directory,
+                         'okarchive.warm_templates': 'true'}
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        BaseTemplate.loader = self.loader
+        shutil.rmtree(self.directory)
+
+    def _compiled(self):
+        return [name for name in os.listdir(self.directory)
+                if name.endswith('.py')]
+
+    def test_warm(self):
+        # Warmed at startup.
+        compiled = self._compiled()
+        self.assertEqual(len(compiled), len(template_names()))
+
+        # Each template, plus main.pt as loaded by the pages using it.
+        registry = self.testapp.app.app.registry
+        self.assertGreater(warm(registry), len(template_names()))
+
+        self.testapp.get('/login', status=200)
+        # Nothing new to compile.
+        self.assertEqual(self._compiled(), compiled)
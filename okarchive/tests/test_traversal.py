@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import transaction
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from zope.sqlalchemy import mark_changed
+
+from . import Base, BaseDatabaseTest, DBSession
+from .test_functional import BaseFunctionalTest
+
+from okarchive.models import (
+    Journal,
+    Post,
+    journals_container as journals,
+)
+from okarchive.models.traversal import traversal_cache
+from okarchive.utils.sharedcache import (
+    MemoryCache,
+    NullCache,
+    SharedCache,
+    cache_from_settings,
+    make_server,
+)
+
+
+class TraversalCacheTest(BaseDatabaseTest):
+    def setUp(self):
+        BaseDatabaseTest.setUp(self)
+        traversal_cache.configure(MemoryCache())
+
+    def tearDown(self):
+        traversal_cache.configure(NullCache())
+        BaseDatabaseTest.tearDown(self)
+
+    def _traverse(self, journal_name, post_id):
+        DBSession.expunge_all()
+        with self.countQueries() as statements:
+            post = journals[journal_name][post_id]
+        return post, len(statements)
+
+    def test_hit_skips_queries(self):
+        self.addAll()
+        DBSession.flush()
+
+        post, queries = self._traverse('distractionbike', 1)
+        self.assertEqual(queries, 2)
+
+        post, queries = self._traverse('distractionbike', 1)
+        self.assertEqual(queries, 0)
+        self.assertEqual(post.journal_name, 'distractionbike')
+        self.assertEqual(post.__parent__.name, 'distractionbike')
+        with self.countQueries() as statements:
+            self.assertEqual(post.title, 'First Post')
+        self.assertEqual(len(statements), 1)
+
+    def test_wrong_journal(self):
+        self.addAll()
+        DBSession.add(Journal(name='otherguy'))
+        DBSession.flush()
+        journals['distractionbike'][1]
+
+        self.assertRaises(KeyError, lambda: journals['otherguy'][1])
+
+    def test_forget_deleted_post(self):
+        self.addAll()
+        journals['distractionbike'][1].delete()
+        DBSession.flush()
+
+        self.assertIsNone(traversal_cache.post(1))
+        self.assertRaises(KeyError, lambda: journals['distractionbike'][1])
+
+    def test_forget_privacy_change(self):
+        self.addAll()
+        post = journals['distractionbike'][1]
+        self.assertEqual(traversal_cache.post(1),
+                         ('distractionbike', 'public'))
+
+        post.privacy = 'private'
+        DBSession.flush()
+        self.assertIsNone(traversal_cache.post(1))
+
+
+class ConcurrentReadTest(TraversalCacheTest):
+    def setUpDb(self):
+        # A file, so a second connection sees only what is committed.
+        self.directory = tempfile.mkdtemp()
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(self.directory, 'test.sqlite'))
+        Base.metadata.create_all(self.engine)
+        DBSession.configure(bind=self.engine)
+
+    def tearDown(self):
+        TraversalCacheTest.tearDown(self)
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_read_between_flush_and_commit(self):
+        self.addAll()
+        transaction.commit()
+
+        journals['distractionbike'][1].privacy = 'private'
+        DBSession.flush()
+        # Another request reads the committed, still public post and
+        # caches it before this transaction commits.
+        other = Session(bind=self.engine)
+        try:
+            traversal_cache.set_post(other.query(Post).get(1))
+        finally:
+            other.close()
+        self.assertEqual(traversal_cache.post(1),
+                         ('distractionbike', 'public'))
+        transaction.commit()
+
+        self.assertIsNone(traversal_cache.post(1))
+        DBSession.remove()
+        journals['distractionbike'][1]
+        self.assertEqual(traversal_cache.post(1),
+                         ('distractionbike', 'private'))
+
+
+class StaleEntryTest(BaseFunctionalTest):
+    settings = {'pyramid.includes': 'pyramid_tm'}
+
+    def setUp(self):
+        BaseFunctionalTest.setUp(self)
+        traversal_cache.configure(MemoryCache())
+
+    def tearDown(self):
+        traversal_cache.configure(NullCache())
+        BaseFunctionalTest.tearDown(self)
+
+    def test_deleted_elsewhere(self):
+        self.addAll()
+        transaction.commit()
+        self.testapp.get('/journals/distractionbike/1/', status=200)
+
+        # Deleted by another process: this one's cache still has it.
+        DBSession.execute('DELETE FROM comments')
+        DBSession.execute('DELETE FROM posts')
+        mark_changed(DBSession())
+        transaction.commit()
+        self.assertIsNotNone(traversal_cache.post(1))
+
+        self.testapp.get('/journals/distractionbike/1/', status=404)
+        self.assertIsNone(traversal_cache.post(1))
+        self.testapp.get('/journals/distractionbike/1/', status=404)
+
+
+class SharedCacheTest(unittest.TestCase):
+    def test_shared(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            address = os.path.join(tmp, 'cache.sock')
+            server = make_server(address, b'secret')
+
+            def serve():
+                try:
+                    server.serve_forever()
+                except SystemExit:
+                    pass
+
+            thread = threading.Thread(target=serve, daemon=True)
+            thread.start()
+
+            one = SharedCache(address, b'secret')
+            two = SharedCache(address, b'secret')
+            one.set(('post', 1), ('distractionbike', 'public'))
+            self.assertEqual(two.get(('post', 1)),
+                             ('distractionbike', 'public'))
+            two.delete(('post', 1))
+            self.assertIsNone(one.get(('post', 1)))
+
+            server.stop_event.set()
+            thread.join()
+            server.listener.close()
+
+    def test_server_down(self):
+        cache = SharedCache('/nonexistent/cache.sock', b'secret')
+
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value')
+        self.assertGreater(cache._down_until, 0)
+
+    def test_from_settings(self):
+        self.assertIsInstance(cache_from_settings({}, 'c'), NullCache)
+        cache = cache_from_settings({'c': 'memory', 'c.ttl': '10'}, 'c')
+        self.assertIsInstance(cache, MemoryCache)
+        self.assertRaises(ValueError, cache_from_settings, {'c': 'nope'}, 'c')
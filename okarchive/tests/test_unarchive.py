@@ -0,0 +1,129 @@
+import csv
+import datetime
+import io
+import zipfile
+
+import transaction
+
+from . import BaseDatabaseTest, DBSession
+
+from okarchive.models import (
+    Journal,
+    Post,
+    Comment,
+    )
+from okarchive.utils.unarchive import (
+    read_post,
+    import_post,
+    import_journal,
+    )
+
+
+def make_post_csv(title, body, comments=()):
+    """Return CSV text for a post in the OkCupid archive layout."""
+
+    fh = io.StringIO()
+    writer = csv.writer(fh)
+    writer.writerow(['JOURNAL POST'])
+    writer.writerow([])
+    writer.writerow(['TITLE: ' + title])
+    writer.writerow(['CONTENT: ' + body])
+    writer.writerow(['Date posted: Monday, 28 Oct 2013, 12:30:00 '])
+    for user, text in comments:
+        writer.writerow([])
+        writer.writerow(['USER: ' + user])
+        writer.writerow(['Comment: ' + text])
+        writer.writerow(['Comment Date: Tuesday, 29 Oct 2013, 08:00:00 '])
+        writer.writerow([])
+    return fh.getvalue()
+
+
+def make_archive(posts):
+    """Return ZIP archive bytes with one CSV per (title, body, comments)."""
+
+    fh = io.BytesIO()
+    with zipfile.ZipFile(fh, 'w') as zf:
+        for i, (title, body, comments) in enumerate(posts):
+            zf.writestr('post%04d.csv' % i,
+                        make_post_csv(title, body, comments))
+    return fh.getvalue()
+
+
+class ReadPostTest(BaseDatabaseTest):
+    def test_read_post(self):
+        fh = io.StringIO(make_post_csv(
+            'Hi', '<b>Body, with comma</b>', [('bob', 'Yay')]))
+        post, comments = read_post(fh)
+
+        self.assertEqual(post['title'], 'Hi')
+        self.assertEqual(post['text'], '<b>Body, with comma</b>')
+        self.assertEqual(post['creation_date'],
+                         datetime.datetime(2013, 10, 28, 12, 30))
+        self.assertEqual(len(comments), 1)
+        self.assertEqual(comments[0]['user_id'], 'bob')
+        self.assertEqual(comments[0]['text'], 'Yay')
+
+    def test_import_post(self):
+        journal = self.addJournal()
+        fh = io.StringIO(make_post_csv('Hi', 'Body', [('bob', 'Yay')]))
+
+        post = import_post(journal, fh)
+        DBSession.flush()
+
+        self.assertEqual(post.title, 'Hi')
+        self.assertEqual([c.text for c in post.comments], ['Yay'])
+
+
+class ImportJournalTest(BaseDatabaseTest):
+    def test_import_journal(self):
+        archive = make_archive(
+            [('Post %d' % i, 'Body %d' % i, [('bob', 'c%d' % i)] * i)
+             for i in range(7)])
+
+        result = import_journal(io.BytesIO(archive), 'newjournal',
+                                chunk_size=3)
+
+        self.assertEqual(result, (7, 21))
+        journal = DBSession.query(Journal).get('newjournal')
+        self.assertEqual([p.title for p in journal.posts],
+                         ['Post %d' % i for i in range(7)])
+        self.assertEqual(DBSession.query(Comment).count(), 21)
+        post = DBSession.query(Post).filter_by(title='Post 3').one()
+        self.assertEqual([c.text for c in post.comments], ['c3'] * 3)
+        self.assertEqual(post.privacy, 'public')
+        self.assertEqual(journal.public_post_count, 7)
+        self.assertEqual(post.comment_count, 3)
+
+    def test_import_existing_journal(self):
+        self.addJournal()
+        transaction.commit()
+
+        archive = make_archive([('Title', 'Body', [])])
+        result = import_journal(io.BytesIO(archive), 'distractionbike')
+
+        self.assertEqual(result, (1, 0))
+        self.assertEqual(DBSession.query(Journal).count(), 1)
+
+
+class ImportArchiveScriptTest(BaseDatabaseTest):
+    def test_import_archive(self):
+        import os
+        import tempfile
+        from okarchive.scripts.importjournals import import_archive
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'someone.zip')
+            with open(path, 'wb') as fh:
+                fh.write(make_archive([('Title', 'Body', [('bob', 'Hi')])]))
+
+            _, counts, seconds, error = import_archive(path)
+            self.assertEqual(counts, (1, 1))
+            self.assertIsNone(error)
+            self.assertTrue(DBSession.query(Journal).get('someone'))
+
+            bad = os.path.join(tmp, 'broken.zip')
+            with open(bad, 'wb') as fh:
+                fh.write(b'not a zip file')
+            _, counts, seconds, error = import_archive(bad)
+            self.assertIsNone(counts)
+            self.assertIn('BadZipFile', error)
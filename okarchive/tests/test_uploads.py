@@ -0,0 +1,232 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import transaction
+from sqlalchemy import create_engine
+
+from . import Base, DBSession
+from .test_functional import BaseFunctionalTest
+from .test_unarchive import (
+    make_archive,
+    make_post_csv,
+)
+from okarchive.jobs import Worker
+from okarchive.models import (
+    Job,
+    Journal,
+    Upload,
+)
+from okarchive.utils.unarchive import import_journal
+from okarchive.uploads import (
+    SPOOL_BYTES,
+    UploadError,
+    UploadTooLarge,
+    archive_imports,
+    check_archive,
+    spool,
+)
+
+
+class SpoolTest(unittest.TestCase):
+    def test_small_in_memory(self):
+        with spool(io.BytesIO(b'abc'), 3) as spooled:
+            self.assertFalse(spooled._rolled)
+            self.assertEqual(spooled.read(), b'abc')
+
+    def test_large_on_disk(self):
+        body = b'x' * (SPOOL_BYTES + 1)
+        with spool(io.BytesIO(body), len(body)) as spooled:
+            self.assertTrue(spooled._rolled)
+            self.assertEqual(spooled.read(), body)
+
+    def test_reads_only_length(self):
+        with spool(io.BytesIO(b'abcdef'), 3) as spooled:
+            self.assertEqual(spooled.read(), b'abc')
+
+    def test_too_large(self):
+        body = io.BytesIO(b'abc')
+        self.assertRaises(UploadTooLarge, spool, body, 3, max_bytes=2)
+        self.assertEqual(body.tell(), 0)
+
+    def test_ended_early(self):
+        self.assertRaises(UploadError, spool, io.BytesIO(b'abc'), 10)
+
+
+class CheckArchiveTest(unittest.TestCase):
+    def test_ok(self):
+        archive = make_archive([('One', 'Body', []), ('Two', 'Body', [])])
+        self.assertEqual(check_archive(io.BytesIO(archive)), 2)
+
+    def test_not_zip(self):
+        self.assertRaises(UploadError, check_archive,
+                          io.BytesIO(b'not a zip file'))
+
+    def test_no_posts(self):
+        fh = io.BytesIO()
+        with zipfile.ZipFile(fh, 'w') as zf:
+            zf.writestr('readme.txt', 'Hi')
+        self.assertRaises(UploadError, check_archive, fh)
+
+    def test_unpacks_too_large(self):
+        fh = io.BytesIO()
+        with zipfile.ZipFile(fh, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('post.csv', make_post_csv('T', 'x' * 10000))
+        self.assertLess(len(fh.getvalue()), 1000)
+        self.assertRaises(UploadTooLarge, check_archive, fh,
+                          max_unpacked_bytes=5000)
+
+
+class UploadViewTest(BaseFunctionalTest):
+    settings = {'pyramid.includes': 'pyramid_tm',
+                'okarchive.upload.max_bytes': '100000'}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = dict(self.settings)
+        self.settings['okarchive.upload.directory'] = os.path.join(
+            self.directory, 'uploads')
+        super().setUp()
+
+    def setUpDb(self):
+        # Jobs run on worker threads, which need to see the same
+        # database: in-memory SQLite would give each a new, empty one.
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(self.directory, 'test.sqlite'))
+        Base.metadata.create_all(self.engine)
+        DBSession.configure(bind=self.engine)
+
+    def tearDown(self):
+        super().tearDown()
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def _login(self):
+        self.addUser()
+        self.addJournal()
+        transaction.commit()
+        self.testapp.post('/login',
+                          {'login': 'distractionbike',
+                           'password': 'secret',
+                           'form.submitted': 1},
+                          status=302)
+
+    def _work(self):
+        Worker(backoff=0).work(drain=True)
+
+    def _saved(self):
+        directory = archive_imports.directory
+        return os.listdir(directory) if os.path.exists(directory) else []
+
+    def _upload(self, body, status):
+        return self.testapp.post('/journals/distractionbike/upload',
+                                 body,
+                                 content_type='application/zip',
+                                 status=status)
+
+    def test_upload(self):
+        self._login()
+        archive = make_archive(
+            [('Post %d' % i, 'Body', [('bob', 'Hi')] * i) for i in range(3)])
+
+        res = self._upload(archive, 202)
+        self.assertEqual(res.json['status'], 'received')
+        self.assertEqual(res.location, res.json['status_url'])
+        self.assertEqual(self.testapp.get(res.location).json['status'],
+                         'received')
+        self._work()
+
+        status = self.testapp.get(res.location, status=200).json
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual((status['posts'], status['comments']), (3, 3))
+        self.assertEqual(status['progress'], {'done': 3, 'total': 3})
+        self.assertEqual(status['size'], len(archive))
+        job = self.testapp.get(status['job_url'], status=200).json
+        self.assertEqual((job['kind'], job['status']),
+                         ('import_upload', 'done'))
+        journal = DBSession.query(Journal).get('distractionbike')
+        self.assertEqual(journal.public_post_count, 3)
+        self.assertEqual(self._saved(), [])
+
+    def test_failed_import(self):
+        self._login()
+        fh = io.BytesIO()
+        with zipfile.ZipFile(fh, 'w') as zf:
+            zf.writestr('post.csv', 'not,a\npost\n')
+
+        res = self._upload(fh.getvalue(), 202)
+        self._work()
+
+        status = self.testapp.get(res.location, status=200).json
+        self.assertEqual(status['status'], 'failed')
+        self.assertTrue(status['error'])
+        job = DBSession.query(Job).one()
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertEqual(self._saved(), [])
+
+    def test_retrying(self):
+        self._login()
+        fh = io.BytesIO()
+        with zipfile.ZipFile(fh, 'w') as zf:
+            zf.writestr('post.csv', 'not,a\npost\n')
+        res = self._upload(fh.getvalue(), 202)
+
+        Worker(backoff=10).run_next()
+
+        status = self.testapp.get(res.location, status=200).json
+        self.assertEqual(status['status'], 'retrying')
+        self.assertTrue(status['error'])
+        job = DBSession.query(Job).one()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        # Kept for the next attempt.
+        self.assertEqual(len(self._saved()), 1)
+
+    def test_refused(self):
+        self._login()
+
+        res = self._upload(b'not a zip file', 400)
+        self.assertIn('Not a ZIP archive.', res)
+        self._upload(b'x' * 100001, 413)
+        self.assertEqual(DBSession.query(Upload).count(), 0)
+        self.assertEqual(DBSession.query(Job).count(), 0)
+        self.assertEqual(self._saved(), [])
+
+    def test_resumes(self):
+        self._login()
+        posts = [('Post %d' % i, 'Body', [('bob', 'Hi')]) for i in range(5)]
+        res = self._upload(make_archive(posts), 202)
+        # An earlier attempt got the first two posts in, then died.
+        import_journal(io.BytesIO(make_archive(posts[:2])), 'distractionbike')
+        with transaction.manager:
+            DBSession.query(Job).one().done = 2
+            upload = DBSession.query(Upload).one()
+            upload.posts = upload.comments = 2
+
+        self._work()
+
+        status = self.testapp.get(res.location).json
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual((status['posts'], status['comments']), (5, 5))
+        self.assertEqual(
+            [p.title for p in DBSession.query(Journal)
+                                       .get('distractionbike').posts],
+            ['Post %d' % i for i in range(5)])
+
+    def test_unauthorized(self):
+        self.addJournal()
+        transaction.commit()
+
+        self._upload(make_archive([('One', 'Body', [])]), 200)
+        self.assertEqual(DBSession.query(Upload).count(), 0)
+
+    def test_status_private(self):
+        self._login()
+        res = self._upload(make_archive([('One', 'Body', [])]), 202)
+        job_url = self.testapp.get(res.location).json['job_url']
+        self.testapp.get('/logout')
+
+        for url in [res.location, job_url, '/jobs']:
+            self.assertNotIn('"status"', self.testapp.get(url, status=200))
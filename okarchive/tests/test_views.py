@@ -1,4 +1,7 @@
+import urllib.parse
+
 from pyramid import testing
+from pyramid.httpexceptions import HTTPBadRequest
 #from pyramid.request import Request
 
 from . import BaseDatabaseTest, DBSession
@@ -13,6 +16,8 @@ from okarchive.views import (
 )
 from okarchive.models import (
     journals,
+    journals_container,
+    Journal,
     Post,
 )
 
@@ -38,11 +43,51 @@ class TestHomeView(BaseTestView):
 
 class TestJournalsView(BaseTestView):
     def test_it(self):
+        journal = self.addJournal()
+        journal.add_post(title='Public')
+        journal.add_post(title='Private', privacy='private')
+        DBSession.flush()
         request = testing.DummyRequest()
-        view = JournalsView(journals, request)
+        view = JournalsView(journals_container, request)
         info = view.view()
 
-        self.assertIs(info['journals'], journals)
+        # The first letter with journals; only public posts are counted.
+        self.assertEqual(info['journals'],
+                         [{'name': 'distractionbike',
+                           'post_count': 1,
+                           'url': 'http://example.com/journals/'
+                                  'distractionbike/'}])
+        current = [b for b in info['buckets'] if b['current']]
+        self.assertEqual([(b['label'], b['count']) for b in current],
+                         [('D', 1)])
+        self.assertEqual(len(info['buckets']), 27)
+
+    def test_paging(self):
+        for name in ['dave', 'Dan', 'daisy', 'zed', '42']:
+            DBSession.add(Journal(name=name))
+        request = testing.DummyRequest(params={'letter': 'd'})
+        request.registry.settings = {'okarchive.journals_per_page': '2'}
+        info = JournalsView(journals_container, request).view()
+
+        self.assertEqual([j['name'] for j in info['journals']],
+                         ['daisy', 'Dan'])
+        self.assertIsNone(info['prev_url'])
+        query = urllib.parse.urlsplit(info['next_url']).query
+        request = testing.DummyRequest(
+            params=dict(urllib.parse.parse_qsl(query)))
+        request.registry.settings = {'okarchive.journals_per_page': '2'}
+        info = JournalsView(journals_container, request).view()
+        self.assertEqual([j['name'] for j in info['journals']], ['dave'])
+        self.assertIsNone(info['next_url'])
+
+        request = testing.DummyRequest(params={'letter': '#'})
+        info = JournalsView(journals_container, request).view()
+        self.assertEqual([j['name'] for j in info['journals']], ['42'])
+
+    def test_bad_letter(self):
+        request = testing.DummyRequest(params={'letter': 'aa'})
+        view = JournalsView(journals_container, request)
+        self.assertRaises(HTTPBadRequest, view.view)
 
 
 class TestJournalView(BaseTestView):
@@ -60,6 +105,44 @@ class TestJournalView(BaseTestView):
                          'http://example.com/journals/distractionbike/add')
 
 
+    def test_paging(self):
+        journal = self.addJournal()
+        for i in range(3):
+            journal.add_post(title='Post %d' % i)
+        DBSession.flush()
+        self.config.registry.settings['okarchive.posts_per_page'] = '2'
+
+        request = testing.DummyRequest()
+        info = JournalView(journal, request).view()
+
+        self.assertEqual(len(info['posts']), 2)
+        self.assertIsNone(info['prev_url'])
+        self.assertTrue(info['next_url'].startswith(
+            'http://example.com/journals/distractionbike/?after='))
+
+        after = info['posts'].next_cursor
+        request = testing.DummyRequest(params={'after': after})
+        info = JournalView(journal, request).view()
+
+        self.assertEqual([p.title for p in info['posts']], ['Post 0'])
+        self.assertIsNone(info['next_url'])
+        self.assertTrue(info['prev_url'].startswith(
+            'http://example.com/journals/distractionbike/?before='))
+
+    def test_bad_cursor(self):
+        from pyramid.httpexceptions import HTTPBadRequest
+        journal = self.addJournal()
+
+        request = testing.DummyRequest(params={'after': 'garbage'})
+        view = JournalView(journal, request)
+        self.assertRaises(HTTPBadRequest, view.view)
+
+        # [1, 2]: the right length, the wrong types.
+        request = testing.DummyRequest(params={'after': 'WzEsIDJd'})
+        view = JournalView(journal, request)
+        self.assertRaises(HTTPBadRequest, view.view)
+
+
 class TestJournalViewWithSecurity(BaseTestView):
     def setUp(self):
         BaseTestView.setUp(self)
@@ -159,6 +242,57 @@ class TestPostView(BaseTestView):
                          'http://example.com/journals/distractionbike/1/delete')
 
 
+    def test_query_count(self):
+        journal = self.addJournal()
+        post = self.addPost()
+
+        def render_queries():
+            # as traversal leaves it: post and journal loaded, no text
+            DBSession.expunge_all()
+            traversed = journals_container['distractionbike'][1]
+            request = testing.DummyRequest()
+            with self.countQueries() as statements:
+                info = PostView(traversed, request).view()
+                info['post'].text
+                for comment in info['comments']:
+                    comment.text
+                    comment.__acl__
+            return len(statements)
+
+        self.assertEqual(render_queries(), 2)
+        post = DBSession.query(Post).get(1)
+        for i in range(50):
+            post.add_comment(text='Comment %d' % i, user_id='bob')
+        DBSession.flush()
+        self.assertEqual(render_queries(), 2)
+
+
+    def test_comment_paging(self):
+        journal = self.addJournal()
+        post = self.addPost()
+        for i in range(3):
+            post.add_comment(text='Comment %d' % i, user_id='bob')
+        DBSession.flush()
+        self.config.registry.settings['okarchive.comments_per_page'] = '2'
+
+        request = testing.DummyRequest()
+        info = PostView(post, request).view()
+
+        self.assertEqual([c.text for c in info['comments']],
+                         ['Comment 0', 'Comment 1'])
+        self.assertIsNone(info['comments_prev_url'])
+        self.assertTrue(info['comments_next_url'].startswith(
+            'http://example.com/journals/distractionbike/1/?comments_after='))
+
+        request = testing.DummyRequest(
+            params={'comments_after': info['comments'].next_cursor})
+        info = PostView(post, request).view()
+
+        self.assertEqual([c.text for c in info['comments']], ['Comment 2'])
+        self.assertIsNone(info['comments_next_url'])
+        self.assertIsNotNone(info['comments_prev_url'])
+
+
 class TestPostViewWithSecurity(BaseTestView):
     def setUp(self):
         BaseTestView.setUp(self)
@@ -0,0 +1,211 @@
+"""Journal archives uploaded over HTTP.
+
+The ``upload`` view of a journal takes a ZIP archive as the request
+body. :py:func:`spool` copies the body a chunk at a time into a spooled
+temporary file, which stays in memory only while small, so a request
+holds a constant amount of memory whatever the size of the archive, and
+refuses bodies over ``okarchive.upload.max_bytes``. :py:func:`check_archive`
+reads just the ZIP's central directory to refuse files that are not
+archives of posts before anything is kept.
+
+Accepted archives are saved under ``okarchive.upload.directory`` and
+recorded as an :py:class:`okarchive.models.Upload`, with an
+``import_upload`` job (see :py:mod:`okarchive.jobs`) that imports it,
+updating the upload's status as it goes.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+
+import transaction
+
+from .jobs import handler
+from .models import (
+    DBSession,
+    Upload,
+)
+from .utils.unarchive import (
+    archive_members,
+    import_journal,
+)
+
+# Bodies are kept in memory up to this size, then on disk.
+SPOOL_BYTES = 1024 * 1024
+
+# Size of each read from the request body.
+CHUNK_BYTES = 64 * 1024
+
+MAX_BYTES = 256 * 1024 * 1024
+MAX_UNPACKED_BYTES = 1024 * 1024 * 1024
+
+
+class UploadError(ValueError):
+    """Upload refused; the message says why."""
+
+
+class UploadTooLarge(UploadError):
+    """Upload, or what it unpacks to, is over the limit."""
+
+
+def spool(body_file, length, max_bytes=MAX_BYTES, directory=None):
+    """Copy ``length`` bytes of a request body to a spooled temporary file.
+
+    :raises UploadTooLarge: if ``length`` is over ``max_bytes``.
+    :raises UploadError: if the body ends early.
+    :returns: the file, rewound.
+    """
+
+    if length > max_bytes:
+        raise UploadTooLarge(
+            'Archives may be at most {} bytes.'.format(max_bytes))
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES,
+                                            dir=directory)
+    remaining = length
+    while remaining:
+        chunk = body_file.read(min(CHUNK_BYTES, remaining))
+        if not chunk:
+            spooled.close()
+            raise UploadError('Upload ended early.')
+        spooled.write(chunk)
+        remaining -= len(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def check_archive(fh, max_unpacked_bytes=MAX_UNPACKED_BYTES):
+    """Check an archive from its central directory, without unpacking it.
+
+    :raises UploadError: if it is not a ZIP file, has no post CSVs or
+      has members that cannot be read.
+    :raises UploadTooLarge: if its posts unpack to more than
+      ``max_unpacked_bytes``.
+    :returns: number of posts in the archive.
+    """
+
+    try:
+        zf = zipfile.ZipFile(fh)
+    except zipfile.BadZipFile:
+        raise UploadError('Not a ZIP archive.')
+    with zf:
+        members = archive_members(zf)
+        if not members:
+            raise UploadError('No post CSV files in archive.')
+        unpacked = 0
+        for info in members:
+            if info.flag_bits & 0x1:
+                raise UploadError('Encrypted: {}'.format(info.filename))
+            if info.compress_type not in (zipfile.ZIP_STORED,
+                                          zipfile.ZIP_DEFLATED):
+                raise UploadError('Unsupported compression: {}'.format(
+                    info.filename))
+            unpacked += info.file_size
+        if unpacked > max_unpacked_bytes:
+            raise UploadTooLarge(
+                'Archives may unpack to at most {} bytes.'.format(
+                    max_unpacked_bytes))
+    fh.seek(0)
+    return len(members)
+
+
+def _stopped(upload_id, status, error):
+    upload = DBSession.query(Upload).get(upload_id)
+    upload.status = status
+    upload.error = str(error) or type(error).__name__
+
+
+def _import_retrying(context, error, upload_id):
+    _stopped(upload_id, 'retrying', error)
+
+
+def _import_failed(context, error, upload_id):
+    _stopped(upload_id, 'failed', error)
+    # No attempt is left to need it.
+    archive_imports.discard_on_commit(upload_id)
+
+
+@handler('import_upload', failed=_import_failed, retrying=_import_retrying)
+def import_upload(context, upload_id):
+    """Job importing a saved upload into its journal.
+
+    Each chunk of posts records its progress as it commits, so a retry
+    picks up after the last chunk written.
+    """
+
+    with transaction.manager:
+        upload = DBSession.query(Upload).get(upload_id)
+        upload.status = 'importing'
+        journal_name = upload.journal_name
+        if context.done == 0:
+            upload.posts = upload.comments = 0
+
+    def written(done, total, comments):
+        context.progress(done, total)
+        (DBSession
+         .query(Upload)
+         .filter(Upload.id == upload_id)
+         .update({Upload.posts: done,
+                  Upload.comments: Upload.comments + comments},
+                 synchronize_session=False))
+
+    path = archive_imports.path(upload_id)
+    import_journal(path, journal_name, start=context.done, progress=written)
+    with transaction.manager:
+        upload = DBSession.query(Upload).get(upload_id)
+        upload.status = 'done'
+        upload.error = None
+    os.remove(path)
+
+
+class ArchiveImports:
+    """Holder for upload settings and where uploads wait."""
+
+    def __init__(self):
+        self.directory = os.path.join('var', 'uploads')
+        self.max_bytes = MAX_BYTES
+        self.max_unpacked_bytes = MAX_UNPACKED_BYTES
+
+    def configure(self, settings):
+        """Set up from ``okarchive.upload.*`` settings."""
+
+        prefix = 'okarchive.upload.'
+        self.directory = settings.get(prefix + 'directory',
+                                      os.path.join('var', 'uploads'))
+        self.max_bytes = int(settings.get(prefix + 'max_bytes', MAX_BYTES))
+        self.max_unpacked_bytes = int(settings.get(
+            prefix + 'max_unpacked_bytes', MAX_UNPACKED_BYTES))
+
+    def path(self, upload_id):
+        return os.path.join(self.directory, '{}.zip'.format(upload_id))
+
+    def save(self, upload_id, fh):
+        """Keep an upload until it is imported."""
+
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory,
+                                         suffix='.part',
+                                         delete=False) as out:
+            shutil.copyfileobj(fh, out, CHUNK_BYTES)
+        os.replace(out.name, self.path(upload_id))
+
+    def discard_on_abort(self, upload_id):
+        """Remove a saved upload if the current transaction fails."""
+
+        def discard(committed):
+            if not committed:
+                os.remove(self.path(upload_id))
+
+        transaction.get().addAfterCommitHook(discard)
+
+    def discard_on_commit(self, upload_id):
+        """Remove a saved upload once the current transaction commits."""
+
+        def discard(committed):
+            if committed and os.path.exists(self.path(upload_id)):
+                os.remove(self.path(upload_id))
+
+        transaction.get().addAfterCommitHook(discard)
+
+
+archive_imports = ArchiveImports()
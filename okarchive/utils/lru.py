@@ -0,0 +1,90 @@
+"""Thread-safe LRU cache with optional size budget and time-to-live."""
+
+import collections
+import threading
+import time
+
+_missing = object()
+
+
+class LRUCache:
+    """Least-recently-used cache.
+
+    :param max_items: *(optional)* most entries to keep.
+    :param max_bytes: *(optional)* most total size of entries to keep; each
+      entry's size is given when it is set.
+    :param ttl: *(optional)* seconds an entry stays fresh.
+    :param on_evict: *(optional)* called with the key of each entry removed
+      to make room, expired, or deleted.
+    """
+
+    def __init__(self, max_items=None, max_bytes=None, ttl=None,
+                 on_evict=None, clock=time.monotonic):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.clock = clock
+        self.size = 0
+        self._data = collections.OrderedDict()  # key -> (value, size, expires)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def get(self, key, default=None):
+        """Return value for key, or default if missing or expired."""
+
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, size, expires = entry
+            if expires is not None and expires <= self.clock():
+                self._remove(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, size=0):
+        """Store value for key, evicting least-recently-used entries.
+
+        Values larger than the whole budget are not stored.
+        """
+
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key, evicted=False)
+            self._data[key] = (value, size, expires)
+            self.size += size
+            while ((self.max_items is not None
+                        and len(self._data) > self.max_items)
+                   or (self.max_bytes is not None
+                        and self.size > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+
+    def delete(self, key):
+        """Remove key, if present."""
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        """Remove everything."""
+
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def _remove(self, key, evicted=True):
+        value, size, expires = self._data.pop(key)
+        self.size -= size
+        if evicted and self.on_evict is not None:
+            self.on_evict(key)
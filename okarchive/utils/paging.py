@@ -0,0 +1,133 @@
+"""Keyset (cursor) pagination for SQLAlchemy queries.
+
+Rather than ``OFFSET``, pages are found by filtering on the sort key of
+the last row seen, so any page costs an index range scan no matter how
+deep into the listing it is.
+"""
+
+import base64
+import datetime
+import json
+
+from sqlalchemy import (
+    and_,
+    or_,
+    DateTime,
+    )
+
+
+class Page:
+    """One page of results.
+
+    :ivar items: rows on this page, in display order.
+    :ivar next_cursor: cursor for the following page, or None.
+    :ivar prev_cursor: cursor for the preceding page, or None.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(values):
+    """Encode sort-key values as an opaque URL-safe string."""
+
+    values = [v.isoformat() if isinstance(v, datetime.datetime) else v
+              for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, keys):
+    """Decode cursor back into values for the ``keys`` columns.
+
+    :raises ValueError: if the cursor is malformed.
+    """
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('wrong number of values')
+        return [_key_value(key, v) for key, v in zip(keys, values)]
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError('Bad cursor: {}'.format(cursor)) from e
+
+
+def _key_value(key, value):
+    """Cursor value as the type of its ``key`` column.
+
+    :raises TypeError: if it is of another type.
+    """
+
+    if value is None:
+        return value
+    if isinstance(key.type, DateTime):
+        return datetime.datetime.fromisoformat(value)
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        python_type = (str, int, float)
+    if not isinstance(value, python_type):
+        raise TypeError('{} is not a {}'.format(value, python_type))
+    return value
+
+
+def _beyond(keys, values, descending):
+    """Predicate for rows sorting strictly after ``values``."""
+
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        beyond = key < value if descending else key > value
+        clauses.append(and_(*([k == v for k, v in zip(keys[:i], values[:i])]
+                              + [beyond])))
+    return or_(*clauses)
+
+
+def _cursor_for(row, keys):
+    return encode_cursor([getattr(row, key.key) for key in keys])
+
+
+def keyset_page(query, keys, after=None, before=None, limit=20,
+                descending=False):
+    """Return a :py:class:`Page` of ``query`` ordered by ``keys``.
+
+    :param keys: columns that make a unique sort key, e.g.
+      ``(Post.creation_date, Post.id)``; rows must have attributes
+      of the same names.
+    :param after: cursor; return the page following it.
+    :param before: cursor; return the page preceding it.
+    :param limit: page size.
+    :param descending: sort by ``keys`` descending rather than ascending.
+    :raises ValueError: if a cursor is malformed.
+    """
+
+    backwards = before is not None and after is None
+    cursor = before if backwards else after
+    # Walking backwards is the same scan in the opposite order.
+    reverse = descending != backwards
+
+    if cursor is not None:
+        query = query.filter(
+            _beyond(keys, decode_cursor(cursor, keys), reverse))
+    order = [key.desc() if reverse else key.asc() for key in keys]
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return Page(rows)
+
+    if backwards:
+        rows.reverse()
+        return Page(rows,
+                    next_cursor=_cursor_for(rows[-1], keys),
+                    prev_cursor=_cursor_for(rows[0], keys) if more else None)
+    return Page(rows,
+                next_cursor=_cursor_for(rows[-1], keys) if more else None,
+                prev_cursor=_cursor_for(rows[0], keys) if cursor else None)
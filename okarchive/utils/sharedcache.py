@@ -0,0 +1,152 @@
+"""Small key/value caches behind one interface.
+
+- :py:class:`NullCache` caches nothing.
+- :py:class:`MemoryCache` is an in-process LRU with a time-to-live.
+- :py:class:`SharedCache` talks over a local (Unix) socket to a cache
+  server started with :py:func:`serve`, so several server processes on
+  one host share one cache.
+
+Keys and values must be picklable. A cache is only ever an optimization:
+if the shared cache server is unreachable, lookups miss and writes are
+dropped until it comes back.
+"""
+
+import logging
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from .lru import LRUCache
+
+log = logging.getLogger(__name__)
+
+
+class NullCache:
+    """Cache that never holds anything."""
+
+    def get(self, key):
+        """Return cached value, or None."""
+
+        return None
+
+    def set(self, key, value):
+        """Cache value for key."""
+
+    def delete(self, key):
+        """Forget key."""
+
+    def clear(self):
+        """Forget everything."""
+
+
+class MemoryCache(NullCache):
+    """In-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_items=10000, ttl=300):
+        self._lru = LRUCache(max_items=max_items, ttl=ttl)
+
+    def get(self, key):
+        return self._lru.get(key)
+
+    def set(self, key, value):
+        self._lru.set(key, value)
+
+    def delete(self, key):
+        self._lru.delete(key)
+
+    def clear(self):
+        self._lru.clear()
+
+
+class _ServerManager(BaseManager):
+    pass
+
+
+class _ClientManager(BaseManager):
+    pass
+
+
+_ClientManager.register('store')
+
+
+def make_server(address, authkey, max_items=10000, ttl=300):
+    """Return a cache server listening on a Unix socket path."""
+
+    store = MemoryCache(max_items=max_items, ttl=ttl)
+    _ServerManager.register('store', callable=lambda: store)
+    return _ServerManager(address=address, authkey=authkey).get_server()
+
+
+def serve(address, authkey, max_items=10000, ttl=300): #pragma NOCOVER
+    """Run a cache server until interrupted."""
+
+    make_server(address, authkey, max_items, ttl).serve_forever()
+
+
+class SharedCache(NullCache):
+    """Client of a cache server on a local socket.
+
+    :param retry_after: seconds to treat the cache as empty after failing
+      to reach the server.
+    """
+
+    def __init__(self, address, authkey, retry_after=5):
+        self.address = address
+        self.authkey = authkey
+        self.retry_after = retry_after
+        self._store = None
+        self._down_until = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self._store is None:
+                manager = _ClientManager(address=self.address,
+                                         authkey=self.authkey)
+                manager.connect()
+                self._store = manager.store()
+            return self._store
+
+    def _call(self, method, *args):
+        if self._down_until > time.monotonic():
+            return None
+        try:
+            return getattr(self._connect(), method)(*args)
+        except (OSError, EOFError) as e:
+            log.warning('shared cache at %s unavailable: %s', self.address, e)
+            self._store = None
+            self._down_until = time.monotonic() + self.retry_after
+            return None
+
+    def get(self, key):
+        return self._call('get', key)
+
+    def set(self, key, value):
+        self._call('set', key, value)
+
+    def delete(self, key):
+        self._call('delete', key)
+
+    def clear(self):
+        self._call('clear')
+
+
+def cache_from_settings(settings, prefix):
+    """Build a cache from ``<prefix>`` settings.
+
+    ``<prefix>`` is ``none`` (default), ``memory`` or ``shared``;
+    ``<prefix>.max_items`` and ``<prefix>.ttl`` size a memory cache;
+    ``<prefix>.address`` and ``<prefix>.authkey`` locate a shared one.
+    """
+
+    kind = settings.get(prefix, 'none')
+    if kind == 'memory':
+        return MemoryCache(
+            max_items=int(settings.get(prefix + '.max_items', 10000)),
+            ttl=float(settings.get(prefix + '.ttl', 300)))
+    if kind == 'shared':
+        return SharedCache(settings[prefix + '.address'],
+                           settings[prefix + '.authkey'].encode())
+    if kind == 'none':
+        return NullCache()
+    raise ValueError('Unknown cache type for {}: {}'.format(prefix, kind))
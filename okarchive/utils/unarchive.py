@@ -1,82 +1,268 @@
+"""Import OkCupid journal archives.
+
+An archive is a ZIP file with one CSV file per post. Each CSV has the
+post title, body and date, followed by the comments on that post.
+:py:func:`write_post` writes the same layout, for exports, with rows
+OkCupid's archives never have: ``LEDE:`` and ``PRIVACY:`` after the title
+of posts with a lede or that aren't public, and ``Comment Hidden:`` after
+the date of hidden comments. Without them, posts are public and comments
+published.
+"""
+
 import csv
 import datetime
+import io
+import zipfile
 
-def import_journal(zfile):
-    pass
+import transaction
+from zope.sqlalchemy import mark_changed
 
-def import_post(journal):
-    with open('/tmp/test.csv') as fh:
-        contents = iter(csv.reader(fh))
+from ..models import (
+    DBSession,
+    Journal,
+    Post,
+    Comment,
+    )
+from ..models.search import (
+    comment_document,
+    index_documents,
+    post_document,
+)
 
-        _ = next(contents)
-        _ = next(contents)
+DATE_FORMAT = '%A, %d %b %Y, %H:%M:%S '
 
-        _ = next(contents)
-        title = _[0][len('TITLE: '):]
+# Number of posts written per database transaction.
+CHUNK_SIZE = 100
 
-        _ = next(contents)
-        body = _[0][len('CONTENT: '):]
 
-        _ = next(contents)
-        dateraw = _[0][len('Date posted: '):]
-        dt = datetime.datetime.strptime(dateraw, '%A, %d %b %Y, %H:%M:%S ')
+def _field(row, prefix):
+    """Return value of a ``PREFIX: value`` row."""
 
-        post = journal.add_post(title=title,
-                         text=body,
-                         creation_date=dt,
-                         modification_date=dt,
-                         _flush=True)
+    return row[0][len(prefix):]
 
-        while True:
-            try:
-                _ = next(contents)
-            except StopIteration:
-                break
 
-            _ = next(contents)
-            user = _[0][len('USER: '):]
+def _date(row, prefix):
+    """Return datetime of a ``PREFIX: date`` row."""
 
-            _ = next(contents)
-            text = _[0][len('Comment: '):]
+    return datetime.datetime.strptime(_field(row, prefix), DATE_FORMAT)
 
-            _ = next(contents)
-            dateraw = _[0][len('Comment Date: '):]
-            dt = datetime.datetime.strptime(dateraw, '%A, %d %b %Y, %H:%M:%S ')
 
-            _ = next(contents)
+def read_post(fh):
+    """Parse one post CSV from an open text file.
 
-            post.add_comment(text=text,
-                             creation_date=dt,
-                             modification_date=dt,
+    :returns: ``(post, comments)``, where ``post`` is a dictionary of
+      :py:class:`okarchive.models.Post` columns and ``comments`` is a list
+      of dictionaries of :py:class:`okarchive.models.Comment` columns.
+    """
+
+    contents = csv.reader(fh)
+
+    next(contents)
+    next(contents)
+    title = _field(next(contents), 'TITLE: ')
+    row = next(contents)
+    lede = None
+    if row and row[0].startswith('LEDE: '):
+        lede = _field(row, 'LEDE: ')
+        row = next(contents)
+    privacy = 'public'
+    if row and row[0].startswith('PRIVACY: '):
+        privacy = _field(row, 'PRIVACY: ')
+        row = next(contents)
+    body = _field(row, 'CONTENT: ')
+    dt = _date(next(contents), 'Date posted: ')
+    post = dict(title=title,
+                lede=lede,
+                text=body,
+                privacy=privacy,
+                creation_date=dt,
+                modification_date=dt)
+
+    comments = []
+    for _ in contents:
+        user = _field(next(contents), 'USER: ')
+        text = _field(next(contents), 'Comment: ')
+        dt = _date(next(contents), 'Comment Date: ')
+        row = next(contents)
+        hidden = bool(row) and row[0].startswith('Comment Hidden: ')
+        if hidden:
+            next(contents)
+        comments.append(dict(text=text,
                              user_id=user,
-                             )
+                             hidden=hidden,
+                             creation_date=dt,
+                             modification_date=dt))
+    return post, comments
+
+
+def write_post(fh, post, comments):
+    """Write one post CSV, as :py:func:`read_post` reads it, to a text file.
+
+    :param post: dictionary with the post's ``title``, ``lede``, ``text``,
+      ``privacy`` and ``creation_date``.
+    :param comments: dictionaries with each comment's ``user_id``,
+      ``text``, ``hidden`` and ``creation_date``.
+    """
+
+    writer = csv.writer(fh)
+    writer.writerow(['JOURNAL POST'])
+    writer.writerow([])
+    writer.writerow(['TITLE: ' + (post['title'] or '')])
+    if post.get('lede'):
+        writer.writerow(['LEDE: ' + post['lede']])
+    if post.get('privacy', 'public') != 'public':
+        writer.writerow(['PRIVACY: ' + post['privacy']])
+    writer.writerow(['CONTENT: ' + (post['text'] or '')])
+    writer.writerow(['Date posted: '
+                     + post['creation_date'].strftime(DATE_FORMAT)])
+    for comment in comments:
+        writer.writerow([])
+        writer.writerow(['USER: ' + comment['user_id']])
+        writer.writerow(['Comment: ' + (comment['text'] or '')])
+        writer.writerow(['Comment Date: '
+                         + comment['creation_date'].strftime(DATE_FORMAT)])
+        if comment.get('hidden'):
+            writer.writerow(['Comment Hidden: yes'])
+        writer.writerow([])
+
+
+def import_post(journal, fh):
+    """Import a single post CSV into journal.
+
+    :param journal: :py:class:`okarchive.models.Journal` to add post to.
+    :param fh: open text file of post CSV.
+    :returns: newly created Post.
+    """
+
+    values, comments = read_post(fh)
+    post = journal.add_post(_flush=True, **values)
+    for comment in comments:
+        post.add_comment(**comment)
+    return post
+
+
+def archive_members(zf):
+    """Return post CSV members of an archive, in name order."""
+
+    return sorted((info for info in zf.infolist()
+                   if info.filename.lower().endswith('.csv')
+                   and not info.filename.startswith('__MACOSX/')),
+                  key=lambda info: info.filename)
+
+
+def _open_member(zf, info):
+    """Open archive member as text stream, without extracting it."""
+
+    return io.TextIOWrapper(zf.open(info), encoding='utf-8-sig', newline='')
+
+
+def _import_chunk(journal_name, zf, members, written=None):
+    """Write a chunk of posts and their comments in one transaction.
+
+    ``written(posts, comments)`` is called before it commits.
+    """
+
+    posts = []
+    comments = []
+    for info in members:
+        with _open_member(zf, info) as fh:
+            values, post_comments = read_post(fh)
+        values['journal_name'] = journal_name
+        values['comment_count'] = sum(not comment['hidden']
+                                      for comment in post_comments)
+        posts.append(values)
+        comments.append(post_comments)
+
+    with transaction.manager:
+        # Posts need their generated IDs back for the comments; comments
+        # go out as one multi-row insert for the whole chunk.
+        DBSession.bulk_insert_mappings(Post, posts, return_defaults=True)
+        rows = []
+        for post, post_comments in zip(posts, comments):
+            for comment in post_comments:
+                comment['post_id'] = post['id']
+                rows.append(comment)
+        if rows:
+            DBSession.bulk_insert_mappings(Comment, rows)
+        # Bulk inserts bypass the session's flush hooks and the unit of
+        # work; index, count, touch the journal and tell the transaction
+        # ourselves.
+        documents = [post_document(post['id'], post['title'],
+                                   post.get('lede'), post.get('text'))
+                     for post in posts]
+        documents.extend(
+            comment_document(*row)
+            for row in (DBSession
+                        .query(Comment.id, Comment.post_id, Comment.text)
+                        .filter(Comment.post_id.in_(
+                            [post['id'] for post in posts]))))
+        index_documents(DBSession.connection(), documents)
+        public = sum(post['privacy'] == 'public' for post in posts)
+        (DBSession
+         .query(Journal)
+         .filter(Journal.name == journal_name)
+         .update({Journal.modification_date: datetime.datetime.utcnow(),
+                  Journal.public_post_count:
+                      Journal.public_post_count + public},
+                 synchronize_session=False))
+        mark_changed(DBSession())
+        if written is not None:
+            written(len(posts), len(rows))
+
+    return len(posts), len(rows)
+
+
+def import_journal(zfile, journal_name, chunk_size=CHUNK_SIZE, start=0,
+                   progress=None):
+    """Import all posts in a journal archive.
+
+    The journal is created if it does not exist. Posts are read straight
+    from the ZIP file and written ``chunk_size`` posts per transaction.
+
+    :param zfile: path or open binary file of ZIP archive.
+    :param journal_name: name of journal to import into.
+    :param start: number of posts (in name order) to skip, as already
+      imported by an earlier, interrupted run.
+    :param progress: called as ``progress(done, total, comments)`` in each
+      chunk's transaction, just before it commits: ``done`` of ``total``
+      posts are then imported, and ``comments`` is how many comments the
+      chunk wrote.
+    :returns: ``(posts, comments)`` counts of imported objects.
+    """
+
+    n_posts = n_comments = 0
+    with zipfile.ZipFile(zfile) as zf:
+        members = archive_members(zf)
+
+        with transaction.manager:
+            if not DBSession.query(Journal).get(journal_name):
+                DBSession.add(Journal(name=journal_name))
+
+        for first in range(start, len(members), chunk_size):
+            chunk = members[first:first + chunk_size]
+            written = None
+            if progress is not None:
+                def written(posts, comments, done=first + len(chunk)):
+                    progress(done, len(members), comments)
+            posts, comments = _import_chunk(journal_name, zf, chunk, written)
+            n_posts += posts
+            n_comments += comments
+    return n_posts, n_comments
+
 
 if __name__ == '__main__':
-    from okarchive.models import siteRoot
-    import transaction
     import sys
     from sqlalchemy import engine_from_config
 
-    from pyramid.paster import (
-        get_appsettings,
-        setup_logging,
-        )
-
-    from okarchive.models import (
-        DBSession,
-        Base,
-        Journal,
-        Post,
-        User,
-        )
+    from pyramid.paster import get_appsettings
 
+    from okarchive.models import Base
 
-    config_uri = sys.argv[1]
+    config_uri, journal_name, zfile = sys.argv[1:4]
     settings = get_appsettings(config_uri)
     engine = engine_from_config(settings, 'sqlalchemy.')
     DBSession.configure(bind=engine)
     Base.metadata.create_all(engine)
 
-    journal = siteRoot['journals']['distractionbike']
-    import_post(journal)
-    transaction.commit()
\ No newline at end of file
+    print('Imported %d posts, %d comments.'
+          % import_journal(zfile, journal_name))
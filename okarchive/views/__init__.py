@@ -6,3 +6,8 @@ from .home import HomeView
 from .journals import JournalsView
 from .login import LoginLogoutView
 from .comment import CommentView
+from .search import SearchView
+from .stats import StatsView
+from .upload import UploadView
+from .job import JobView
+from .stale import StaleTraversalView
@@ -2,6 +2,7 @@ from pyramid.view import view_config
 from pyramid.response import Response
 
 from ..models import Comment
+from ..pagecache import page_cache
 
 class CommentView:
     """View for individual comment."""
@@ -21,7 +22,8 @@ class CommentView:
                  context=Comment,
                  permission="hide")
     def reject(self):
-        self.resource.hidden = True
+        self.resource.hide()
+        page_cache.invalidate(self.resource)
         return Response(self.resource.text)
 
 
@@ -29,6 +31,7 @@ class CommentView:
                      context=Comment,
                      permission="publish")
     def publish(self):
-        self.resource.hidden = False
+        self.resource.publish()
+        page_cache.invalidate(self.resource)
         return Response(self.resource.text)
 
@@ -0,0 +1,60 @@
+from pyramid.view import view_config
+
+from ..models import (
+    Job,
+    Jobs,
+)
+
+# Jobs listed at /jobs.
+RECENT_JOBS = 50
+
+
+def job_status(job):
+    """Status of a job, as a dict."""
+
+    return dict(id=job.id,
+                kind=job.kind,
+                user_id=job.user_id,
+                status=job.status,
+                attempts=job.attempts,
+                max_attempts=job.max_attempts,
+                done=job.done,
+                total=job.total,
+                message=job.message,
+                error=job.error,
+                worker=job.worker,
+                created=job.creation_date.isoformat(),
+                updated=job.modification_date.isoformat(),
+                run_after=job.run_after.isoformat(),
+                finished=(job.finished_date.isoformat()
+                          if job.finished_date else None))
+
+
+class JobView:
+    """Status and progress of background jobs."""
+
+    def __init__(self, resource, request):
+        self.resource = resource
+        self.request = request
+
+    @view_config(name='',
+                 context=Job,
+                 renderer='json',
+                 permission='view',
+                 http_cache=0)
+    def view(self):
+        return job_status(self.resource)
+
+    @view_config(name='',
+                 context=Jobs,
+                 renderer='json',
+                 permission='view',
+                 http_cache=0)
+    def recent(self):
+        """Newest jobs and the number in each status, for editors."""
+
+        jobs, counts = self.resource.recent(RECENT_JOBS)
+        return dict(counts=counts,
+                    jobs=[dict(job_status(job),
+                               url=self.request.resource_url(job))
+                          for job in jobs])
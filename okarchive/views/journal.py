@@ -1,18 +1,48 @@
 import deform
 
+from pyramid.response import Response
 from pyramid.view import view_config
 from pyramid.security import (
     authenticated_userid,
+    effective_principals,
     has_permission,
 )
-from pyramid.httpexceptions import HTTPFound
+from pyramid.httpexceptions import (
+    HTTPFound,
+    HTTPBadRequest,
+    HTTPLengthRequired,
+    HTTPRequestEntityTooLarge,
+)
 
 from ..models import (
+    DBSession,
     Post,
     Journal,
+    Upload,
     )
+from ..pagecache import (
+    cached_page,
+    page_cache,
+)
+from ..conditional import conditional_get
+from ..exports import (
+    json_chunks,
+    zip_chunks,
+)
+from ..jobs import enqueue
+from ..uploads import (
+    UploadError,
+    UploadTooLarge,
+    archive_imports,
+    check_archive,
+    spool,
+)
 from .post import PostView
 
+# Default number of posts per journal page; see ``okarchive.posts_per_page``.
+POSTS_PER_PAGE = 20
+
+
 class JournalView:
     """View for journals."""
 
@@ -22,7 +52,8 @@ class JournalView:
 
     @view_config(name='',
                  context=Journal,
-                 renderer='okarchive:templates/journal.pt')
+                 renderer='okarchive:templates/journal.pt',
+                 decorator=(conditional_get, cached_page))
     def view(self):
         """View journal and list of posts."""
 
@@ -34,9 +65,34 @@ class JournalView:
         else:
             add_url = None
 
+        page_size = int(req.registry.settings.get(
+            'okarchive.posts_per_page', POSTS_PER_PAGE))
+        try:
+            posts = journal.post_page(after=req.params.get('after'),
+                                      before=req.params.get('before'),
+                                      limit=page_size,
+                                      principals=effective_principals(req))
+        except ValueError:
+            raise HTTPBadRequest('Bad page cursor.')
+
+        if posts.next_cursor:
+            next_url = req.resource_url(
+                journal, query={'after': posts.next_cursor})
+        else:
+            next_url = None
+
+        if posts.prev_cursor:
+            prev_url = req.resource_url(
+                journal, query={'before': posts.prev_cursor})
+        else:
+            prev_url = None
+
         return dict(
             journal_name=journal.name,
-            posts=journal.posts,
+            journal_url=req.resource_url(journal),
+            posts=posts,
+            next_url=next_url,
+            prev_url=prev_url,
             logged_in=authenticated_userid(req),
             add_url=add_url,
         )
@@ -71,8 +127,10 @@ class JournalView:
                              title=appstruct['title'],
                              text=appstruct['text'],
                              lede=appstruct['lede'],
+                             privacy=appstruct['privacy'],
                              _flush=True    # make post.id available to us
                              )
+            page_cache.invalidate(post)
             return HTTPFound(location=req.resource_url(post))
 
         else:
@@ -84,3 +142,75 @@ class JournalView:
                         logged_in=authenticated_userid(req),
             )
 
+    @view_config(name='upload',
+                 context=Journal,
+                 request_method='POST',
+                 renderer='json',
+                 permission='add')
+    def upload(self):
+        """Accept a journal archive as the request body, to import later.
+
+        Answers 202 Accepted with the upload's status URL.
+        """
+
+        req = self.request
+        journal = self.resource
+
+        if req.content_length is None:
+            raise HTTPLengthRequired('Uploads need a Content-Length.')
+        try:
+            with spool(req.body_file,
+                       req.content_length,
+                       archive_imports.max_bytes) as archive:
+                check_archive(archive, archive_imports.max_unpacked_bytes)
+                upload = Upload(journal_name=journal.name,
+                                user_id=authenticated_userid(req),
+                                size=req.content_length)
+                DBSession.add(upload)
+                DBSession.flush()
+                archive_imports.save(upload.id, archive)
+        except UploadTooLarge as e:
+            raise HTTPRequestEntityTooLarge(str(e))
+        except UploadError as e:
+            raise HTTPBadRequest(str(e))
+        archive_imports.discard_on_abort(upload.id)
+        upload.job_id = enqueue('import_upload',
+                                user_id=upload.user_id,
+                                upload_id=upload.id).id
+
+        status_url = req.resource_url(upload)
+        req.response.status = 202
+        req.response.location = status_url
+        return dict(id=upload.id,
+                    status=upload.status,
+                    status_url=status_url)
+
+    @view_config(name='export',
+                 context=Journal,
+                 request_method='GET',
+                 permission='edit')
+    def export(self):
+        """Download the journal: ``?format=zip`` (the default; post CSVs,
+        as uploads take them) or ``?format=json``.
+
+        The body is streamed; see :py:mod:`okarchive.exports`.
+        """
+
+        req = self.request
+        journal = self.resource
+
+        fmt = req.params.get('format', 'zip')
+        if fmt == 'zip':
+            chunks, content_type = zip_chunks, 'application/zip'
+        elif fmt == 'json':
+            chunks, content_type = json_chunks, 'application/json'
+        else:
+            raise HTTPBadRequest('Export format must be zip or json.')
+        return Response(
+            app_iter=chunks(DBSession.get_bind(), journal.name),
+            content_type=content_type,
+            charset='utf-8' if fmt == 'json' else None,
+            content_disposition='attachment; filename="{}.{}"'.format(
+                journal.name, fmt),
+            cache_control='private, no-store',
+        )
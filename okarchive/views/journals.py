@@ -1,7 +1,18 @@
 from pyramid.view import view_config
 from pyramid.security import authenticated_userid
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.traversal import quote_path_segment
 
-from ..models import Journals
+from ..models import (
+    BUCKETS,
+    Journals,
+    bucket_counts,
+)
+from ..conditional import conditional_get
+
+# Default number of journals per directory page; see
+# ``okarchive.journals_per_page``.
+JOURNALS_PER_PAGE = 100
 
 
 class JournalsView(object):
@@ -11,13 +22,50 @@ class JournalsView(object):
         self.request = request
         self.resource = resource
 
+    def _url(self, bucket, **query):
+        query['letter'] = bucket
+        return self.request.resource_url(self.resource, query=query)
+
     @view_config(name='',
                  renderer='okarchive:templates/journals.pt',
                  context=Journals,
-                 permission='view')
+                 permission='view',
+                 decorator=conditional_get)
     def view(self):
+        """One letter of the journals directory, a page at a time."""
+
+        req = self.request
+        counts = bucket_counts.get()
+
+        bucket = req.params.get('letter')
+        if bucket is None:
+            bucket = next((b for b in BUCKETS if counts.get(b)), BUCKETS[0])
+
+        page_size = int(req.registry.settings.get(
+            'okarchive.journals_per_page', JOURNALS_PER_PAGE))
+        try:
+            page = self.resource.bucket_page(bucket,
+                                             after=req.params.get('after'),
+                                             before=req.params.get('before'),
+                                             limit=page_size)
+        except ValueError:
+            raise HTTPBadRequest('Bad letter or page cursor.')
+
+        journals_url = req.resource_url(self.resource)
         return dict(
-            logged_in=authenticated_userid(self.request),
-            journals=self.resource,
+            logged_in=authenticated_userid(req),
+            buckets=[dict(label=b.upper(),
+                          url=self._url(b),
+                          count=counts.get(b, 0),
+                          current=b == bucket)
+                     for b in BUCKETS],
+            journals=[dict(name=row.name,
+                           post_count=row.public_post_count,
+                           url=journals_url + quote_path_segment(row.name)
+                               + '/')
+                      for row in page],
+            next_url=(self._url(bucket, after=page.next_cursor)
+                      if page.next_cursor else None),
+            prev_url=(self._url(bucket, before=page.prev_cursor)
+                      if page.prev_cursor else None),
         )
-
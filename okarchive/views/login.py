@@ -10,6 +10,10 @@ from pyramid.security import (
     )
 from pyramid.httpexceptions import HTTPFound
 
+from ..passwords import (
+    LoginUnavailable,
+    PoolFull,
+    )
 from ..security import authenticate
 from ..models import SiteRoot
 
@@ -36,11 +40,19 @@ class LoginLogoutView:
         if 'form.submitted' in request.params:
             login = request.params['login']
             password = request.params['password']
-            if authenticate(login, password):
-                request.session.flash(('success', 'Signed in.'))
-                headers = remember(request, login)
-                return HTTPFound(location=came_from, headers=headers)
-            request.session.flash(('danger', 'Failed sign in.'))
+            try:
+                if authenticate(login, password):
+                    request.session.flash(('success', 'Signed in.'))
+                    headers = remember(request, login)
+                    return HTTPFound(location=came_from, headers=headers)
+                request.session.flash(('danger', 'Failed sign in.'))
+            except PoolFull as e:
+                request.response.status = 503
+                request.response.headers['Retry-After'] = str(e.retry_after)
+                request.session.flash(('danger', str(e)))
+            except LoginUnavailable as e:
+                request.response.status = 429
+                request.session.flash(('danger', str(e)))
 
         else:
             login = password = ''
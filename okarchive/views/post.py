@@ -1,16 +1,30 @@
 import deform
 import colanderalchemy
+from sqlalchemy.orm import undefer
 
 from pyramid.view import view_config
-from pyramid.httpexceptions import HTTPFound
+from pyramid.httpexceptions import (
+    HTTPFound,
+    HTTPBadRequest,
+)
 from pyramid.security import (
     authenticated_userid,
-    has_permission,
+    effective_principals,
 )
 
 from ..models import (
+    DBSession,
     Post,
     )
+from ..pagecache import (
+    cached_page,
+    page_cache,
+)
+from ..conditional import conditional_get
+from ..security import permitted
+
+# Default number of comments per page; see ``okarchive.comments_per_page``.
+COMMENTS_PER_PAGE = 50
 
 
 class PostView:
@@ -30,29 +44,74 @@ class PostView:
     def _redirect_to_post_view(self, post):
         return HTTPFound(location=self.request.resource_url(post))
 
+    def _load(self, *options):
+        """Load what this view needs into the traversed post.
+
+        Traversal loads only the post's columns; each view says up front
+        what else it renders, so it costs a fixed number of queries.
+        Attributes already loaded are left alone.
+        """
+
+        return (DBSession
+                .query(Post)
+                .options(*options)
+                .filter(Post.id == self.resource.id)
+                .one())
+
 
     @view_config(name='',
                  context=Post,
                  renderer='okarchive:templates/post.pt',
                  permission='view',
+                 decorator=(conditional_get, cached_page),
     )
     def view(self):
         """Show a single post."""
 
-        post = self.resource
+        # One query for the post and its text, one for a page of comments.
+        post = self._load(undefer('text'))
         req = self.request
+        principals = effective_principals(req)
+
+        page_size = int(req.registry.settings.get(
+            'okarchive.comments_per_page', COMMENTS_PER_PAGE))
+        try:
+            comments = post.comment_page(
+                after=req.params.get('comments_after'),
+                before=req.params.get('comments_before'),
+                limit=page_size,
+                principals=principals)
+        except ValueError:
+            raise HTTPBadRequest('Bad page cursor.')
+
+        if comments.next_cursor:
+            comments_next_url = req.resource_url(
+                post, query={'comments_after': comments.next_cursor})
+        else:
+            comments_next_url = None
+
+        if comments.prev_cursor:
+            comments_prev_url = req.resource_url(
+                post, query={'comments_before': comments.prev_cursor})
+        else:
+            comments_prev_url = None
+
+        allowed = permitted(req, post, ('edit', 'delete'), principals)
 
-        if has_permission('edit', post, req):
+        if 'edit' in allowed:
             edit_url = req.resource_url(post, 'edit')
         else:
             edit_url = None
 
-        if has_permission('delete', post, req):
+        if 'delete' in allowed:
             delete_url = req.resource_url(post, 'delete')
         else:
             delete_url = None
 
         return dict(post=post,
+                    comments=comments,
+                    comments_next_url=comments_next_url,
+                    comments_prev_url=comments_prev_url,
                     edit_url=edit_url,
                     delete_url=delete_url,
                     journal_url=self.journal_url,
@@ -89,6 +148,8 @@ class PostView:
             post.title = appstruct['title']
             post.text = appstruct['text']
             post.lede = appstruct['lede']
+            post.set_privacy(appstruct['privacy'])
+            page_cache.invalidate(post)
             req.session.flash(('success', 'Edited.'))
             return self._redirect_to_post_view(post)
         elif 'cancel' in req.POST:
@@ -97,7 +158,8 @@ class PostView:
         else:
             appstruct = {'title': post.title,
                          'text': post.text,
-                         'lede': post.lede}
+                         'lede': post.lede,
+                         'privacy': post.privacy}
             return dict(form=form.render(appstruct),
                         registry=form.get_widget_resources(),
                         post=post,
@@ -114,6 +176,7 @@ class PostView:
     def delete(self):
         """Delete post and redirect to journal."""
 
+        page_cache.invalidate(self.resource)
         self.resource.delete()
         self.request.session.flash(('danger', 'Deleted.'))
         return HTTPFound(location=self.journal_url)
@@ -0,0 +1,75 @@
+from pyramid.view import view_config
+from pyramid.security import (
+    authenticated_userid,
+    effective_principals,
+)
+from pyramid.httpexceptions import HTTPBadRequest
+
+from ..models import (
+    Search,
+    journals_container,
+)
+
+# Default number of results per search page; see
+# ``okarchive.search_results_per_page``.
+RESULTS_PER_PAGE = 20
+
+
+class SearchView:
+    """Search posts and comments."""
+
+    def __init__(self, resource, request):
+        self.resource = resource
+        self.request = request
+
+    def _hit_url(self, hit):
+        url = self.request.resource_url(journals_container,
+                                        hit.journal_name,
+                                        str(hit.post_id),
+                                        '')
+        if hit.comment_id is not None:
+            url += '#comment-{}'.format(hit.comment_id)
+        return url
+
+    @view_config(name='',
+                 context=Search,
+                 renderer='okarchive:templates/search.pt',
+                 permission='view')
+    def view(self):
+        """Search form and ranked results."""
+
+        req = self.request
+        terms = req.params.get('q', '').strip()
+        try:
+            page = int(req.params.get('page', 1))
+        except ValueError:
+            raise HTTPBadRequest('Bad page number.')
+        if page < 1:
+            raise HTTPBadRequest('Bad page number.')
+
+        page_size = int(req.registry.settings.get(
+            'okarchive.search_results_per_page', RESULTS_PER_PAGE))
+        results = self.resource.results(terms,
+                                        page=page,
+                                        limit=page_size,
+                                        principals=effective_principals(req))
+
+        if results.next_cursor:
+            next_url = req.resource_url(
+                self.resource, query={'q': terms, 'page': results.next_cursor})
+        else:
+            next_url = None
+
+        if results.prev_cursor:
+            prev_url = req.resource_url(
+                self.resource, query={'q': terms, 'page': results.prev_cursor})
+        else:
+            prev_url = None
+
+        return dict(
+            terms=terms,
+            hits=[dict(hit=hit, url=self._hit_url(hit)) for hit in results],
+            next_url=next_url,
+            prev_url=prev_url,
+            logged_in=authenticated_userid(req),
+        )
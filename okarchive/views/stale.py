@@ -0,0 +1,35 @@
+from pyramid.view import view_config
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.traversal import lineage
+from sqlalchemy.orm.exc import ObjectDeletedError
+
+from ..models import (
+    Journal,
+    Post,
+)
+from ..models.traversal import traversal_cache
+
+
+class StaleTraversalView:
+    """Not found, for rows deleted after the traversal cache saw them.
+
+    On a cache hit, traversal returns an instance without loading its row
+    (see :py:mod:`okarchive.models.traversal`); if the row has gone since,
+    whether in another process or before its invalidation landed, the
+    first attribute the view uses fails to load. That is a missing
+    resource, as a traversal ``KeyError`` would have been, and the entries
+    that led here are stale.
+    """
+
+    def __init__(self, exc, request):
+        self.exc = exc
+        self.request = request
+
+    @view_config(context=ObjectDeletedError)
+    def view(self):
+        for resource in lineage(self.request.context):
+            if isinstance(resource, Post):
+                traversal_cache.forget_post(resource.id)
+            elif isinstance(resource, Journal):
+                traversal_cache.forget_journal(resource.name)
+        return HTTPNotFound()
@@ -0,0 +1,25 @@
+from pyramid.view import view_config
+
+from ..database import (
+    database_stats,
+    pool_status,
+)
+from ..models import (
+    DBSession,
+    SiteRoot,
+)
+
+
+class StatsView:
+    """Database pool and per-view query stats, for editors."""
+
+    def __init__(self, request):
+        self.request = request
+
+    @view_config(name='db-stats',
+                 context=SiteRoot,
+                 renderer='json',
+                 permission='stats')
+    def view(self):
+        return dict(pool=pool_status(DBSession.get_bind()),
+                    views=database_stats.views())
@@ -0,0 +1,39 @@
+from pyramid.view import view_config
+
+from ..models import (
+    Upload,
+    journals_container,
+)
+
+
+class UploadView:
+    """Status of an uploaded archive's import."""
+
+    def __init__(self, resource, request):
+        self.resource = resource
+        self.request = request
+
+    @view_config(name='',
+                 context=Upload,
+                 renderer='json',
+                 permission='view',
+                 http_cache=0)
+    def view(self):
+        upload = self.resource
+        job = upload.job
+        progress = job_url = None
+        if job is not None:
+            progress = dict(done=job.done, total=job.total)
+            job_url = self.request.resource_url(job)
+        return dict(id=upload.id,
+                    journal_url=self.request.resource_url(
+                        journals_container, upload.journal_name, ''),
+                    status=upload.status,
+                    size=upload.size,
+                    posts=upload.posts,
+                    comments=upload.comments,
+                    error=upload.error,
+                    progress=progress,
+                    job_url=job_url,
+                    created=upload.creation_date.isoformat(),
+                    updated=upload.modification_date.isoformat())
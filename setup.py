@@ -51,5 +51,12 @@ setup(name='okarchive',
       main = okarchive:main
       [console_scripts]
       initialize_okarchive_db = okarchive.scripts.initializedb:main
+      import_okarchive_journals = okarchive.scripts.importjournals:main
+      okarchive_cache_server = okarchive.scripts.cacheserver:main
+      okarchive_reindex_search = okarchive.scripts.reindexsearch:main
+      build_okarchive_assets = okarchive.scripts.buildassets:main
+      okarchive_compile_templates = okarchive.scripts.compiletemplates:main
+      okarchive_repair_counts = okarchive.scripts.repaircounts:main
+      okarchive_worker = okarchive.scripts.worker:main
       """,
       )